@@ -1,37 +1,33 @@
 import sys
 import subprocess
 
-from pydantic import BaseModel, Field, validator
-from dataclasses import dataclass, field
 import os
 from src.lager import Lager  # capital "L"
+from src.utils import gitmeta
 import uuid
-import subprocess
 
 app = None  # Use the pydantic app from main
 lager = None  # Use the lager from main
 ml = Lager()  # Initialize ml as an instance of Lager
 
-try:
-    subprocess.run('git config --global --add safe.directory C:/Users/WDAGUtilityAccount/Desktop/')
-except Exception as e:
-    print("Failed to add exception for Git directory:", e)
-
+def safe_directory():
+    """Marks the sandbox desktop as a safe git directory (only needed inside the Windows sandbox)."""
+    if os.name != 'nt':
+        return
+    try:
+        subprocess.run('git config --global --add safe.directory C:/Users/WDAGUtilityAccount/Desktop/')
+    except Exception as e:
+        print("Failed to add exception for Git directory:", e)
 
 
 def hash():
     """hash retrieves the Git hash of the current commit and generates a random UUID for metadata."""
-    try:
-        uid = uuid.uuid4()  # Generate a random UUID variable for versioning and seeding
-        git_hash = subprocess.check_output(["git", "rev-parse", "--verify", "HEAD"]).decode().strip()
-        return uid, git_hash
-
-    except subprocess.CalledProcessError as e:
-        if "fatal: not a git repository" in e.output.decode():
-            lager.warning("No Git repository found. Skipping Git info.")
-            return None
-        else:
-            raise  # Re-raise other Git errors for debugging
+    uid = uuid.uuid4()  # Generate a random UUID variable for versioning and seeding
+    git_hash = gitmeta.head_hash()  # cached; see src/utils/gitmeta.py
+    if git_hash is None:
+        Lager.get_logger().warning("No Git repository found. Skipping Git info.")
+        return None
+    return uid, git_hash
 
 def runtime():
     """runtime sets the environment variables and runs the application."""
@@ -54,6 +50,7 @@ def runtime():
 def main():
     """main is the entry point for the application."""
     global app, ml
+    safe_directory()
     try:
         ml = Lager.get_logger()  # Change this line
         runtime()
@@ -65,6 +62,10 @@ def main():
     return ml
 
 if __name__ == "__main__":
+    if '--profile-startup' in sys.argv:
+        from src.utils.startup import profile_startup
+        profile_startup()
+        sys.exit(0)
     try:
         main()
         ml.info("main achieved runtime")
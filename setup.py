@@ -45,13 +45,20 @@ def __mainpath() -> tuple:
     project_root = os.path.abspath(os.path.dirname(__file__))
     os.environ['PROJECT_ROOT'] = project_root
     try:
+        from src.fs.ufx import TreeWalker  # parallel scandir walk; only chmods what differs, skips .git
         sts = os.stat(project_root)
-        for root, dirs, files in os.walk(project_root):
-            for d in dirs:
-                os.chmod(os.path.join(root, d), sts.st_mode)
-            for f in files:
-                os.chmod(os.path.join(root, f), sts.st_mode)
-    except PermissionError as e:
+        stats = TreeWalker(project_root).chmod(sts.st_mode)
+        logging.info(f"Permissions: {stats.changed} changed, {stats.dirs} dirs / {stats.files} files in {stats.elapsed:.2f}s")
+        errors = []
+        for path, e in stats.errors:
+            if path and isinstance(e, FileNotFoundError):  # removed mid-walk: just gone
+                logging.warning(f"Permissions: skipped {path}: {e}")
+            else:
+                logging.error(f"Permissions: {path or project_root}: {e}")
+                errors.append(e)
+        if errors:
+            raise errors[0]
+    except OSError as e:
         logging.error(f"Error setting permissions on {project_root}: {e}")
         raise SystemExit(1)  # Indicate installation failure
     finally:
@@ -115,6 +122,7 @@ setup(
     entry_points={
         'console_scripts': [
             'ele = ele.src.app:run',
+            'ele-logs = ele.src.utils.logindex:main',
         ]
     }
 )
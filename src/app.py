@@ -1,12 +1,11 @@
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field
 from dataclasses import dataclass, field
 from datetime import datetime, date
 from dotenv import load_dotenv
 import os
-import subprocess
 from src.lager import Lager  # capital "L"
+from src.utils import gitmeta
 import sys
-from tablib import Dataset
 import uuid
 from main import main as ml_main
 
@@ -59,14 +58,17 @@ class BasedModel(BaseModel):
                 ml.error(f"Error initializing BasedModel: {e}")
                 raise  # Re-raise the exception to halt execution
         finally:
-            # pretty print with tablib tabular-style
-            print(tablib.Dataset(data=self.dict(exclude={'state'}).values()).export('html'))
+            # pretty print as an HTML table, streamed (see src/utils/export.py); imported here so
+            # importing src.app does not load the exporter
+            from src.utils.export import export
+            export([self.dict(exclude={'state'})], sys.stdout, format='html')
 
         self.state = 0  # Reset state to 0
-        self.git_tags = subprocess.check_output(['git', 'tag', '--list']).decode().split('\n')
-        self.git_tags = [t for t in self.git_tags if t != '']  # Remove empty strings
+        self.git_tags = gitmeta.tags()  # cached; see src/utils/gitmeta.py
         self.git_tag_latest = self.git_tags[-1]  # Get the latest tag
         # self.git_tag_latest_short = self.git_tag_latest.split('-')[0]  # Get the short version of the latest tag
+
+
 #@app.on_event("startup")
 def run():
     try:
@@ -0,0 +1,333 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from src.fs.merkle import Change, DigestCache
+
+"""
+Transactional "Selective Backport" (see filesystem.py): applies an approved change set from the
+runtime clone to the original vault so that it either happens completely or not at all.
+
+A backport runs in phases, each recorded in a journal under <vault>/.ele-backport/:
+
+1. check: every path about to be overwritten or deleted must still have the content the change
+   set was computed against (its base digest); anything else is a conflict with a concurrent
+   edit in the vault, and nothing is written.
+2. stage: new contents are copied, in parallel batches, next to their targets as hidden
+   `.__<name>.<txid>` temp files - the dotfile trick, so Obsidian does not index half-written
+   files - fsynced and hashed: a staged file whose digest is not the one in the change set (the
+   clone was edited after review) is a conflict, and everything staged is discarded. Files
+   about to be replaced or deleted are hardlinked into a backup dir.
+3. commit: the journal records the commit point.
+4. apply: temp files are renamed over their targets (atomic per file) and deletions made,
+   batch by batch, each batch journaled.
+
+recover() finishes an interrupted run: before the commit point (or before the journal header
+was completely written) it discards the staged files, after it rolls forward (or, with
+rollback=True, restores the backups).
+
+With unhide_paths=True, clone paths whose components were hidden with the dotfile trick
+(HIDDEN_PREFIX) are written back under their original names.
+"""
+
+JOURNAL_DIR = '.ele-backport'
+HIDDEN_PREFIX = '.__'
+
+
+def hide(path: str) -> str:
+    """media.json -> .__media.json (last component only)."""
+    head, _, name = path.rpartition('/')
+    hidden = name if name.startswith(HIDDEN_PREFIX) else HIDDEN_PREFIX + name
+    return f"{head}/{hidden}" if head else hidden
+
+
+def unhide(path: str) -> str:
+    """Undoes hide() on every component of a '/'-separated path."""
+    return '/'.join(part[len(HIDDEN_PREFIX):] if part.startswith(HIDDEN_PREFIX) and len(part) > len(HIDDEN_PREFIX)
+                    else part for part in path.split('/'))
+
+
+class BackportConflict(Exception):
+    def __init__(self, conflicts: List[str], where: str = 'vault'):
+        since = 'the base snapshot' if where == 'vault' else 'the change set was computed'
+        super().__init__(f"{len(conflicts)} path(s) changed in the {where} since {since}: "
+                         + ', '.join(conflicts[:10]))
+        self.conflicts = conflicts
+        self.where = where
+
+
+@dataclass
+class Operation:
+    op: str  # 'write' or 'delete'
+    path: str  # in the vault, '/'-separated
+    source: Optional[str] = None  # in the clone, for writes
+    base: Optional[str] = None  # digest the vault file must still have; None: must not exist
+    digest: Optional[str] = None  # digest being written
+
+
+def plan(changes: Iterable[Change], unhide_paths: bool = False) -> List[Operation]:
+    """Turns merkle.diff() changes (base snapshot -> clone) into vault operations."""
+    vault = unhide if unhide_paths else (lambda p: p)
+    ops = []
+    for change in changes:
+        if change.kind in ('removed', 'renamed'):
+            old_path = change.old_path if change.kind == 'renamed' else change.path
+            ops.append(Operation('delete', vault(old_path), base=change.old.digest))
+        if change.kind in ('added', 'modified', 'renamed'):
+            base = change.old.digest if change.kind == 'modified' else None
+            ops.append(Operation('write', vault(change.path), change.path, base, change.new.digest))
+    # a delete and a write of the same vault path (e.g. x renamed to .__x in the clone) is one overwrite
+    deleted = {op.path: op for op in ops if op.op == 'delete'}
+    merged = []
+    for op in ops:
+        if op.op == 'write' and op.path in deleted:
+            op.base = deleted.pop(op.path).base
+        merged.append(op)
+    return [op for op in merged if op.op == 'write' or op.path in deleted]
+
+
+@dataclass
+class Backport:
+    vault: str
+    clone: str
+    max_workers: int = 8
+    batch_size: int = 64
+    txid: str = field(default_factory=lambda: f"{time.strftime('%Y%m%d_%H%M%S')}-{uuid.uuid4().hex[:8]}")
+    ops: List[Operation] = field(default_factory=list)
+    state: str = 'planned'  # 'planned', then 'committed' once everything is staged
+    applied: int = 0  # operations done, in roll_forward() order
+
+    def __post_init__(self):
+        self.vault = os.path.abspath(self.vault)
+        self.clone = os.path.abspath(self.clone)
+
+    # -- paths
+
+    def _abs(self, root: str, path: str) -> str:
+        return os.path.join(root, *path.split('/'))
+
+    def _tmp(self, op: Operation) -> str:
+        target = self._abs(self.vault, op.path)
+        return os.path.join(os.path.dirname(target), f"{HIDDEN_PREFIX}{os.path.basename(target)}.{self.txid}")
+
+    @property
+    def journal_dir(self) -> str:
+        return os.path.join(self.vault, JOURNAL_DIR)
+
+    @property
+    def journal_path(self) -> str:
+        return os.path.join(self.journal_dir, f"{self.txid}.journal")
+
+    @property
+    def backup_dir(self) -> str:
+        return os.path.join(self.journal_dir, self.txid)
+
+    def _backup(self, op: Operation) -> str:
+        return self._abs(self.backup_dir, op.path)
+
+    # -- journal: one JSON object per line, fsynced
+
+    def _journal(self, record: dict):
+        os.makedirs(self.journal_dir, exist_ok=True)
+        with open(self.journal_path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    @classmethod
+    def load(cls, journal_path: str) -> 'Backport':
+        """
+        Rebuilds a Backport and its progress from a journal file. A journal without a complete
+        header (a crash while writing it) loads as an empty, uncommitted backport: nothing was
+        staged yet, so recover() just discards it.
+        """
+        with open(journal_path) as f:
+            records = [json.loads(line) for line in f if line.endswith('\n')]  # a torn last line is ignored
+        if not records:
+            vault = os.path.dirname(os.path.dirname(os.path.abspath(journal_path)))
+            return cls(vault, vault, txid=os.path.basename(journal_path)[:-len('.journal')])
+        header = records[0]
+        backport = cls(header['vault'], header['clone'], txid=header['txid'],
+                       ops=[Operation(**op) for op in header['ops']])
+        for record in records[1:]:
+            if 'state' in record:
+                backport.state = record['state']
+            if 'applied' in record:
+                backport.applied = record['applied']
+        return backport
+
+    # -- phases
+
+    def check(self, ops: Sequence[Operation]) -> List[str]:
+        """Paths whose current vault content no longer matches the base of their operation."""
+        def conflicted(op: Operation) -> bool:
+            target = self._abs(self.vault, op.path)
+            if not os.path.lexists(target):
+                return op.base is not None and op.op == 'write'  # deleting what is already gone is fine
+            if os.path.isdir(target) and not os.path.islink(target):
+                return True
+            if os.path.islink(target):
+                current = hashlib.sha256(os.fsencode(os.readlink(target))).hexdigest()  # as snapshots record links
+            else:
+                current = DigestCache.hash_file(target)
+            if op.op == 'write' and current == op.digest:
+                return False  # the vault already has the new content
+            return current != op.base
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            flags = list(pool.map(conflicted, ops))
+        return [op.path for op, bad in zip(ops, flags) if bad]
+
+    def _stage(self, op: Operation) -> bool:
+        """Backs up the target and stages the new content; False if the clone no longer has op.digest."""
+        target = self._abs(self.vault, op.path)
+        if os.path.lexists(target) and not os.path.isdir(target):
+            backup = self._backup(op)
+            os.makedirs(os.path.dirname(backup), exist_ok=True)
+            try:
+                os.link(target, backup, follow_symlinks=False)  # the inode survives the later rename/unlink
+            except OSError:
+                shutil.copy2(target, backup, follow_symlinks=False)
+        if op.op != 'write':
+            return True
+        source = self._abs(self.clone, op.source)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp = self._tmp(op)
+        if os.path.islink(source):
+            link = os.readlink(source)
+            os.symlink(link, tmp)
+            return hashlib.sha256(os.fsencode(link)).hexdigest() == op.digest
+        shutil.copy2(source, tmp)
+        with open(tmp, 'rb+') as f:
+            os.fsync(f.fileno())
+        # what was staged, not what was reviewed, is what would land in the vault
+        return DigestCache.hash_file(tmp) == op.digest
+
+    def _apply_one(self, op: Operation):
+        target = self._abs(self.vault, op.path)
+        if op.op == 'write':
+            tmp = self._tmp(op)
+            if os.path.lexists(tmp):  # absent: already applied before an interruption
+                os.replace(tmp, target)
+        else:
+            try:
+                os.unlink(target)
+            except FileNotFoundError:
+                pass
+
+    def _batches(self, ops: Sequence[Operation]):
+        for start in range(0, len(ops), self.batch_size):
+            yield start, ops[start:start + self.batch_size]
+
+    def run(self, changes: Iterable[Change], unhide_paths: bool = False) -> 'Backport':
+        """
+        Checks, stages, commits and applies a change set.
+
+        Args:
+            changes (Iterable[Change]): merkle.diff() output from the base snapshot to the clone.
+            unhide_paths (bool): Write `.__name` clone paths back as `name` (off by default: a real
+                `.__name` file in the clone would otherwise overwrite `name`).
+
+        Raises:
+            BackportConflict: Some target changed in the vault, or some source changed in the clone
+                since the change set was computed; nothing was written.
+        """
+        self.ops = plan(changes, unhide_paths)
+        conflicts = self.check(self.ops)
+        if conflicts:
+            raise BackportConflict(conflicts)
+        self._journal({'txid': self.txid, 'vault': self.vault, 'clone': self.clone,
+                       'ops': [op.__dict__ for op in self.ops]})
+        changed = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for _, batch in self._batches(self.ops):
+                changed += [op.path for op, ok in zip(batch, pool.map(self._stage, batch)) if not ok]
+        if changed:
+            self.discard()
+            raise BackportConflict(changed, 'clone')
+        self._journal({'state': 'committed'})
+        self.state = 'committed'
+        self.roll_forward()
+        return self
+
+    def roll_forward(self):
+        # deletes first, so a rename's delete never removes a file a later write creates
+        order = sorted(range(len(self.ops)), key=lambda i: self.ops[i].op != 'delete')
+        ops = [self.ops[i] for i in order]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for start, batch in self._batches(ops):
+                if start + len(batch) <= self.applied:
+                    continue
+                list(pool.map(self._apply_one, batch))
+                self.applied = start + len(batch)
+                self._journal({'applied': self.applied})
+        self._finish()
+
+    def discard(self):
+        """Drops staged files; the vault was never touched."""
+        for op in self.ops:
+            if op.op == 'write':
+                try:
+                    os.unlink(self._tmp(op))
+                except FileNotFoundError:
+                    pass
+        self._finish()
+
+    def rollback(self):
+        """Undoes a committed (possibly partly applied) backport from the backups."""
+        for op in self.ops:
+            target, backup = self._abs(self.vault, op.path), self._backup(op)
+            if op.op == 'write':
+                tmp = self._tmp(op)
+                if os.path.lexists(tmp):
+                    os.unlink(tmp)
+            if os.path.lexists(backup):
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(backup, target)
+            elif op.op == 'write' and op.base is None and os.path.lexists(target):
+                os.unlink(target)  # a file the backport added
+        self._finish()
+
+    def _finish(self):
+        shutil.rmtree(self.backup_dir, ignore_errors=True)
+        try:
+            os.unlink(self.journal_path)
+        except FileNotFoundError:
+            pass
+
+
+def pending(vault: str) -> List[str]:
+    """Journals of backports that did not finish."""
+    directory = os.path.join(vault, JOURNAL_DIR)
+    try:
+        return sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith('.journal'))
+    except FileNotFoundError:
+        return []
+
+
+def recover(vault: str, rollback: bool = False) -> Dict[str, str]:
+    """
+    Completes or undoes every interrupted backport in the vault.
+
+    Returns:
+        Dict[str, str]: txid -> 'discarded', 'rolled forward' or 'rolled back'.
+    """
+    outcome = {}
+    for journal in pending(vault):
+        backport = Backport.load(journal)
+        if backport.state != 'committed':
+            backport.discard()
+            outcome[backport.txid] = 'discarded'
+        elif rollback:
+            backport.rollback()
+            outcome[backport.txid] = 'rolled back'
+        else:
+            backport.roll_forward()
+            outcome[backport.txid] = 'rolled forward'
+    return outcome
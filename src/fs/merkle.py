@@ -0,0 +1,163 @@
+import stat
+import hashlib
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from src.fs.snapshot import DEFAULT_EXCLUDE, DigestCache, Entry, Manifest
+
+"""
+Merkle trees over snapshot manifests and live directories, and a diff between two of them.
+
+Every file node's hash is its content digest plus its file type and permission bits; every
+directory's hash is a sha256 over its children's (name, hash) pairs. diff() walks both trees
+from the root and only descends where the directory hashes differ, so comparing two large
+vaults costs time proportional to the directories that actually changed. Files removed in one
+place and added in another with the same content are reported as renames.
+
+Live trees are hashed through a DigestCache (src/fs/snapshot.py), keyed on (size, mtime_ns,
+inode), so rebuilding the tree of a directory only reads the files that changed since the last
+build.
+"""
+
+
+class Node:
+    __slots__ = ('hash', 'children', 'entry')
+
+    def __init__(self, hash: str = '', children: Optional[Dict[str, 'Node']] = None, entry: Optional[Entry] = None):
+        self.hash = hash
+        self.children = children  # None for files and symlinks
+        self.entry = entry
+
+    @property
+    def is_dir(self) -> bool:
+        return self.children is not None
+
+    def files(self, prefix: str = '') -> Iterator[Tuple[str, Entry]]:
+        """Every (path, Entry) at or below this node."""
+        if not self.is_dir:
+            yield prefix, self.entry
+            return
+        for name in sorted(self.children):
+            yield from self.children[name].files(f"{prefix}/{name}" if prefix else name)
+
+
+@dataclass
+class Change:
+    kind: str  # 'added', 'removed', 'modified' or 'renamed'
+    path: str
+    old_path: Optional[str] = None  # renames only
+    old: Optional[Entry] = None
+    new: Optional[Entry] = None
+
+
+def file_hash(entry: Entry) -> str:
+    return f"{entry.digest}:{stat.S_IFMT(entry.mode):o}:{stat.S_IMODE(entry.mode) & 0o111:o}"
+
+
+def _seal(node: Node) -> str:
+    """Computes directory hashes bottom-up (iteratively, so deep trees do not hit the recursion limit)."""
+    stack, order = [node], []
+    while stack:
+        current = stack.pop()
+        order.append(current)
+        stack.extend(child for child in current.children.values() if child.is_dir)
+    for directory in reversed(order):
+        digest = hashlib.sha256()
+        for name in sorted(directory.children):
+            digest.update(f"{name}\0{directory.children[name].hash}\n".encode('utf-8', 'surrogateescape'))
+        directory.hash = digest.hexdigest()
+    return node.hash
+
+
+def tree_from_entries(entries: Sequence[Entry]) -> Node:
+    root = Node(children={})
+    directories = {'': root}
+    for entry in entries:
+        parent_path, _, name = entry.path.rpartition('/')
+        parent = directories.get(parent_path)
+        if parent is None:
+            parent = root
+            prefix = ''
+            for part in parent_path.split('/'):
+                prefix = f"{prefix}/{part}" if prefix else part
+                child = directories.get(prefix)
+                if child is None:
+                    child = directories[prefix] = parent.children[part] = Node(children={})
+                parent = child
+        parent.children[name] = Node(file_hash(entry), entry=entry)
+    _seal(root)
+    return root
+
+
+def tree_from_manifest(manifest: Manifest) -> Node:
+    return tree_from_entries(manifest.entries)
+
+
+def tree_from_directory(root: str, cache: Optional[DigestCache] = None,
+                        exclude: Sequence[str] = DEFAULT_EXCLUDE) -> Node:
+    """Builds the Merkle tree of a live directory; pass a long-lived cache to avoid re-reading files."""
+    cache = cache if cache is not None else DigestCache()
+    tree = tree_from_entries(cache.entries_for(root, exclude))
+    cache.save()
+    return tree
+
+
+def diff(old: Node, new: Node, detect_renames: bool = True) -> List[Change]:
+    """
+    Compares two trees, descending only into directories whose hashes differ.
+
+    Returns:
+        List[Change]: Sorted by path; with detect_renames, a removed file and an added file with the
+        same content (and type) become one 'renamed' change.
+    """
+    changes: List[Change] = []
+    stack = [('', old, new)]
+    while stack:
+        prefix, a, b = stack.pop()
+        if a.hash == b.hash:
+            continue
+        for name in a.children.keys() | b.children.keys():
+            path = f"{prefix}/{name}" if prefix else name
+            x, y = a.children.get(name), b.children.get(name)
+            if x is not None and y is not None and x.hash == y.hash:
+                continue
+            if x is not None and y is not None and x.is_dir and y.is_dir:
+                stack.append((path, x, y))
+            elif x is not None and y is not None and not x.is_dir and not y.is_dir:
+                changes.append(Change('modified', path, old=x.entry, new=y.entry))
+            else:
+                if x is not None:
+                    changes.extend(Change('removed', p, old=e) for p, e in x.files(path))
+                if y is not None:
+                    changes.extend(Change('added', p, new=e) for p, e in y.files(path))
+    if detect_renames:
+        changes = _pair_renames(changes)
+    changes.sort(key=lambda c: (c.path, c.kind))
+    return changes
+
+
+def _pair_renames(changes: List[Change]) -> List[Change]:
+    removed: Dict[str, List[Change]] = {}
+    for change in sorted((c for c in changes if c.kind == 'removed'), key=lambda c: c.path):
+        removed.setdefault(file_hash(change.old), []).append(change)
+    paired, result = set(), []
+    for change in sorted((c for c in changes if c.kind == 'added'), key=lambda c: c.path):
+        candidates = removed.get(file_hash(change.new))
+        if candidates:
+            source = candidates.pop(0)
+            paired.add(id(source))
+            result.append(Change('renamed', change.path, source.path, source.old, change.new))
+        else:
+            result.append(change)
+    result.extend(c for c in changes if c.kind != 'added' and id(c) not in paired)
+    return result
+
+
+def diff_manifests(old: Manifest, new: Manifest, detect_renames: bool = True) -> List[Change]:
+    return diff(tree_from_manifest(old), tree_from_manifest(new), detect_renames)
+
+
+def diff_live(manifest: Manifest, root: Optional[str] = None, cache: Optional[DigestCache] = None,
+              detect_renames: bool = True) -> List[Change]:
+    """What changed in a live directory (default: the manifest's source) since the snapshot."""
+    return diff(tree_from_manifest(manifest), tree_from_directory(root or manifest.source, cache), detect_renames)
@@ -0,0 +1,364 @@
+import os
+import sys
+import stat
+import time
+import errno
+import struct
+import shutil
+import select
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Sequence, Set, Tuple
+
+from src.fs.snapshot import DEFAULT_EXCLUDE, scan_tree
+
+"""
+Runtime clone of an Obsidian vault, kept current incrementally (the "Runtime Clone" step in
+filesystem.py).
+
+VaultMirror copies the vault once with a thread pool, then follows changes: on Linux, inotify
+events mark paths dirty and each batch is applied after a short debounce; everywhere, a
+periodic (size, mtime) rescan catches anything the events missed (queue overflow, editors that
+swap files, other platforms). A file counts as unchanged when its size and mtime_ns match the
+copy, which is why copies carry the source's mtime.
+
+File data is copied with os.copy_file_range (reflinks on btrfs/XFS, in-kernel copies
+elsewhere), then os.sendfile, then plain reads; each copy lands under a temporary name and is
+renamed into place so readers of the mirror never see half a file. MirrorStats reports lag
+(event to applied) and throughput. A file that cannot be copied or removed (permissions, a full
+disk) is counted in MirrorStats.errors and listed in MirrorStats.failed until a later attempt
+succeeds; the mirror keeps running and retries it on the next event or rescan.
+"""
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+              | IN_CREATE | IN_DELETE | IN_DELETE_SELF)
+EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, len
+
+
+class Inotify:
+    """Minimal ctypes binding for Linux inotify; raises OSError where it is unavailable."""
+
+    def __init__(self):
+        if not sys.platform.startswith('linux'):
+            raise OSError(errno.ENOSYS, "inotify is Linux-only")
+        import ctypes
+        import ctypes.util
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.paths: Dict[int, str] = {}  # wd -> watched directory (relative to the vault)
+        self.watches: Dict[str, int] = {}
+
+    def add_watch(self, absolute: str, relative: str):
+        import ctypes
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(absolute), WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {absolute}")
+        self.paths[wd] = relative
+        self.watches[relative] = wd
+
+    def read(self, timeout: float):
+        """Yields (relative path, mask) for pending events, waiting up to timeout for the first."""
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return
+        try:
+            data = os.read(self.fd, 1 << 16)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            if mask & IN_IGNORED:
+                relative = self.paths.pop(wd, None)
+                if relative is not None and self.watches.get(relative) == wd:
+                    del self.watches[relative]
+                continue
+            directory = self.paths.get(wd)
+            if directory is None and not mask & IN_Q_OVERFLOW:
+                continue
+            path = f"{directory}/{name}" if directory and name else (name or directory or '')
+            yield path, mask
+
+    def close(self):
+        os.close(self.fd)
+
+
+def fast_copy(src: str, dst: str, size: int):
+    """Copies file data kernel-side where possible (copy_file_range, then sendfile)."""
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        infd, outfd = fsrc.fileno(), fdst.fileno()
+        copied = 0
+        for method in ('copy_file_range', 'sendfile'):
+            if not hasattr(os, method):
+                continue
+            try:
+                while True:
+                    if method == 'copy_file_range':
+                        n = os.copy_file_range(infd, outfd, max(size - copied, 1 << 20))
+                    else:
+                        n = os.sendfile(outfd, infd, copied, max(size - copied, 1 << 20))
+                    if n == 0:
+                        return
+                    copied += n
+            except OSError as e:
+                if copied or e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP,
+                                             errno.ENOTSUP, errno.EBADF, errno.EPERM):
+                    raise
+        shutil.copyfileobj(fsrc, fdst, 1 << 20)
+
+
+@dataclass
+class MirrorStats:
+    events: int = 0
+    rescans: int = 0
+    files_copied: int = 0
+    bytes_copied: int = 0
+    removed: int = 0
+    copy_seconds: float = 0.0
+    last_lag: float = 0.0  # seconds from the oldest event of a batch to the batch being applied
+    max_lag: float = 0.0
+    errors: int = 0  # failed copies, removals and rescans
+    failed: Dict[str, str] = field(default_factory=dict)  # relative path -> last error, until it succeeds
+
+    @property
+    def throughput(self) -> float:
+        """Bytes per second spent copying."""
+        return self.bytes_copied / self.copy_seconds if self.copy_seconds else 0.0
+
+
+@dataclass
+class VaultMirror:
+    source: str
+    dest: str
+    exclude: Sequence[str] = DEFAULT_EXCLUDE
+    max_workers: int = 8
+    rescan_interval: float = 60.0  # seconds between stat-based rescans
+    debounce: float = 0.2  # seconds to let a burst of events settle
+    max_delay: float = 2.0  # apply a batch after this long even if events keep coming
+    stats: MirrorStats = field(default_factory=MirrorStats)
+    _stop: threading.Event = field(default_factory=threading.Event, repr=False)
+    _thread: Optional[threading.Thread] = field(default=None, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def __post_init__(self):
+        self.source = os.path.abspath(self.source)
+        self.dest = os.path.abspath(self.dest)
+
+    def _paths(self, relative: str) -> Tuple[str, str]:
+        parts = relative.split('/') if relative else []
+        return os.path.join(self.source, *parts), os.path.join(self.dest, *parts)
+
+    def _excluded(self, relative: str) -> bool:
+        return any(part in self.exclude for part in relative.split('/'))
+
+    # -- applying changes
+
+    def _failed(self, relative: str, error: OSError):
+        with self._lock:
+            self.stats.errors += 1
+            self.stats.failed[relative] = str(error)
+
+    def _succeeded(self, relative: str):
+        if self.stats.failed:
+            with self._lock:
+                self.stats.failed.pop(relative, None)
+
+    def copy_file(self, relative: str):
+        """Copies one file or symlink into the mirror; errors are recorded in stats, never raised."""
+        src, dst = self._paths(relative)
+        try:
+            st = os.lstat(src)
+        except FileNotFoundError:
+            return self.remove(relative)
+        except OSError as e:
+            return self._failed(relative, e)
+        start = time.perf_counter()
+        tmp = os.path.join(os.path.dirname(dst), f".{os.path.basename(dst)}.mirror{threading.get_ident()}")
+        try:
+            if os.path.isdir(dst) and not os.path.islink(dst):
+                shutil.rmtree(dst)
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            if stat.S_ISLNK(st.st_mode):
+                os.symlink(os.readlink(src), tmp)
+            else:
+                fast_copy(src, tmp, st.st_size)
+                os.chmod(tmp, stat.S_IMODE(st.st_mode))
+            os.utime(tmp, ns=(st.st_atime_ns, st.st_mtime_ns), follow_symlinks=False)
+            os.replace(tmp, dst)
+        except OSError as e:
+            try:
+                if os.path.lexists(tmp):
+                    os.unlink(tmp)
+            except OSError:
+                pass
+            if not isinstance(e, (FileNotFoundError, IsADirectoryError)):
+                self._failed(relative, e)
+            # else changed under us mid-copy; its own event (or the next rescan) brings it up to date
+            return
+        self._succeeded(relative)
+        with self._lock:
+            self.stats.files_copied += 1
+            self.stats.bytes_copied += st.st_size
+            self.stats.copy_seconds += time.perf_counter() - start
+
+    def remove(self, relative: str):
+        _, dst = self._paths(relative)
+        if os.path.isdir(dst) and not os.path.islink(dst):
+            shutil.rmtree(dst, ignore_errors=True)
+        else:
+            try:
+                os.unlink(dst)
+            except FileNotFoundError:
+                return self._succeeded(relative)
+            except OSError as e:
+                return self._failed(relative, e)
+        self._succeeded(relative)
+        with self._lock:
+            self.stats.removed += 1
+
+    def sync_tree(self, relative: str = '') -> int:
+        """
+        Makes dest/relative match source/relative, copying only files whose size or mtime differ.
+
+        Returns:
+            int: Number of files copied or removed.
+        """
+        src_root, dst_root = self._paths(relative)
+        if not os.path.isdir(src_root):
+            self.copy_file(relative) if os.path.lexists(src_root) else self.remove(relative)
+            return 1
+        prefix = f"{relative}/" if relative else ''
+        wanted, todo = set(), []
+        for path, entry in scan_tree(src_root, self.exclude):
+            wanted.add(path)
+            st = entry.stat(follow_symlinks=False)
+            try:
+                copy = os.lstat(os.path.join(dst_root, *path.split('/')))
+                if (copy.st_size, copy.st_mtime_ns, stat.S_IFMT(copy.st_mode)) == \
+                        (st.st_size, st.st_mtime_ns, stat.S_IFMT(st.st_mode)):
+                    continue
+            except FileNotFoundError:
+                pass
+            todo.append(prefix + path)
+        stale = []
+        if os.path.isdir(dst_root):
+            stale = [prefix + path for path, _ in scan_tree(dst_root, self.exclude) if path not in wanted]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            list(pool.map(self.copy_file, todo))
+            list(pool.map(self.remove, stale))
+        return len(todo) + len(stale)
+
+    def initial_sync(self) -> int:
+        os.makedirs(self.dest, exist_ok=True)
+        return self.sync_tree()
+
+    def rescan(self) -> int:
+        with self._lock:
+            self.stats.rescans += 1
+        return self.sync_tree()
+
+    # -- watching
+
+    def _watch_tree(self, inotify: Inotify, relative: str = ''):
+        src_root, _ = self._paths(relative)
+        for directory, subdirs, _ in os.walk(src_root):
+            subdirs[:] = [d for d in subdirs if d not in self.exclude]
+            rel = os.path.relpath(directory, self.source).replace(os.sep, '/')
+            rel = '' if rel == '.' else rel
+            if rel not in inotify.watches:
+                try:
+                    inotify.add_watch(directory, rel)
+                except OSError:
+                    pass  # vanished already, or out of watches: the rescan still covers it
+
+    def _apply(self, inotify: Optional[Inotify], dirty: Set[str], oldest: float):
+        # a dirty directory covers everything beneath it
+        trees = sorted(p for p in dirty if os.path.isdir(self._paths(p)[0]) and not os.path.islink(self._paths(p)[0]))
+        covered = lambda p: any(p == t or p.startswith(t + '/') or t == '' for t in trees)
+        files = [p for p in dirty if p not in trees and not covered(p)]
+        for tree in trees:
+            if not any(tree != t and (t == '' or tree.startswith(t + '/')) for t in trees):
+                if inotify is not None:
+                    self._watch_tree(inotify, tree)
+                self.sync_tree(tree)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            list(pool.map(self.copy_file, files))
+        lag = time.monotonic() - oldest
+        with self._lock:
+            self.stats.last_lag = lag
+            self.stats.max_lag = max(self.stats.max_lag, lag)
+
+    def run(self):
+        """Initial copy, then follows changes until stop() is called."""
+        try:
+            inotify = Inotify()
+            self._watch_tree(inotify)  # watch before copying so nothing slips in between
+        except OSError:
+            inotify = None
+        self.initial_sync()
+        next_rescan = time.monotonic() + self.rescan_interval
+        dirty: Set[str] = set()
+        oldest = 0.0
+        try:
+            while not self._stop.is_set():
+                timeout = min(self.debounce if dirty else 1.0, max(0.0, next_rescan - time.monotonic()))
+                if inotify is not None:
+                    events = list(inotify.read(timeout))
+                else:
+                    self._stop.wait(timeout)
+                    events = []
+                for path, mask in events:
+                    if mask & IN_Q_OVERFLOW:
+                        next_rescan = 0.0  # events were lost: fall back to a full rescan now
+                        continue
+                    if self._excluded(path):
+                        continue
+                    if not dirty:
+                        oldest = time.monotonic()
+                    dirty.add(path)
+                with self._lock:
+                    self.stats.events += len(events)
+                try:
+                    if dirty and (not events or time.monotonic() - oldest >= self.max_delay):
+                        batch, dirty = dirty, set()
+                        self._apply(inotify, batch, oldest)
+                    if time.monotonic() >= next_rescan:
+                        next_rescan = time.monotonic() + self.rescan_interval
+                        if inotify is not None:
+                            self._watch_tree(inotify)
+                        self.rescan()
+                except OSError as e:  # e.g. an unreadable directory in the scan; the next rescan tries again
+                    self._failed(getattr(e, 'filename', None) or '', e)
+        finally:
+            if inotify is not None:
+                inotify.close()
+
+    def start(self) -> 'VaultMirror':
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name='vault-mirror', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
@@ -0,0 +1,378 @@
+import os
+import json
+import stat
+import time
+import shutil
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from src.fs.ufx import TreeWalker
+
+"""
+Content-addressed, deduplicated snapshots of a directory tree.
+
+A SnapshotStore holds every file's content once, under objects/<sha256[:2]>/<sha256[2:]>, and
+one small JSON manifest per snapshot (manifests/<id>.json) listing path, digest, size, mode and
+mtime for each entry. Taking a snapshot stats the tree, but only hashes files whose
+(size, mtime_ns, inode) differ from the store's stat cache (a DigestCache), and only copies
+content the store does not already have - a changed file is hashed first and copied only if its
+digest is new. A snapshot of an unchanged tree therefore costs a walk and a manifest write.
+
+Objects are read-only (0o444). A hardlink shares the object's inode and so its mode, which means
+restore() can only link files that were recorded with that same read-only mode (falling back to
+a copy across filesystems). Ordinary 0o644 or 0o755 files are copied and given their recorded
+mode, so checking out a snapshot duplicates their data.
+"""
+
+DEFAULT_STORE = os.environ.get('ELE_SNAPSHOT_STORE', os.path.join(os.path.expanduser('~'), '.cache', 'ele', 'snapshots'))
+DEFAULT_EXCLUDE = ('.git', '.ele-backport')  # the backport journal (src/fs/backport.py) is never content
+CHUNK_SIZE = 1024 * 1024
+
+
+class Entry(NamedTuple):
+    path: str  # relative, '/'-separated
+    digest: str  # sha256 of the content (of the link target for symlinks)
+    size: int
+    mode: int  # st_mode, so symlinks are told apart by stat.S_ISLNK
+    mtime_ns: int
+
+
+@dataclass
+class Manifest:
+    id: str
+    source: str
+    created: float
+    entries: List[Entry]
+
+    def by_path(self) -> Dict[str, Entry]:
+        return {entry.path: entry for entry in self.entries}
+
+    def to_dict(self) -> dict:
+        return {'id': self.id, 'source': self.source, 'created': self.created,
+                'entries': [list(entry) for entry in self.entries]}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Manifest':
+        return cls(data['id'], data['source'], data['created'], [Entry(*e) for e in data['entries']])
+
+
+@dataclass
+class SnapshotStats:
+    files: int = 0
+    hashed: int = 0  # stat cache misses
+    stored: int = 0  # objects written
+    stored_bytes: int = 0
+    elapsed: float = 0.0
+
+
+def scan_tree(source: str, exclude: Sequence[str] = DEFAULT_EXCLUDE,
+              max_workers: int = 8) -> Iterator[Tuple[str, os.DirEntry]]:
+    """Yields (relative path, DirEntry) for every file and symlink under source, sorted by path."""
+    walker = TreeWalker(source, exclude=exclude, prune=(), max_workers=max_workers)
+    found = [(path, entry) for path, entry in walker.files()
+             if entry.is_file(follow_symlinks=False) or entry.is_symlink()]
+    for path, error in walker.stats.errors:
+        if not path or not isinstance(error, FileNotFoundError):  # a subdirectory removed mid-walk is just gone
+            raise error
+    yield from sorted(found, key=_walk_order)
+
+
+def _walk_order(item: Tuple[str, os.DirEntry]) -> list:
+    """Depth-first, by name, with a directory's files before its subdirectories."""
+    parts = item[0].split('/')
+    return [(1, part) for part in parts[:-1]] + [(0, parts[-1])]
+
+
+@dataclass
+class DigestCache:
+    """
+    Content digests of live files keyed on absolute path, valid while (size, mtime_ns, inode)
+    match: the stat cache shared by snapshots, Merkle trees (src/fs/merkle.py) and the shell
+    result cache (src/utils/shellcache.py). Persisted as {path: [size, mtime_ns, inode, digest]}.
+    """
+    path: Optional[str] = None  # JSON file to persist to (optional)
+    entries: Dict[str, list] = field(default_factory=dict)
+    max_workers: int = 4
+    dirty: bool = False
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def __post_init__(self):
+        if self.path and not self.entries:
+            try:
+                with open(self.path) as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                pass
+
+    def save(self):
+        if self.path and self.dirty:
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp, 'w') as f:
+                f.write(json.dumps(self.entries, separators=(',', ':')))  # dumps uses the C encoder, dump does not
+            os.replace(tmp, self.path)
+            self.dirty = False
+
+    @staticmethod
+    def hash_file(path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def lookup(self, path: str, st: os.stat_result) -> Optional[str]:
+        """The cached digest of path if st still matches what it was recorded with, else None."""
+        cached = self.entries.get(path)
+        if cached and cached[:3] == [st.st_size, st.st_mtime_ns, st.st_ino]:
+            return cached[3]
+        return None
+
+    def record(self, path: str, st: os.stat_result, digest: Optional[str]):
+        """Remembers path's digest for st (forgets path if digest is None)."""
+        with self._lock:
+            if digest is None:
+                self.entries.pop(path, None)
+            else:
+                self.entries[path] = [st.st_size, st.st_mtime_ns, st.st_ino, digest]
+            self.dirty = True
+
+    def digest(self, path: str, st: Optional[os.stat_result] = None) -> str:
+        """The content digest of path, read from disk only if the cache cannot vouch for it."""
+        st = os.stat(path) if st is None else st
+        digest = self.lookup(path, st)
+        if digest is None:
+            digest = self.hash_file(path)
+            self.record(path, st, digest)
+        return digest
+
+    def entries_for(self, root: str, exclude: Sequence[str] = DEFAULT_EXCLUDE) -> List[Entry]:
+        """Entries for every file under root, reading only files the cache cannot vouch for."""
+        root = os.path.abspath(root)
+        result, misses = [], []
+        for relative, dir_entry in scan_tree(root, exclude):
+            try:
+                st = dir_entry.stat(follow_symlinks=False)
+                if stat.S_ISLNK(st.st_mode):
+                    digest = hashlib.sha256(os.fsencode(os.readlink(dir_entry.path))).hexdigest()
+                else:
+                    digest = self.lookup(dir_entry.path, st)
+            except FileNotFoundError:  # removed since the walk listed it
+                continue
+            if digest is None:
+                misses.append((len(result), dir_entry.path, st))
+            result.append(Entry(relative, digest, st.st_size, st.st_mode, st.st_mtime_ns))
+        if misses:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                for (i, path, st), digest in zip(misses, pool.map(lambda m: self._hash_existing(m[1]), misses)):
+                    self.record(path, st, digest)
+                    result[i] = result[i]._replace(digest=digest)
+            result = [entry for entry in result if entry.digest is not None]
+        return result
+
+    def _hash_existing(self, path: str) -> Optional[str]:
+        """hash_file(path), or None if the file was removed since it was listed."""
+        try:
+            return self.hash_file(path)
+        except FileNotFoundError:
+            return None
+
+
+@dataclass
+class SnapshotStore:
+    root: str = DEFAULT_STORE
+    max_workers: int = 4
+    _digests: Optional[DigestCache] = field(default=None, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @property
+    def objects_dir(self) -> str:
+        return os.path.join(self.root, 'objects')
+
+    @property
+    def manifests_dir(self) -> str:
+        return os.path.join(self.root, 'manifests')
+
+    def object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], digest[2:])
+
+    @property
+    def digests(self) -> DigestCache:
+        """The store's stat cache (<root>/statcache.json)."""
+        if self._digests is None:
+            self._digests = DigestCache(os.path.join(self.root, 'statcache.json'), max_workers=self.max_workers)
+        return self._digests
+
+    # -- objects
+
+    def _write_object(self, tmp: str, digest: str) -> bool:
+        target = self.object_path(digest)
+        if os.path.exists(target):
+            os.unlink(tmp)
+            return False
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.chmod(tmp, 0o444)
+        os.replace(tmp, target)
+        return True
+
+    def _tmp_path(self) -> str:
+        return os.path.join(self.objects_dir, f"tmp.{os.getpid()}.{threading.get_ident()}.{time.monotonic_ns()}")
+
+    def _ingest_file(self, path: str) -> Tuple[str, bool, int]:
+        """
+        Hashes a file and, if the store lacks its content, copies it into a new object (hashing
+        the copy again, so a file changing in between is stored under the digest of what was
+        copied). Returns (digest, stored, bytes).
+        """
+        hexdigest = DigestCache.hash_file(path)
+        if os.path.exists(self.object_path(hexdigest)):
+            return hexdigest, False, 0
+        digest = hashlib.sha256()
+        tmp = self._tmp_path()
+        size = 0
+        with open(path, 'rb') as src, open(tmp, 'wb') as dst:
+            for chunk in iter(lambda: src.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+                dst.write(chunk)
+                size += len(chunk)
+        hexdigest = digest.hexdigest()
+        return hexdigest, self._write_object(tmp, hexdigest), size
+
+    def _ingest_bytes(self, data: bytes) -> Tuple[str, bool, int]:
+        hexdigest = hashlib.sha256(data).hexdigest()
+        if os.path.exists(self.object_path(hexdigest)):
+            return hexdigest, False, 0
+        tmp = self._tmp_path()
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        return hexdigest, self._write_object(tmp, hexdigest), len(data)
+
+    def _cached_entry(self, relative: str, dir_entry: os.DirEntry) -> Optional[Entry]:
+        """The entry for an unchanged regular file whose object is stored, else None."""
+        st = dir_entry.stat(follow_symlinks=False)
+        digest = None if stat.S_ISLNK(st.st_mode) else self.digests.lookup(dir_entry.path, st)
+        if digest and os.path.exists(self.object_path(digest)):
+            return Entry(relative, digest, st.st_size, st.st_mode, st.st_mtime_ns)
+        return None
+
+    def _entry(self, relative: str, dir_entry: os.DirEntry, stats: SnapshotStats) -> Entry:
+        st = dir_entry.stat(follow_symlinks=False)
+        if stat.S_ISLNK(st.st_mode):
+            digest, stored, written = self._ingest_bytes(os.fsencode(os.readlink(dir_entry.path)))
+        else:
+            digest, stored, written = self._ingest_file(dir_entry.path)
+            self.digests.record(dir_entry.path, st, digest)
+            with self._lock:
+                stats.hashed += 1
+        if stored:
+            with self._lock:
+                stats.stored += 1
+                stats.stored_bytes += written
+        return Entry(relative, digest, st.st_size, st.st_mode, st.st_mtime_ns)
+
+    # -- snapshots
+
+    def snapshot(self, source: str, exclude: Sequence[str] = DEFAULT_EXCLUDE) -> Tuple[Manifest, SnapshotStats]:
+        """
+        Records the current state of source.
+
+        Args:
+            source (str): Directory to snapshot.
+            exclude (Sequence[str]): File or directory names skipped at any depth.
+
+        Returns:
+            Tuple[Manifest, SnapshotStats]: The saved manifest and what it cost.
+        """
+        start = time.perf_counter()
+        source = os.path.abspath(source)
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.manifests_dir, exist_ok=True)
+        stats = SnapshotStats()
+        store = os.path.abspath(self.root)
+        files = [(rel, e) for rel, e in scan_tree(source, exclude)
+                 if not os.path.abspath(e.path).startswith(store + os.sep)]
+        entries = [self._cached_entry(relative, e) for relative, e in files]
+        misses = [i for i, entry in enumerate(entries) if entry is None]
+        if misses:
+            # only changed files are read; hashlib releases the GIL, so they hash in parallel
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                for i, entry in zip(misses, pool.map(lambda i: self._entry(*files[i], stats), misses)):
+                    entries[i] = entry
+        stats.files = len(entries)
+        created = time.time()
+        body = json.dumps([list(e) for e in entries], separators=(',', ':')).encode()
+        snapshot_id = f"{time.strftime('%Y%m%d_%H%M%S', time.localtime(created))}-{hashlib.sha256(body).hexdigest()[:12]}"
+        manifest = Manifest(snapshot_id, source, created, entries)
+        tmp = os.path.join(self.manifests_dir, f".{snapshot_id}.tmp")
+        with open(tmp, 'w') as f:
+            f.write(json.dumps(manifest.to_dict(), separators=(',', ':')))
+        os.replace(tmp, self.manifest_path(snapshot_id))
+        self.digests.save()
+        stats.elapsed = time.perf_counter() - start
+        return manifest, stats
+
+    def manifest_path(self, snapshot_id: str) -> str:
+        return os.path.join(self.manifests_dir, f"{snapshot_id}.json")
+
+    def load(self, snapshot_id: str) -> Manifest:
+        with open(self.manifest_path(snapshot_id)) as f:
+            return Manifest.from_dict(json.load(f))
+
+    def list(self) -> List[str]:
+        """Snapshot ids, oldest first."""
+        try:
+            names = os.listdir(self.manifests_dir)
+        except FileNotFoundError:
+            return []
+        return sorted(name[:-len('.json')] for name in names if name.endswith('.json'))
+
+    def restore(self, snapshot_id: str, dest: str, link: bool = True):
+        """
+        Materialises a snapshot into dest (which should be empty or absent).
+
+        Args:
+            link (bool): Hardlink objects into place, which only applies to files recorded
+                read-only (0o444, the objects' own mode); writable or executable files are
+                always copied and given their recorded mode.
+        """
+        for entry in self.load(snapshot_id).entries:
+            target = os.path.join(dest, *entry.path.split('/'))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            obj = self.object_path(entry.digest)
+            if stat.S_ISLNK(entry.mode):
+                with open(obj, 'rb') as f:
+                    os.symlink(os.fsdecode(f.read()), target)
+                continue
+            # a link shares the object's inode and so its read-only mode; a file recorded with any
+            # other mode (0o644, +x, ...) is copied, since chmod on a link would change the object
+            if link and stat.S_IMODE(entry.mode) == stat.S_IMODE(os.stat(obj).st_mode):
+                try:
+                    os.link(obj, target)
+                    continue
+                except OSError:
+                    pass  # other filesystem, or links unsupported
+            shutil.copyfile(obj, target)
+            os.chmod(target, stat.S_IMODE(entry.mode))
+
+    def delete(self, snapshot_id: str):
+        os.unlink(self.manifest_path(snapshot_id))
+
+    def gc(self) -> int:
+        """Removes objects no manifest refers to; returns how many were removed."""
+        live = set()
+        for snapshot_id in self.list():
+            live.update(entry.digest for entry in self.load(snapshot_id).entries)
+        removed = 0
+        if not os.path.isdir(self.objects_dir):
+            return 0
+        for prefix in os.listdir(self.objects_dir):
+            directory = os.path.join(self.objects_dir, prefix)
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                if prefix + name not in live:
+                    os.unlink(os.path.join(directory, name))
+                    removed += 1
+        return removed
@@ -6,4 +6,164 @@ import sys
 import subprocess
 from datetime import datetime, date
 from dataclasses import dataclass, field, fields
-from typing import List, Tuple, Dict, Any
\ No newline at end of file
+from typing import List, Tuple, Dict, Any, Callable, Iterator, Optional, Sequence
+import stat
+import time
+import fnmatch
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+"""
+A parallel directory walker on os.scandir.
+
+Each directory is scanned by a worker thread, and the directories it finds are queued for the
+pool, so slow (cold cache, network) trees are read with max_workers requests in flight
+instead of one. Names in `prune` (by default .git) and paths matching an `exclude` glob are
+never entered; `include` globs select which entries are reported. Globs are matched against
+both the '/'-separated path relative to the root and the bare name.
+
+A `visit` callback runs in the worker that scanned the entry, with the DirEntry whose stat
+result is cached after the first call, so per-entry work such as chmod() touches each inode
+once and only changes what differs. Entries are reported in no particular order.
+"""
+
+DEFAULT_PRUNE = ('.git',)
+
+
+@dataclass
+class WalkStats:
+    dirs: int = 0
+    files: int = 0  # everything that is not a directory: files, symlinks, sockets...
+    pruned: int = 0  # excluded directories that were not entered
+    changed: int = 0  # entries visit() reported as changed
+    errors: List[Tuple[str, OSError]] = field(default_factory=list)  # (relative path, error)
+    elapsed: float = 0.0
+
+
+def _glob_matcher(patterns: Sequence[str]) -> Optional[Callable[[str], Optional[re.Match]]]:
+    if not patterns:
+        return None
+    return re.compile('|'.join(f"(?:{fnmatch.translate(p)})" for p in patterns)).match
+
+
+@dataclass
+class TreeWalker:
+    """
+    Args:
+        root (str): Directory to walk; it is not itself reported.
+        include (Sequence[str]): Globs; when given, only matching entries are reported (all
+            directories are still entered).
+        exclude (Sequence[str]): Globs for entries to skip; excluded directories are not entered.
+        prune (Sequence[str]): Directory names never entered.
+        max_workers (int): Directories scanned at once.
+    """
+    root: str
+    include: Sequence[str] = ()
+    exclude: Sequence[str] = ()
+    prune: Sequence[str] = DEFAULT_PRUNE
+    max_workers: int = 8
+    stats: WalkStats = field(default_factory=WalkStats)
+
+    def __post_init__(self):
+        self._include = _glob_matcher(self.include)
+        self._exclude = _glob_matcher(self.exclude)
+        self._prune = frozenset(self.prune)
+
+    def _matches(self, matcher, path: str, name: str) -> bool:
+        return bool(matcher(path) or (name != path and matcher(name)))
+
+    def _scan(self, relative: str, dirs: bool, files: bool,
+              visit: Optional[Callable[[str, os.DirEntry], bool]]) -> tuple:
+        """Scans one directory: (reported entries, subdirectories, counts, errors)."""
+        found, subdirs, errors = [], [], []
+        n_dirs = n_files = pruned = changed = 0
+        try:
+            with os.scandir(os.path.join(self.root, relative)) as it:
+                entries = list(it)
+        except OSError as e:
+            return found, subdirs, (0, 0, 0, 0), [(relative, e)]
+        for entry in entries:
+            path = f"{relative}/{entry.name}" if relative else entry.name
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+            except OSError:
+                is_dir = False
+            if (is_dir and entry.name in self._prune) or (self._exclude and self._matches(self._exclude, path, entry.name)):
+                pruned += is_dir
+                continue
+            if is_dir:
+                subdirs.append(path)
+                n_dirs += 1
+            else:
+                n_files += 1
+            if not (dirs if is_dir else files):
+                continue
+            if self._include and not self._matches(self._include, path, entry.name):
+                continue
+            if visit is not None:
+                try:
+                    changed += bool(visit(path, entry))
+                except OSError as e:
+                    errors.append((path, e))
+            found.append((path, entry))
+        return found, subdirs, (n_dirs, n_files, pruned, changed), errors
+
+    def walk(self, dirs: bool = True, files: bool = True,
+             visit: Optional[Callable[[str, os.DirEntry], bool]] = None) -> Iterator[Tuple[str, os.DirEntry]]:
+        """
+        Yields (relative path, DirEntry) for every reported entry under root.
+
+        Args:
+            dirs (bool): Report directories.
+            files (bool): Report everything else.
+            visit (Callable[[str, os.DirEntry], bool]): Called in a worker thread for each reported
+                entry; a truthy return counts as a change. OSErrors are recorded in stats.errors.
+        """
+        self.stats = stats = WalkStats()
+        start = time.perf_counter()
+        pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            pending = {pool.submit(self._scan, '', dirs, files, visit)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    found, subdirs, counts, errors = future.result()
+                    pending.update(pool.submit(self._scan, sub, dirs, files, visit) for sub in subdirs)
+                    stats.dirs += counts[0]
+                    stats.files += counts[1]
+                    stats.pruned += counts[2]
+                    stats.changed += counts[3]
+                    stats.errors.extend(errors)
+                    yield from found
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)  # also when the caller stops early
+            stats.elapsed = time.perf_counter() - start
+
+    def files(self) -> Iterator[Tuple[str, os.DirEntry]]:
+        return self.walk(dirs=False)
+
+    def run(self, visit: Callable[[str, os.DirEntry], bool], dirs: bool = True, files: bool = True) -> WalkStats:
+        """Calls visit on every reported entry and returns the walk's stats."""
+        for _ in self.walk(dirs, files, visit):
+            pass
+        return self.stats
+
+    def chmod(self, mode: int, dir_mode: Optional[int] = None) -> WalkStats:
+        """
+        Sets the permission bits of every reported file (mode) and directory (dir_mode, by default
+        mode), skipping entries that already have them. Symlinks are left alone.
+
+        Returns:
+            WalkStats: stats.changed is the number of entries chmod()ed.
+        """
+        file_bits = stat.S_IMODE(mode)
+        dir_bits = file_bits if dir_mode is None else stat.S_IMODE(dir_mode)
+
+        def fix(path: str, entry: os.DirEntry) -> bool:
+            if entry.is_symlink():
+                return False
+            bits = dir_bits if entry.is_dir(follow_symlinks=False) else file_bits
+            if stat.S_IMODE(entry.stat(follow_symlinks=False).st_mode) == bits:
+                return False
+            os.chmod(entry.path, bits)
+            return True
+        return self.run(fix)
@@ -1,13 +1,15 @@
 import os
 import sys
+import atexit
+import queue
 import threading
 from datetime import datetime, date
 from time import sleep
 import logging
 from logging.config import dictConfig
-from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener, HTTPHandler
-from dotenv import load_dotenv
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 import json
+from src.utils import logsample
 
 """
 The Lager class provides centralized logging configuration and management for ele.
@@ -27,8 +29,22 @@ The following environment variables control log levels and handlers:
 * **D_LOGGER, I_LOGGER, W_LOGGER, E_LOGGER, C_LOGGER:**
     * **None:**  Do not add a level-specific handler; inherit from the parent logger.
     * **File Path (e.g., 'logs/errors.log'):** Create a rotating file handler.
-    * **HTTP Address (e.g., 'https://logs.example.com/api'):** Create an HTTP handler.  
+    * **HTTP Address (e.g., 'https://logs.example.com/api'):** Create a batching HTTP shipping handler (see src/utils/logship.py).  
     * **Queue Name (e.g., 'log_queue'):** Create a queue handler (requires other parts of your application to set up the queue).
+* **LAGER_FORMAT:**
+    * 'text' (default) writes the free-text lines below; 'binary' writes compact structured segments (`logs/app.lgr`, see src/utils/logfmt.py).
+    * Binary segments get sidecar time/level indexes as they rotate; query them with `ele-logs` (src/utils/logindex.py).
+    * `ele-logs` requires 'binary': text logs are not indexed, and it refuses them instead of returning nothing.
+* **LAGER_COMPRESS, LAGER_ROTATE_INTERVAL, LAGER_RETENTION_BYTES:**
+    * When LAGER_COMPRESS ('gzip' or 'lzma') is set, text log files rotate by renaming only and are compressed by a background worker (see src/utils/logrotate.py).
+    * LAGER_ROTATE_INTERVAL adds wall-clock rotation every N seconds; LAGER_RETENTION_BYTES caps the total size of compressed backups.
+* **LAGER_SAMPLE, LAGER_RATE_LIMIT:**
+    * Hot-path controls for the root logger and its branches (see src/utils/logsample.py): LAGER_SAMPLE keeps a fraction of records per level ('DEBUG=0.01,INFO=0.5'); LAGER_RATE_LIMIT is a per-call-site token bucket ('rate[:burst]').
+    * Per-logger controls can be given under a "lager" key in the file passed to `from_config`.
+* **LAGER_ASYNC, LAGER_QUEUE_SIZE, LAGER_OVERFLOW:**
+    * When LAGER_ASYNC is set, callers only enqueue records onto a bounded queue and a single listener thread owns every real handler.
+    * LAGER_QUEUE_SIZE bounds the queue (default 10000); LAGER_OVERFLOW is one of 'block', 'drop_oldest' or 'drop'.
+* **Worker processes:** `Lager.start_aggregator()` / `Lager.worker_pool()` keep every file handler in the parent; workers ship records to it over a multiprocessing queue (see src/utils/logmp.py).
 
 **Handler Specifications**
 Handlers in environment variables are specified as comma-separated values with the following format:
@@ -74,9 +90,89 @@ LOGGING_CONFIG = {
 }
 
 
+OVERFLOW_POLICIES = ('block', 'drop_oldest', 'drop')
+
+
+class BoundedQueueHandler(QueueHandler):
+    """QueueHandler for a bounded queue with a configurable overflow policy.
+
+    * **block:** wait for room on the queue (up to `timeout` seconds, forever if None).
+    * **drop_oldest:** evict the oldest queued record to make room for the new one.
+    * **drop:** discard the new record.
+
+    Every discarded record is counted in `dropped`.
+    """
+
+    def __init__(self, queue, overflow='block', timeout=None):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        super().__init__(queue)
+        self.overflow = overflow
+        self.timeout = timeout
+        self.dropped = 0
+        self._drop_lock = threading.Lock()
+
+    def enqueue(self, record):
+        try:
+            if self.overflow == 'block':
+                self.queue.put(record, timeout=self.timeout)
+            else:
+                self.queue.put_nowait(record)
+            return
+        except queue.Full:
+            if self.overflow != 'drop_oldest':
+                self._count_drop()
+                return
+        with self._drop_lock:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                pass
+            self.dropped += 1
+            try:
+                self.queue.put_nowait(record)
+            except queue.Full:
+                self.dropped += 1
+
+    def _count_drop(self):
+        with self._drop_lock:
+            self.dropped += 1
+
+
+class FlushingQueueListener(QueueListener):
+    """QueueListener that drains the whole queue and flushes its handlers on stop()."""
+
+    def enqueue_sentinel(self):
+        # The stock listener uses put_nowait, which raises on a full bounded queue;
+        # blocking here is safe because the listener thread is still draining.
+        self.queue.put(self._sentinel)
+
+    def stop(self):
+        super().stop()
+        for handler in self.handlers:
+            try:
+                handler.flush()
+            except Exception:
+                pass
+
+
+FILE_HANDLER_CLASSES = {
+    'text': ('logging.handlers.RotatingFileHandler', '.log'),
+    'binary': ('src.utils.logindex.IndexedFileHandler', '.lgr'),
+}
+COMPRESSING_HANDLER_CLASS = 'src.utils.logrotate.CompressingRotatingFileHandler'
+
+
 class Lager:
     _lock = threading.Lock()
     root_logger = None
+    queue_handler = None
+    queue_listener = None
+    aggregator_queue = None
+    _restart = None
+    file_format = 'text'
+    rotation = None  # CompressingRotatingFileHandler options, see select_rotation()
+    hot_path = False
     LOGGING_CONFIG = LOGGING_CONFIG
 
     @classmethod
@@ -86,12 +182,163 @@ class Lager:
         Returns:
             logging.Logger: The root logger instance.
         """
+        if cls.root_logger is None and os.getenv('LAGER_FORMAT'):
+            cls.select_format(os.getenv('LAGER_FORMAT'))
+        if cls.root_logger is None and os.getenv('LAGER_COMPRESS'):
+            cls.select_rotation(compression=os.getenv('LAGER_COMPRESS'),
+                                interval=float(os.getenv('LAGER_ROTATE_INTERVAL', 0)),
+                                retention_bytes=int(os.getenv('LAGER_RETENTION_BYTES', 0)) or None)
         with cls._lock:
-            if cls.root_logger is None:
+            configured = cls.root_logger is None
+            if configured:
                 logging.config.dictConfig(cls.LOGGING_CONFIG)
                 cls.root_logger = logging.getLogger()
+        if configured and (os.getenv('LAGER_SAMPLE') or os.getenv('LAGER_RATE_LIMIT')):
+            cls.configure_hot_path(logsample.from_env(os.getenv('LAGER_SAMPLE'), os.getenv('LAGER_RATE_LIMIT')))
+        if configured and os.getenv('LAGER_ASYNC'):
+            cls.start_async(maxsize=int(os.getenv('LAGER_QUEUE_SIZE', 10000)),
+                            overflow=os.getenv('LAGER_OVERFLOW', 'block'))
         return cls.root_logger
 
+    @classmethod
+    def select_format(cls, file_format):
+        """Selects the on-disk format of the rotating file handlers.
+
+        Args:
+            file_format (str): 'text' for formatted lines or 'binary' for structured segments.
+        """
+        if file_format not in FILE_HANDLER_CLASSES:
+            raise ValueError(f"Unknown log format: {file_format}")
+        handler_class, suffix = FILE_HANDLER_CLASSES[file_format]
+        for handler in cls.LOGGING_CONFIG['handlers'].values():
+            if handler.get('class') in [c for c, _ in FILE_HANDLER_CLASSES.values()]:
+                handler['class'] = handler_class
+                root, ext = os.path.splitext(handler['filename'])
+                if ext in [s for _, s in FILE_HANDLER_CLASSES.values()]:
+                    handler['filename'] = root + suffix
+        cls.file_format = file_format
+
+    @classmethod
+    def select_rotation(cls, compression='gzip', interval=0, retention_bytes=None):
+        """Makes text file handlers rotate by rename and compress backups in the background.
+
+        Args:
+            compression (str): 'gzip', 'lzma' or None.
+            interval (float): Also rotate every `interval` seconds (0 rotates on size only).
+            retention_bytes (int): Byte budget across a file's compressed backups; defaults to
+                the handler's former maxBytes * backupCount.
+        """
+        cls.rotation = {'compression': compression, 'interval': interval, 'retentionBytes': retention_bytes}
+        for handler in cls.LOGGING_CONFIG['handlers'].values():
+            cls._apply_rotation(handler)
+
+    @classmethod
+    def _apply_rotation(cls, handler):
+        if cls.rotation is None or handler.get('class') not in (FILE_HANDLER_CLASSES['text'][0], COMPRESSING_HANDLER_CLASS):
+            return handler
+        budget = handler.get('maxBytes', 0) * handler.pop('backupCount', 0) or handler.get('retentionBytes')
+        handler.update(cls.rotation, **{'class': COMPRESSING_HANDLER_CLASS})
+        handler['retentionBytes'] = cls.rotation['retentionBytes'] or budget or 100*1024*1024
+        return handler
+
+    @classmethod
+    def start_async(cls, maxsize=10000, overflow='block', timeout=None):
+        """Switches the root logger to non-blocking mode.
+
+        Every handler currently attached to the root logger is handed to a single
+        background listener; callers only enqueue records onto a bounded queue.
+
+        Args:
+            maxsize (int): Maximum number of queued records.
+            overflow (str): One of 'block', 'drop_oldest' or 'drop'.
+            timeout (float): Seconds to wait for room when overflow is 'block' (None waits forever).
+
+        Returns:
+            BoundedQueueHandler: The handler now attached to the root logger.
+        """
+        log_queue = queue.Queue(maxsize)
+        return cls._attach_listener(FlushingQueueListener, log_queue,
+                                    BoundedQueueHandler(log_queue, overflow=overflow, timeout=timeout),
+                                    (cls.start_async, {'maxsize': maxsize, 'overflow': overflow, 'timeout': timeout}))
+
+    @classmethod
+    def start_aggregator(cls, log_queue=None):
+        """Makes this process the single writer for itself and its worker processes.
+
+        The root logger's handlers move to a listener thread fed by a multiprocessing queue;
+        workers started with `logmp.init_worker` (see worker_pool) ship their records to it.
+        Shut worker pools down before calling stop_async() so their last batches are written.
+
+        Args:
+            log_queue (multiprocessing.Queue): Queue to reuse; a new one is created if None.
+
+        Returns:
+            multiprocessing.Queue: The queue to hand to logmp.init_worker.
+        """
+        import multiprocessing  # deferred: most runs never start worker processes
+        from src.utils import logmp
+
+        if cls.aggregator_queue is not None:
+            return cls.aggregator_queue
+        if cls.queue_handler is not None:
+            cls.stop_async()  # thread-mode listener: its handlers move to the aggregator instead
+        log_queue = log_queue or multiprocessing.Queue()
+        handler = QueueHandler(log_queue)
+        if cls._attach_listener(logmp.AggregatingListener, log_queue, handler,
+                                (cls.start_aggregator, {'log_queue': log_queue})) is not handler:
+            raise RuntimeError("another listener attached concurrently; the aggregator queue would have no reader")
+        cls.aggregator_queue = log_queue
+        return log_queue
+
+    @classmethod
+    def worker_pool(cls, max_workers=None, **kwargs):
+        """Returns a ProcessPoolExecutor whose workers log through the aggregator, starting it if needed."""
+        from concurrent.futures import ProcessPoolExecutor
+        from src.utils import logmp
+
+        log_queue = cls.aggregator_queue or cls.start_aggregator()
+        return ProcessPoolExecutor(max_workers, initializer=logmp.init_worker,
+                                   initargs=(log_queue, cls.root_logger.level), **kwargs)
+
+    @classmethod
+    def _attach_listener(cls, listener_class, log_queue, queue_handler, restart):
+        root = cls.get_logger()
+        with cls._lock:
+            if cls.queue_handler is not None:
+                return cls.queue_handler
+            handlers = list(root.handlers)
+            cls.queue_listener = listener_class(log_queue, *handlers, respect_handler_level=True)
+            cls.queue_handler = queue_handler
+            cls._restart = restart
+            for handler in handlers:
+                root.removeHandler(handler)
+            root.addHandler(cls.queue_handler)
+            cls.queue_listener.start()
+        atexit.register(cls.stop_async)
+        return cls.queue_handler
+
+    @classmethod
+    def stop_async(cls):
+        """Flushes every queued record and hands the real handlers back to the root logger.
+
+        Returns:
+            int: The number of records dropped by the overflow policy while async mode was active.
+        """
+        with cls._lock:
+            handler, listener = cls.queue_handler, cls.queue_listener
+            if handler is None:
+                return 0
+            cls.queue_handler = cls.queue_listener = cls.aggregator_queue = None
+            cls.root_logger.removeHandler(handler)
+            listener.stop()
+            for real_handler in listener.handlers:
+                cls.root_logger.addHandler(real_handler)
+        atexit.unregister(cls.stop_async)
+        dropped = getattr(handler, 'dropped', 0)
+        if dropped:
+            cls.root_logger.warning(f"Lager dropped {dropped} records on a full queue ({handler.overflow})")
+        return dropped
+
     @classmethod
     def branch_logger(cls, name):
         """Creates a child logger with the specified name.
@@ -102,8 +349,10 @@ class Lager:
         Returns:
             logging.Logger: The child logger instance.
         """
-        branch = '.'.join([cls.root_logger.name, name])
-        return logging.getLogger(branch)
+        branch = logging.getLogger('.'.join([cls.root_logger.name, name]))
+        if cls.hot_path:
+            logsample.install(branch)
+        return branch
 
     @classmethod
     def get_logger_from_name(cls, name):
@@ -115,7 +364,25 @@ class Lager:
         Returns:
             logging.Logger:  The logger instance.
         """
-        return cls.get_logger().getChild(name)
+        logger = cls.get_logger().getChild(name)
+        if cls.hot_path:
+            logsample.install(logger)
+        return logger
+
+    @classmethod
+    def configure_hot_path(cls, config):
+        """Applies sampling and rate-limit controls, checked before any LogRecord is built.
+
+        Args:
+            config (dict): Logger name -> {'sampling': {level: probability}, 'rate': float, 'burst': int}.
+                Child loggers inherit the controls of their closest configured ancestor.
+        """
+        logsample.configure(config)
+        cls.hot_path = True
+        root = cls.get_logger()
+        prefix = root.name + '.'
+        logsample.install(root, *[logger for name, logger in logging.Logger.manager.loggerDict.items()
+                                  if name.startswith(prefix) and isinstance(logger, logging.Logger)])
 
  
     @classmethod
@@ -127,8 +394,11 @@ class Lager:
         """
         with open(config_file) as f:
             config_dict = json.load(f)
+        hot_path = config_dict.pop('lager', None)
         logging.config.dictConfig(config_dict)
         cls.root_logger = logging.getLogger()
+        if hot_path:
+            cls.configure_hot_path(hot_path)
         return cls()
 
     def __repr__(self) -> str:
@@ -136,43 +406,73 @@ class Lager:
 
     @classmethod
     def validate(cls):
-        """Validates and updates the logging configuration based on environment variables."""
+        """Validates and updates the logging configuration based on environment variables.
 
+        Level-specific handlers are attached to the root logger, whose level is lowered to the
+        lowest of them so their records get through; if logging is already configured it is
+        reconfigured, and async mode (if active) is restarted so the listener owns the new
+        handlers too.
+        """
+        config = cls.LOGGING_CONFIG
         for level, env_var_name in zip(['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'],
                                         ['D_LOGGER', 'I_LOGGER', 'W_LOGGER', 'E_LOGGER', 'C_LOGGER']):
             handler_config = os.getenv(env_var_name)
             if handler_config:
                 handlers = []
                 for handler_spec in handler_config.split(','):
-                    handler_type, *handler_args = handler_spec.split(':')
+                    handler_type, _, handler_rest = handler_spec.strip().partition(':')
+                    handler_args = handler_rest.split(':')
                     if handler_type == 'file':
-                        handlers.append({
-                            'class': 'logging.handlers.RotatingFileHandler',
+                        handlers.append(cls._apply_rotation({
+                            'class': FILE_HANDLER_CLASSES[cls.file_format][0],
                             'filename': handler_args[0],
                             'maxBytes': 10*1024*1024,  # 10MB 
                             'backupCount': 5,
-                            'formatter': 'standard'
-                        })
+                            'formatter': 'default'
+                        }))
                     elif handler_type == 'http':
                         handlers.append({
-                            'class': 'logging.handlers.HTTPHandler',
-                            'host': handler_args[0],
-                            'url': handler_args[1],  # Assuming URL is the second arg
-                            'method': 'POST',
-                            'formatter': 'standard'
+                            '()': 'src.utils.logship.ShippingHandler.from_spec',
+                            'spec': handler_rest,  # host:/url or a full http(s):// address
+                            'formatter': 'default'
                         })
                     elif handler_type == 'queue':
                         handlers.append({
                             'class': 'logging.handlers.QueueHandler',
-                            'queue': LOGGING_CONFIG['handlers']['queue']['queue']  
+                            'queue': config['handlers']['queue']['queue']  
                         })
                     else:
                         print(f"Unknown handler type: {handler_type}") 
 
+                for i, handler in enumerate(handlers):
+                    handler_name = f'{level.lower()}_handler_{i}'
+                    handler['level'] = level
+                    config['handlers'][handler_name] = handler
+                    if handler_name not in config['root']['handlers']:
+                        config['root']['handlers'].append(handler_name)
                 if handlers:
-                    handler_name = f'{level.lower()}_handler'
-                    LOGGING_CONFIG['handlers'][handler_name] = handlers
-                    LOGGING_CONFIG['loggers']['myapp']['handlers'].append(handler_name)
+                    # the root level gates records before any handler sees them, so a DEBUG handler
+                    # under an INFO root would never receive anything
+                    root_level = config['root'].get('level', logging.WARNING)
+                    if isinstance(root_level, str):
+                        root_level = logging.getLevelName(root_level)
+                    config['root']['level'] = min(root_level, getattr(logging, level))
+
+        if cls.root_logger is not None:
+            cls.reconfigure()
+
+    @classmethod
+    def reconfigure(cls):
+        """Re-applies LOGGING_CONFIG, preserving async or aggregator mode if one is active."""
+        restart = cls._restart if cls.queue_handler is not None else None
+        if restart is not None:
+            cls.stop_async()
+        with cls._lock:
+            logging.config.dictConfig(cls.LOGGING_CONFIG)
+            cls.root_logger = logging.getLogger()
+        if restart is not None:
+            start, kwargs = restart
+            start(**kwargs)
 
 if __name__ == "__main__":
     lager = Lager()
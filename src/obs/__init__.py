@@ -1,7 +1,7 @@
-from setuptools import find_packages
-
-# Use find_packages() to discover and include all packages
-packages = find_packages()
-
-# Print the list of discovered packages
-print(packages)
\ No newline at end of file
+def __getattr__(name):
+    # setuptools costs ~250ms to import, so package discovery only runs when asked for
+    if name == 'packages':
+        from setuptools import find_packages
+        globals()['packages'] = found = find_packages()
+        return found
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,389 @@
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+"""
+Wikilink/backlink graph of a vault - the `{mind_map}` graph-type object of the README.
+
+Every note, link target and tag is interned to an integer id. Edges (wikilinks, embeds and
+tags) are kept in CSR form: `indptr` (one offset per node) and parallel `indices`/`kinds`
+arrays (int32/int8), with the reverse CSR for backlinks derived from it on demand. Each edge
+also keeps the interned id of the link text it was parsed from, and every note and link text
+keeps the id of its basename, so memory is a few bytes per edge plus one name per node and per
+distinct link text.
+
+Notes are keyed by vault-relative path, case-insensitively and without the `.md` extension, so
+a/Foo.md and b/Foo.md are different nodes. Links resolve the way Obsidian does: `[[b/Foo]]` or
+`[[Foo]]` goes to the note at exactly that path if there is one, else to the note with the
+shortest path ending in it. A target with no file behind it is a ghost node; when a note with
+that name appears or disappears, its basename is marked stale and the links with that basename
+are resolved again, in one pass, at the next compact().
+
+update_file() replaces one note's out-edges in a small overlay; the CSR is rebuilt from base
+plus overlay with vectorised numpy operations the next time a query needs it. Traversals
+(k_hop, shortest_path, orphans) expand whole BFS frontiers with numpy, and k_hop/backlinks take
+batches of notes.
+"""
+
+GHOST, NOTE, TAG = 0, 1, 2  # node kinds
+LINK, EMBED, TAGGED = 0, 1, 2  # edge kinds
+
+FENCE = re.compile(r'```.*?```|~~~.*?~~~|`[^`\n]*`', re.S)
+WIKILINK = re.compile(r'(!?)\[\[([^\]\|#\^\n]*)(?:[#\^][^\]\|\n]*)?(?:\|[^\]\n]*)?\]\]')
+TAG_RE = re.compile(r'(?<![\w/#&])#([^\W\d][\w/-]*|\d+[^\W\d][\w/-]*)')
+
+
+def note_key(target: str) -> str:
+    """A link target or vault-relative path as a key: lowercase, '/'-separated, without .md."""
+    key = target.strip().replace('\\', '/').strip('/')
+    if key.lower().endswith('.md'):
+        key = key[:-3]
+    return key.lower()
+
+
+def _basename(key: str) -> str:
+    return key.rsplit('/', 1)[-1]
+
+
+def parse_note(text: str) -> List[Tuple[str, int]]:
+    """(target key, edge kind) for every wikilink, embed and #tag outside code."""
+    text = FENCE.sub(' ', text)
+    edges = []
+    for bang, target in WIKILINK.findall(text):
+        if target.strip():
+            edges.append((note_key(target), EMBED if bang else LINK))
+    for tag in TAG_RE.findall(text):
+        edges.append(('#' + tag.lower(), TAGGED))
+    return edges
+
+
+def _grow(array: np.ndarray, index: int, fill: int = 0) -> np.ndarray:
+    """array, doubled in length (new slots set to fill) if index is past its end."""
+    if index < len(array):
+        return array
+    grown = np.full(max(16, 2 * len(array)), fill, array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+def _edge_positions(indptr: np.ndarray, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Positions in the CSR arrays of every edge of rows, and the row each belongs to, without a Python loop."""
+    starts = indptr[rows]
+    lengths = indptr[rows + 1] - starts
+    total = int(lengths.sum())
+    if total == 0:
+        return np.zeros(0, np.int64), rows[:0]
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return offsets + np.arange(total), np.repeat(rows, lengths)
+
+
+@dataclass
+class LinkGraph:
+    names: List[str] = field(default_factory=list)  # id -> key ('#tag' for tags)
+    ids: Dict[str, int] = field(default_factory=dict)
+    paths: Dict[int, str] = field(default_factory=dict)  # note id -> vault-relative path
+    mtimes: Dict[str, int] = field(default_factory=dict)  # path -> mtime_ns at last parse
+    link_keys: List[str] = field(default_factory=list)  # link id -> target key as written
+    link_ids: Dict[str, int] = field(default_factory=dict)
+    basenames: Dict[str, int] = field(default_factory=dict)  # last path component -> basename id
+    _kinds: np.ndarray = field(default_factory=lambda: np.zeros(0, np.int8), repr=False)
+    _node_bases: np.ndarray = field(default_factory=lambda: np.zeros(0, np.int32), repr=False)  # node -> basename id
+    _link_bases: np.ndarray = field(default_factory=lambda: np.zeros(0, np.int32), repr=False)  # link -> basename id
+    _indptr: np.ndarray = field(default_factory=lambda: np.zeros(1, np.int64), repr=False)
+    _indices: np.ndarray = field(default_factory=lambda: np.zeros(0, np.int32), repr=False)
+    _edge_kinds: np.ndarray = field(default_factory=lambda: np.zeros(0, np.int8), repr=False)
+    _edge_links: np.ndarray = field(default_factory=lambda: np.zeros(0, np.int32), repr=False)  # edge -> link id, -1 for tags
+    _overlay: Dict[int, Tuple[np.ndarray, np.ndarray, np.ndarray]] = field(default_factory=dict, repr=False)
+    _stale: Set[int] = field(default_factory=set, repr=False)  # basename ids whose links must be resolved again
+    _reverse: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = field(default=None, repr=False)
+
+    # -- building
+
+    def intern(self, key: str, kind: int = GHOST) -> int:
+        node = self.ids.get(key)
+        if node is None:
+            node = self.ids[key] = len(self.names)
+            self.names.append(key)
+            self._kinds = _grow(self._kinds, node)
+            self._node_bases = _grow(self._node_bases, node, -1)
+        if kind != GHOST:
+            self._kinds[node] = kind
+        return node
+
+    def _basename_id(self, key: str) -> int:
+        return self.basenames.setdefault(_basename(key), len(self.basenames))
+
+    def _link_id(self, key: str) -> int:
+        link = self.link_ids.get(key)
+        if link is None:
+            link = self.link_ids[key] = len(self.link_keys)
+            self.link_keys.append(key)
+            self._link_bases = _grow(self._link_bases, link, -1)
+            self._link_bases[link] = self._basename_id(key)
+        return link
+
+    def set_edges(self, source: int, targets: Sequence[int], kinds: Sequence[int], links: Optional[Sequence[int]] = None):
+        """
+        Replaces the out-edges of source. links gives each edge's link id (-1 for none); a target
+        of -1 is resolved from its link at the next compact().
+        """
+        links = [-1] * len(targets) if links is None else links
+        self._overlay[source] = (np.asarray(targets, np.int32), np.asarray(kinds, np.int8), np.asarray(links, np.int32))
+        self._reverse = None
+
+    @staticmethod
+    def _match(key: str, candidates: Sequence[str]) -> str:
+        if key in candidates:
+            return key
+        matches = [c for c in candidates if c.endswith('/' + key)]
+        return min(matches, key=lambda c: (c.count('/'), c)) if matches else key
+
+    def resolve(self, target: str) -> str:
+        """
+        The key a link target points at: the note at exactly that path, else the note with the
+        shortest path ending in it, else the target itself (a ghost).
+        """
+        key = note_key(target)
+        base = self.basenames.get(_basename(key))
+        if base is None:
+            return key
+        notes = np.flatnonzero((self.kinds == NOTE) & (self._node_bases[:len(self.names)] == base))
+        return self._match(key, [self.names[i] for i in notes])
+
+    def _resolve_links(self, targets: np.ndarray, links: np.ndarray):
+        """Resolves, in place, the edges that have no target yet or whose basename is stale."""
+        linked = links >= 0
+        pending = linked & (targets < 0)
+        if self._stale:
+            stale = np.zeros(len(self.basenames), bool)
+            stale[list(self._stale)] = True
+            pending |= linked & stale[self._link_bases[np.where(linked, links, 0)]]
+        self._stale = set()
+        if not pending.any():
+            return
+        notes = np.flatnonzero(self.kinds == NOTE)
+        order = np.argsort(self._node_bases[notes], kind='stable')
+        notes = notes[order]
+        bases = self._node_bases[notes]
+        lookup = np.full(len(self.link_keys), -1, np.int32)
+        for link in np.unique(links[pending]):
+            lo, hi = np.searchsorted(bases, [self._link_bases[link], self._link_bases[link] + 1])
+            key = self._match(self.link_keys[link], [self.names[i] for i in notes[lo:hi]])
+            lookup[link] = self.intern(key)
+        targets[pending] = lookup[links[pending]]
+
+    def update_file(self, path: str, text: Optional[str] = None, root: str = '.'):
+        """Re-parses one note (read from root/path unless text is given) and replaces its out-edges."""
+        if text is None:
+            full = os.path.join(root, *path.split('/'))
+            with open(full, encoding='utf-8', errors='replace') as f:
+                text = f.read()
+            self.mtimes[path] = os.stat(full).st_mtime_ns
+        key = note_key(path)
+        source = self.ids.get(key)
+        if source is None or self._kinds[source] != NOTE:
+            source = self.intern(key, NOTE)
+            self._node_bases[source] = self._basename_id(key)
+            self._stale.add(int(self._node_bases[source]))
+        self.paths[source] = path
+        edges = parse_note(text)
+        targets = [self.intern(target, TAG) if kind == TAGGED else -1 for target, kind in edges]
+        links = [-1 if kind == TAGGED else self._link_id(target) for target, kind in edges]
+        self.set_edges(source, targets, [kind for _, kind in edges], links)
+
+    def remove_file(self, path: str):
+        """Drops a note's out-edges; links to it go to another note of that name, or to a ghost."""
+        self.mtimes.pop(path, None)
+        key = note_key(path)
+        node = self.ids.get(key)
+        if node is None or self._kinds[node] != NOTE:
+            return
+        self.paths.pop(node, None)
+        self._kinds[node] = GHOST
+        self.set_edges(node, [], [])
+        self._stale.add(int(self._node_bases[node]))
+    def refresh(self, root: str, suffixes: Sequence[str] = ('.md',)) -> Tuple[int, int]:
+        """Re-parses notes whose mtime changed and drops deleted ones; returns (updated, removed)."""
+        seen, updated = set(), 0
+        for directory, subdirs, files in os.walk(root):
+            subdirs[:] = [d for d in subdirs if not d.startswith('.')]
+            for name in files:
+                if not name.endswith(tuple(suffixes)):
+                    continue
+                full = os.path.join(directory, name)
+                path = os.path.relpath(full, root).replace(os.sep, '/')
+                seen.add(path)
+                try:
+                    mtime = os.stat(full).st_mtime_ns
+                except OSError:
+                    continue
+                if self.mtimes.get(path) != mtime:
+                    self.update_file(path, root=root)
+                    updated += 1
+        removed = [path for path in self.mtimes if path not in seen]
+        for path in removed:
+            self.remove_file(path)
+        return updated, len(removed)
+
+    @classmethod
+    def from_vault(cls, root: str) -> 'LinkGraph':
+        graph = cls()
+        graph.refresh(root)
+        graph.compact()
+        return graph
+
+    def compact(self):
+        """Folds the overlay into the CSR arrays, resolving new links and those a note change may have moved."""
+        if not self._overlay and not self._stale and len(self._indptr) == len(self.names) + 1:
+            return
+        old_rows = len(self._indptr) - 1
+        sources = np.repeat(np.arange(old_rows, dtype=np.int32), np.diff(self._indptr))
+        keep = np.ones(len(sources), bool)
+        if self._overlay:
+            replaced = np.zeros(max(len(self.names), 1), bool)
+            replaced[list(self._overlay)] = True
+            keep = ~replaced[sources]
+        overlay = sorted(self._overlay.items())
+        new_sources = np.concatenate([sources[keep]] + [np.full(len(t), s, np.int32) for s, (t, _, _) in overlay])
+        new_targets = np.concatenate([self._indices[keep]] + [t for _, (t, _, _) in overlay])
+        new_kinds = np.concatenate([self._edge_kinds[keep]] + [k for _, (_, k, _) in overlay])
+        new_links = np.concatenate([self._edge_links[keep]] + [l for _, (_, _, l) in overlay])
+        self._resolve_links(new_targets, new_links)
+        n = len(self.names)
+        order = np.argsort(new_sources, kind='stable')
+        self._indices, self._edge_kinds = new_targets[order].astype(np.int32), new_kinds[order].astype(np.int8)
+        self._edge_links = new_links[order].astype(np.int32)
+        self._indptr = np.zeros(n + 1, np.int64)
+        self._indptr[1:] = np.cumsum(np.bincount(new_sources, minlength=n))
+        self._overlay = {}
+        self._reverse = None
+
+    def _forward(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        self.compact()
+        return self._indptr, self._indices, self._edge_kinds
+
+    def _backward(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        indptr, indices, kinds = self._forward()
+        if self._reverse is None:
+            n = len(self.names)
+            sources = np.repeat(np.arange(n, dtype=np.int32), np.diff(indptr))
+            order = np.argsort(indices, kind='stable')
+            reverse_indptr = np.zeros(n + 1, np.int64)
+            reverse_indptr[1:] = np.cumsum(np.bincount(indices, minlength=n))
+            self._reverse = (reverse_indptr, sources[order], kinds[order])
+        return self._reverse
+
+    # -- queries
+
+    @property
+    def kinds(self) -> np.ndarray:
+        return self._kinds[:len(self.names)]
+
+    @property
+    def edge_count(self) -> int:
+        return len(self._forward()[1])
+
+    def nbytes(self) -> int:
+        """Bytes held by the graph's arrays (names and dicts not included)."""
+        arrays = [self._kinds, self._node_bases, self._link_bases, *self._forward(), self._edge_links] + list(self._reverse or ())
+        return sum(a.nbytes for a in arrays)
+
+    def node(self, note: str) -> int:
+        key = note.lower() if note.startswith('#') else self.resolve(note)
+        if key not in self.ids:
+            raise KeyError(note)
+        return self.ids[key]
+
+    def _ids(self, notes: Iterable[str]) -> np.ndarray:
+        return np.array([self.node(n) for n in notes], np.int64)
+
+    def label(self, node: int) -> str:
+        return self.paths.get(node, self.names[node])
+
+    def _default_kinds(self, node: int) -> Tuple[int, ...]:
+        return (TAGGED,) if self._kinds[node] == TAG else (LINK, EMBED)
+
+    def outlinks(self, note: str, kinds: Sequence[int] = (LINK, EMBED)) -> List[str]:
+        indptr, indices, edge_kinds = self._forward()
+        node = self.node(note)
+        row = slice(indptr[node], indptr[node + 1])
+        return [self.label(int(i)) for i in indices[row][np.isin(edge_kinds[row], kinds)]]
+
+    def backlinks(self, notes: Sequence[str], kinds: Optional[Sequence[int]] = None) -> List[List[str]]:
+        """For each note (or '#tag'), the notes linking to (or tagged with) it."""
+        indptr, indices, edge_kinds = self._backward()
+        result = []
+        for node in self._ids(notes):
+            row = slice(indptr[node], indptr[node + 1])
+            wanted = np.isin(edge_kinds[row], kinds or self._default_kinds(node))
+            result.append(sorted({self.label(int(i)) for i in indices[row][wanted]}))
+        return result
+
+    def _expand(self, frontier: np.ndarray, direction: str, kinds: Sequence[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """(from, to) pairs for every edge of the given kinds leaving the frontier."""
+        sources, targets = [frontier[:0]], [frontier[:0]]
+        for csr, used in ((self._forward, direction in ('out', 'both')), (self._backward, direction in ('in', 'both'))):
+            if not used:
+                continue
+            indptr, indices, edge_kinds = csr()
+            positions, rows = _edge_positions(indptr, frontier)
+            wanted = np.isin(edge_kinds[positions], kinds)
+            sources.append(rows[wanted])
+            targets.append(indices[positions[wanted]].astype(np.int64))
+        return np.concatenate(sources), np.concatenate(targets)
+
+    def k_hop(self, notes: Sequence[str], k: int = 2, direction: str = 'both',
+              kinds: Sequence[int] = (LINK, EMBED)) -> List[List[str]]:
+        """For each note, every node within k edges ('out', 'in' or 'both'), excluding itself."""
+        result = []
+        for start in self._ids(notes):
+            seen = np.zeros(len(self.names), bool)
+            seen[start] = True
+            frontier = np.array([start], np.int64)
+            for _ in range(k):
+                reached = np.unique(self._expand(frontier, direction, kinds)[1])
+                frontier = reached[~seen[reached]]
+                if not len(frontier):
+                    break
+                seen[frontier] = True
+            seen[start] = False
+            result.append([self.label(int(i)) for i in np.flatnonzero(seen)])
+        return result
+
+    def shortest_path(self, a: str, b: str, direction: str = 'both',
+                      kinds: Sequence[int] = (LINK, EMBED)) -> Optional[List[str]]:
+        """Fewest-edges path from a to b, or None; frontiers are expanded a whole level at a time."""
+        source, target = self.node(a), self.node(b)
+        parent = np.full(len(self.names), -1, np.int64)
+        parent[source] = source
+        frontier = np.array([source], np.int64)
+        while len(frontier) and parent[target] == -1:
+            sources, targets = self._expand(frontier, direction, kinds)
+            fresh = parent[targets] == -1
+            sources, targets = sources[fresh], targets[fresh]
+            targets, first = np.unique(targets, return_index=True)
+            parent[targets] = sources[first]
+            frontier = targets
+        if parent[target] == -1:
+            return None
+        path = [target]
+        while path[-1] != source:
+            path.append(int(parent[path[-1]]))
+        return [self.label(node) for node in reversed(path)]
+
+    def orphans(self) -> List[str]:
+        """Notes with no links or embeds in or out (tags do not count)."""
+        indptr, indices, kinds = self._forward()
+        n = len(self.names)
+        links = kinds != TAGGED
+        sources = np.repeat(np.arange(n), np.diff(indptr))
+        degree = np.bincount(sources[links], minlength=n) + np.bincount(indices[links], minlength=n)
+        return sorted(self.label(int(i)) for i in np.flatnonzero((self.kinds == NOTE) & (degree == 0)))
+
+    def ghosts(self) -> List[str]:
+        """Link targets with no note behind them."""
+        linked = np.diff(self._backward()[0]) > 0
+        return sorted(self.names[int(i)] for i in np.flatnonzero((self.kinds == GHOST) & linked))
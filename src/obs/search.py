@@ -0,0 +1,495 @@
+import os
+import re
+import sys
+import json
+import mmap
+import math
+import time
+import struct
+import hashlib
+import argparse
+from array import array
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+"""
+Incremental full-text index over the markdown notes of an Obsidian/cognosis vault.
+
+The index lives in <vault>/.ele-index/ as a JSON manifest plus immutable segment files. Each
+segment holds a sorted term dictionary and positional postings as flat arrays:
+
+* term_bytes / term_offsets: the terms, utf-8, sorted bytewise;
+* post_offsets: per term, its slice of doc_ids and tfs;
+* pos_offsets / positions: per posting, its slice of token positions.
+
+Segments are memory-mapped and read with numpy.frombuffer, so opening an index costs a manifest
+load, and a term lookup is a bisect over the dictionary. update() stats the vault, re-hashes only
+files whose (size, mtime) moved, writes the changed notes into one new segment and marks their
+previous versions deleted. Once there are more than MAX_SEGMENTS segments they are merged, from
+their postings, into one holding only the live notes, renumbered densely so doc ids stay bounded.
+search() ranks with BM25 over the live documents; quoted phrases must match consecutive positions.
+"""
+
+INDEX_DIR = '.ele-index'
+MAGIC = b'OBX1'
+MAX_SEGMENTS = 8
+NOTE_SUFFIXES = ('.md',)
+TOKEN = re.compile(r'\w+', re.UNICODE)
+QUERY = re.compile(r'"([^"]*)"|(\S+)')
+BM25_K1, BM25_B = 1.2, 0.75
+ARRAYS = (('term_offsets', np.uint64), ('term_bytes', np.uint8), ('post_offsets', np.uint64),
+          ('doc_ids', np.uint32), ('tfs', np.uint32), ('pos_offsets', np.uint64), ('positions', np.uint32))
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN.findall(text.lower())
+
+
+def write_segment(path: str, docs: Iterable[Tuple[int, List[str]]]):
+    """Writes one segment from (doc_id, tokens) pairs, doc ids ascending."""
+    # one dict lookup per token; grouping into postings is done by numpy sorts, not Python dicts
+    vocabulary: Dict[str, int] = {}
+    term_col, doc_col, pos_col = array('I'), array('I'), array('I')
+    for doc_id, tokens in docs:
+        term_col.extend([vocabulary.setdefault(token, len(vocabulary)) for token in tokens])
+        doc_col.extend([doc_id] * len(tokens))
+        pos_col.extend(range(len(tokens)))
+    terms = sorted(vocabulary, key=lambda t: t.encode())
+    encoded = [t.encode() for t in terms]
+    rank = np.empty(len(terms), np.uint32)
+    rank[[vocabulary[t] for t in terms]] = np.arange(len(terms), dtype=np.uint32)
+    term_ids = rank[np.frombuffer(term_col, np.uint32)] if len(term_col) else np.zeros(0, np.uint32)
+    _write_columns(path, encoded, term_ids, np.frombuffer(doc_col, np.uint32), np.frombuffer(pos_col, np.uint32))
+
+
+def _write_columns(path: str, encoded: List[bytes], term_ids: np.ndarray, doc_ids_all: np.ndarray,
+                   positions: np.ndarray):
+    """Writes one segment from per-token columns; term_ids index encoded, which is sorted bytewise."""
+    order = np.lexsort((positions, doc_ids_all, term_ids))
+    term_ids, doc_ids_all, positions = term_ids[order], doc_ids_all[order], positions[order]
+    # a posting starts wherever the (term, doc) pair changes
+    starts = np.flatnonzero(np.r_[True, (term_ids[1:] != term_ids[:-1]) | (doc_ids_all[1:] != doc_ids_all[:-1])]) \
+        if len(term_ids) else np.zeros(0, np.int64)
+    pos_offsets = np.r_[starts, len(term_ids)].astype(np.uint64)
+    term_offsets = np.zeros(len(encoded) + 1, np.uint64)
+    term_offsets[1:] = np.cumsum([len(t) for t in encoded])
+    post_offsets = np.searchsorted(term_ids[starts], np.arange(len(encoded) + 1)).astype(np.uint64)
+    arrays = {
+        'term_offsets': term_offsets, 'term_bytes': np.frombuffer(b''.join(encoded), np.uint8),
+        'post_offsets': post_offsets, 'doc_ids': doc_ids_all[starts], 'tfs': np.diff(pos_offsets).astype(np.uint32),
+        'pos_offsets': pos_offsets, 'positions': positions,
+    }
+    layout, offset = {}, 0
+    for name, dtype in ARRAYS:
+        offset = (offset + 7) // 8 * 8  # keep every array 8-byte aligned for frombuffer
+        layout[name] = [offset, len(arrays[name])]
+        offset += arrays[name].nbytes
+    header = json.dumps({'terms': len(encoded), 'arrays': layout}).encode()
+    base = (len(MAGIC) + 4 + len(header) + 7) // 8 * 8
+    tmp = f"{path}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(MAGIC + struct.pack('<I', len(header)) + header)
+        for name, dtype in ARRAYS:
+            start = base + layout[name][0]
+            f.write(b'\0' * (start - f.tell()))
+            f.write(arrays[name].astype(dtype, copy=False).tobytes())
+    os.replace(tmp, path)
+
+
+class Segment:
+    """Read-only, memory-mapped view of a segment file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else None
+        data = self._mmap
+        if data is None or data[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not an index segment")
+        (length,) = struct.unpack_from('<I', data, len(MAGIC))
+        header = json.loads(data[len(MAGIC) + 4:len(MAGIC) + 4 + length])
+        base = (len(MAGIC) + 4 + length + 7) // 8 * 8
+        self.terms = header['terms']
+        for name, dtype in ARRAYS:
+            offset, count = header['arrays'][name]
+            setattr(self, name, np.frombuffer(data, dtype, count, base + offset))
+
+    def term(self, i: int) -> bytes:
+        return self.term_bytes[int(self.term_offsets[i]):int(self.term_offsets[i + 1])].tobytes()
+
+    def find(self, term: str) -> Optional[int]:
+        key = term.encode()
+        lo, hi = 0, self.terms
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.term(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < self.terms and self.term(lo) == key else None
+
+    def postings(self, term: str) -> Tuple[np.ndarray, np.ndarray, int]:
+        """(doc_ids, tfs, index of the first posting) for term; empty arrays if absent."""
+        i = self.find(term)
+        if i is None:
+            return self.doc_ids[:0], self.tfs[:0], 0
+        start, end = int(self.post_offsets[i]), int(self.post_offsets[i + 1])
+        return self.doc_ids[start:end], self.tfs[start:end], start
+
+    def positions_of(self, posting: int) -> np.ndarray:
+        return self.positions[int(self.pos_offsets[posting]):int(self.pos_offsets[posting + 1])]
+
+    def close(self):
+        for name, _ in ARRAYS:
+            setattr(self, name, None)  # release the buffer exports before closing the map
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass  # a caller still holds a view; the map is released with it
+
+
+@dataclass
+class UpdateStats:
+    scanned: int = 0
+    indexed: int = 0  # new or changed notes written to a segment
+    removed: int = 0
+    touched: int = 0  # mtime moved but content identical
+    compacted: bool = False
+    elapsed: float = 0.0
+
+
+@dataclass
+class Hit:
+    path: str
+    score: float
+
+
+@dataclass
+class VaultIndex:
+    vault: str
+    index_dir: Optional[str] = None
+    suffixes: Sequence[str] = NOTE_SUFFIXES
+    max_segments: int = MAX_SEGMENTS
+    docs: Dict[str, list] = field(default_factory=dict)  # path -> [doc_id, size, mtime_ns, sha1, length]
+    segments: List[str] = field(default_factory=list)
+    next_id: int = 0
+    generation: int = 0  # segments written so far, for unique file names (doc ids are reused)
+    _open: Dict[str, Segment] = field(default_factory=dict, repr=False)
+    _by_id: Optional[tuple] = field(default=None, repr=False)
+
+    def __post_init__(self):
+        self.vault = os.path.abspath(self.vault)
+        self.index_dir = self.index_dir or os.path.join(self.vault, INDEX_DIR)
+        try:
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+            self.docs, self.segments, self.next_id = manifest['docs'], manifest['segments'], manifest['next_id']
+            self.generation = manifest.get('generation', self.next_id)
+        except (OSError, ValueError, KeyError):
+            pass
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.index_dir, 'manifest.json')
+
+    def _save(self):
+        tmp = f"{self.manifest_path}.tmp"
+        with open(tmp, 'w') as f:
+            f.write(json.dumps({'docs': self.docs, 'segments': self.segments, 'next_id': self.next_id,
+                                'generation': self.generation}, separators=(',', ':')))
+        os.replace(tmp, self.manifest_path)
+
+    def _segment_name(self, suffix: str = '') -> str:
+        self.generation += 1
+        return f"seg{self.generation:010d}{suffix}.obx"
+
+    def _unlink(self, names: Iterable[str]):
+        """Deletes segment files that the saved manifest no longer lists."""
+        for name in names:
+            self._forget(name)
+            try:
+                os.unlink(os.path.join(self.index_dir, name))
+            except FileNotFoundError:
+                pass
+
+    # -- maintenance
+
+    def scan(self) -> Iterator[Tuple[str, os.stat_result]]:
+        """(relative path, stat) for every note, skipping dot directories (.obsidian, .git, the index)."""
+        stack = [self.vault]
+        while stack:
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        if entry.name.startswith('.'):
+                            continue
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.name.endswith(tuple(self.suffixes)) and entry.is_file():
+                            yield os.path.relpath(entry.path, self.vault).replace(os.sep, '/'), entry.stat()
+            except OSError:
+                continue
+
+    def update(self) -> UpdateStats:
+        """Brings the index in line with the vault, indexing only new and changed notes."""
+        start = time.perf_counter()
+        stats = UpdateStats()
+        os.makedirs(self.index_dir, exist_ok=True)
+        seen, changed = set(), []
+        for path, st in self.scan():
+            stats.scanned += 1
+            seen.add(path)
+            doc = self.docs.get(path)
+            if doc is None or doc[1] != st.st_size or doc[2] != st.st_mtime_ns:
+                changed.append((path, st))
+        removed = [path for path in self.docs if path not in seen]
+        for path in removed:
+            del self.docs[path]
+        stats.removed = len(removed)
+
+        batch = []
+        for path, st in changed:
+            try:
+                with open(os.path.join(self.vault, *path.split('/')), 'rb') as f:
+                    raw = f.read()
+            except OSError:
+                self.docs.pop(path, None)
+                continue
+            digest = hashlib.sha1(raw).hexdigest()
+            doc = self.docs.get(path)
+            if doc is not None and doc[3] == digest:
+                doc[1], doc[2] = st.st_size, st.st_mtime_ns
+                stats.touched += 1
+                continue
+            tokens = tokenize(raw.decode('utf-8', errors='replace'))
+            self.docs[path] = [self.next_id, st.st_size, st.st_mtime_ns, digest, len(tokens)]
+            batch.append((self.next_id, tokens))
+            self.next_id += 1
+        stats.indexed = len(batch)
+        if batch:
+            name = self._segment_name()
+            write_segment(os.path.join(self.index_dir, name), batch)
+            self.segments.append(name)
+        obsolete = []
+        if len(self.segments) > self.max_segments:
+            obsolete = self._compact()
+            stats.compacted = True
+        self._save()
+        self._unlink(obsolete)  # only once the manifest no longer points at them
+        self._by_id = None
+        stats.elapsed = time.perf_counter() - start
+        return stats
+
+    def _compact(self) -> List[str]:
+        """
+        Merges the segments into one holding only the live notes, renumbered densely from 0.
+
+        The merge reads the existing postings rather than the notes, so the segment matches the
+        (size, mtime, sha1) recorded for each note even if a file changed since it was indexed.
+
+        Returns:
+            List[str]: The replaced segments, to delete once the manifest has been saved.
+        """
+        remap = np.full(self.next_id, -1, np.int64)
+        for new_id, (path, doc) in enumerate(sorted(self.docs.items(), key=lambda item: item[1][0])):
+            remap[doc[0]] = new_id
+            doc[0] = new_id
+        vocabulary: Dict[bytes, int] = {}
+        columns = []
+        for name in self.segments:
+            segment = self._segment(name)
+            local = np.array([vocabulary.setdefault(segment.term(i), len(vocabulary))
+                              for i in range(segment.terms)], np.int64)
+            posting_terms = np.repeat(local, np.diff(segment.post_offsets.astype(np.int64)))
+            lengths = np.diff(segment.pos_offsets.astype(np.int64))
+            doc_ids = remap[np.repeat(segment.doc_ids.astype(np.int64), lengths)]
+            keep = doc_ids >= 0
+            columns.append((np.repeat(posting_terms, lengths)[keep], doc_ids[keep], segment.positions[keep]))
+        encoded = sorted(vocabulary)
+        rank = np.empty(len(encoded), np.int64)
+        rank[[vocabulary[t] for t in encoded]] = np.arange(len(encoded))
+        term_ids, doc_ids, positions = (np.concatenate([c[i] for c in columns]) if columns else np.zeros(0, np.int64)
+                                        for i in range(3))
+        term_ids = rank[term_ids]
+        present = np.unique(term_ids)  # drop terms only superseded notes used
+        name = self._segment_name('c')
+        _write_columns(os.path.join(self.index_dir, name), [encoded[i] for i in present],
+                       np.searchsorted(present, term_ids).astype(np.uint32),
+                       doc_ids.astype(np.uint32), positions.astype(np.uint32))
+        old, self.segments = self.segments, [name]
+        self.next_id = len(self.docs)
+        self._by_id = None
+        return old
+
+    def rebuild(self) -> UpdateStats:
+        """Indexes every note from scratch and deletes the previous segments."""
+        old = self.segments
+        for segment in old:
+            self._forget(segment)
+        self.docs, self.segments, self.next_id = {}, [], 0
+        stats = self.update()
+        self._unlink(old)
+        return stats
+
+    # -- querying
+
+    def _segment(self, name: str) -> Segment:
+        segment = self._open.get(name)
+        if segment is None:
+            segment = self._open[name] = Segment(os.path.join(self.index_dir, name))
+        return segment
+
+    def _forget(self, name: str):
+        segment = self._open.pop(name, None)
+        if segment is not None:
+            segment.close()
+
+    def _tables(self):
+        """Per doc id: live path (or None) and token count, as arrays for vectorised scoring."""
+        if self._by_id is None:
+            lengths = np.zeros(self.next_id, np.float64)
+            live = np.zeros(self.next_id, bool)
+            paths = [None] * self.next_id
+            for path, doc in self.docs.items():
+                lengths[doc[0]], live[doc[0]], paths[doc[0]] = doc[4], True, path
+            self._by_id = (lengths, live, paths)
+        return self._by_id
+
+    def _phrase_docs(self, phrase: List[str]) -> set:
+        """Live doc ids containing the tokens of phrase at consecutive positions."""
+        _, live, _ = self._tables()
+        found = set()
+        for name in self.segments:
+            segment = self._segment(name)
+            lists = [segment.postings(token) for token in phrase]
+            if any(len(ids) == 0 for ids, _, _ in lists):
+                continue
+            common = lists[0][0]
+            for ids, _, _ in lists[1:]:
+                common = np.intersect1d(common, ids, assume_unique=True)
+            for doc_id in common[live[common]]:
+                starts = None
+                for offset, (ids, _, first) in enumerate(lists):
+                    at = first + int(np.searchsorted(ids, doc_id))
+                    shifted = segment.positions_of(at).astype(np.int64) - offset
+                    starts = shifted if starts is None else np.intersect1d(starts, shifted, assume_unique=True)
+                    if len(starts) == 0:
+                        break
+                if len(starts):
+                    found.add(int(doc_id))
+        return found
+
+    def search(self, query: str, limit: int = 10) -> List[Hit]:
+        """
+        BM25-ranked search.
+
+        Args:
+            query (str): Words, and "quoted phrases" that must appear verbatim (token-wise).
+            limit (int): Maximum number of hits.
+
+        Returns:
+            List[Hit]: Best first.
+        """
+        words, phrases = [], []
+        for phrase, word in QUERY.findall(query):
+            tokens = tokenize(phrase or word)
+            if phrase and len(tokens) > 1:
+                phrases.append(tokens)
+            words.extend(tokens)
+        if not words or not self.docs:
+            return []
+        lengths, live, paths = self._tables()
+        n_docs = len(self.docs)
+        avgdl = float(lengths[live].mean()) or 1.0
+        scores = np.zeros(self.next_id, np.float64)
+        for word in set(words):
+            hits = [self._segment(name).postings(word)[:2] for name in self.segments]
+            ids = np.concatenate([h[0] for h in hits]).astype(np.int64)
+            tfs = np.concatenate([h[1] for h in hits]).astype(np.float64)
+            keep = live[ids]
+            ids, tfs = ids[keep], tfs[keep]
+            if len(ids) == 0:
+                continue
+            idf = math.log(1 + (n_docs - len(ids) + 0.5) / (len(ids) + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[ids] / avgdl)
+            scores[ids] += idf * tfs * (BM25_K1 + 1) / (tfs + norm)
+        candidates = np.flatnonzero(scores)
+        for phrase in phrases:
+            allowed = self._phrase_docs(phrase)
+            candidates = np.array([c for c in candidates if int(c) in allowed], np.int64)
+        if len(candidates) == 0:
+            return []
+        top = candidates[np.argsort(-scores[candidates], kind='stable')[:limit]]
+        return [Hit(paths[int(i)], float(scores[i])) for i in top]
+
+    def close(self):
+        for name in list(self._open):
+            self._forget(name)
+
+
+def benchmark(notes: int = 100_000, directory: Optional[str] = None, queries: int = 200, out=None) -> Dict[str, float]:
+    """Builds a synthetic vault of `notes` notes and reports index, update and query timings."""
+    import random
+    import tempfile
+    out = out or sys.stdout
+    rng = random.Random(7)
+    vocabulary = [f"w{i}" for i in range(50_000)]
+    weights = [1 / (i + 1) for i in range(len(vocabulary))]  # zipfian, like real prose
+    directory = directory or tempfile.mkdtemp(prefix='ele-vault-')
+    for i in range(notes):
+        folder = os.path.join(directory, f"folder{i % 100}")
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, f"note{i}.md"), 'w') as f:
+            f.write(' '.join(rng.choices(vocabulary, weights, k=rng.randint(50, 400))))
+    index = VaultIndex(directory)
+    results = {'build': index.rebuild().elapsed}
+    for i in range(0, notes, max(1, notes // 100)):
+        with open(os.path.join(directory, f"folder{i % 100}", f"note{i}.md"), 'a') as f:
+            f.write(' appended words')
+    results['update_1pct'] = index.update().elapsed
+    results['noop_update'] = index.update().elapsed
+    samples = [' '.join(rng.choices(vocabulary[:5000], k=rng.randint(1, 3))) for _ in range(queries)]
+    start = time.perf_counter()
+    for q in samples:
+        index.search(q)
+    results['query_ms'] = (time.perf_counter() - start) / queries * 1000
+    start = time.perf_counter()
+    for q in samples[:queries // 4]:
+        index.search(f'"{q}"')
+    results['phrase_query_ms'] = (time.perf_counter() - start) / max(1, queries // 4) * 1000
+    for name, value in results.items():
+        out.write(f"{name:>16}: {value:.3f}{' ms' if name.endswith('_ms') else ' s'}\n")
+    return results
+
+
+def main(argv=None):
+    """`python -m src.obs.search`: index and search a vault's notes."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    sub = parser.add_subparsers(dest='command', required=True)
+    update = sub.add_parser('update', help='index new and changed notes')
+    update.add_argument('vault')
+    update.add_argument('--rebuild', action='store_true')
+    find = sub.add_parser('search', help='ranked search; "quoted" for phrases')
+    find.add_argument('vault')
+    find.add_argument('query')
+    find.add_argument('--limit', type=int, default=10)
+    bench = sub.add_parser('bench', help='synthetic index/query benchmark')
+    bench.add_argument('--notes', type=int, default=100_000)
+    bench.add_argument('--dir')
+    args = parser.parse_args(argv)
+
+    if args.command == 'update':
+        index = VaultIndex(args.vault)
+        print(index.rebuild() if args.rebuild else index.update())
+    elif args.command == 'search':
+        for hit in VaultIndex(args.vault).search(args.query, args.limit):
+            print(f"{hit.score:8.3f}  {hit.path}")
+    else:
+        benchmark(args.notes, args.dir)
+
+
+if __name__ == "__main__":
+    main()
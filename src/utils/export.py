@@ -0,0 +1,259 @@
+import io
+import os
+import csv
+import gzip
+import html
+import json
+import dataclasses
+from dataclasses import dataclass, field
+from typing import IO, Any, Dict, Iterable, List, Optional, Sequence, Union
+
+"""
+Streams records to CSV, JSON Lines or an HTML table without holding the export in memory.
+
+Records are dicts, pydantic models, dataclasses or plain objects (their __dict__); tuples and
+lists are taken as rows in `headers` order. They are rendered and written chunk_size at a time,
+so memory stays bounded by one chunk whatever the length of the iterator. Paths ending in .gz
+are gzip-compressed.
+
+A new export is written next to its path and renamed into place on close(). append=True adds
+rows to an existing export instead, without rewriting it: CSV keeps the existing header row,
+JSON Lines just grows, and an HTML table has its closing tags cut off when the first new rows
+are written and written again after them (also when the export is aborted). A gzip export is appended to as a new gzip member, which every gzip reader
+concatenates; HTML cannot be appended to once compressed.
+"""
+
+FORMATS = ('csv', 'jsonl', 'html')
+CHUNK_ROWS = 10_000
+HTML_HEADER = '<table>\n'
+HTML_FOOTER = '</table>\n'
+
+
+def as_row(record: Any, headers: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+    """A record as a {column: value} dict."""
+    if isinstance(record, dict):
+        return record
+    if isinstance(record, (tuple, list)):
+        if headers is None:
+            raise ValueError("headers are required to export tuple or list records")
+        return dict(zip(headers, record))
+    if hasattr(record, 'model_dump'):  # pydantic 2
+        return record.model_dump()
+    if hasattr(record, 'dict') and callable(record.dict):  # pydantic 1
+        return record.dict()
+    if dataclasses.is_dataclass(record):
+        return {f.name: getattr(record, f.name) for f in dataclasses.fields(record)}  # shallow, unlike asdict()
+    return dict(vars(record))
+
+
+def _format_of(path: str) -> str:
+    name = path[:-3] if path.endswith('.gz') else path
+    fmt = name.rpartition('.')[2].lower()
+    return 'jsonl' if fmt in ('json', 'ndjson') else fmt
+
+
+@dataclass
+class StreamExporter:
+    """
+    Incremental writer for one export.
+
+    Args:
+        target (Union[str, IO[str]]): A path, or an open text stream (e.g. sys.stdout), which is
+            written to as is: no temp file, compression or appending.
+        format (str): 'csv', 'jsonl' or 'html'; by default taken from the path's suffix.
+        headers (Sequence[str]): Column order; by default the existing CSV header when appending,
+            else the keys of the first record.
+        chunk_size (int): Rows rendered per write.
+        compress (bool): gzip the output; by default when the path ends in .gz.
+        append (bool): Add to an existing export instead of replacing it.
+    """
+    target: Union[str, IO[str]]
+    format: Optional[str] = None
+    headers: Optional[Sequence[str]] = None
+    chunk_size: int = CHUNK_ROWS
+    compress: Optional[bool] = None
+    append: bool = False
+    compresslevel: int = 6
+    rows: int = 0  # written by this exporter
+    _file: Any = field(default=None, repr=False)
+    _started: bool = field(default=False, repr=False)  # header written, or found in the existing file
+    _appending: bool = field(default=False, repr=False)  # writing to target itself rather than a temp file
+    _footer_cut: bool = field(default=False, repr=False)  # an appended-to HTML table is open at the end
+    _csv: Any = field(default=None, repr=False)
+
+    def __post_init__(self):
+        path = self.target if isinstance(self.target, str) else None
+        if self.format is None:
+            if path is None:
+                raise ValueError("format is required when exporting to a stream")
+            self.format = _format_of(path)
+        if self.format not in FORMATS:
+            raise ValueError(f"format must be one of {FORMATS}, not {self.format!r}")
+        if self.compress is None:
+            self.compress = bool(path and path.endswith('.gz'))
+        if path is None and (self.compress or self.append):
+            raise ValueError("compress and append need a path")
+        if self.headers is not None:
+            self.headers = list(self.headers)
+
+    # -- files
+
+    @property
+    def _tmp(self) -> str:
+        return f"{self.target}.tmp"
+
+    def _open(self):
+        if not isinstance(self.target, str):
+            self._file = self.target
+            return
+        self._appending = self.append and os.path.exists(self.target) and os.path.getsize(self.target) > 0
+        self._footer_cut = False
+        if self._appending:
+            self._prepare_append()
+        path = self.target if self._appending else self._tmp
+        mode = 'ab' if self._appending else 'wb'
+        self._file = gzip.open(path, mode, self.compresslevel) if self.compress else open(path, mode)
+
+    def _prepare_append(self):
+        """Picks up the header of an existing export and, for HTML, checks its closing tags."""
+        self._started = True
+        if self.format == 'csv':
+            opener = gzip.open if self.compress else open
+            with opener(self.target, 'rt', newline='', encoding='utf-8') as f:
+                existing = next(csv.reader(f), None)
+            if self.headers is None:
+                self.headers = existing
+            elif existing != self.headers:
+                raise ValueError(f"{self.target} has columns {existing}, not {self.headers}")
+        elif self.format == 'html':
+            if self.compress:
+                raise ValueError("a compressed HTML export cannot be appended to")
+            footer = HTML_FOOTER.encode()
+            with open(self.target, 'rb') as f:
+                f.seek(-len(footer), os.SEEK_END)
+                if f.read() != footer:
+                    raise ValueError(f"{self.target} does not end with {HTML_FOOTER!r}")
+
+    def _cut_footer(self):
+        """Drops the closing tags of an appended-to HTML table, just before its first new rows."""
+        self._file.flush()
+        self._file.truncate(os.path.getsize(self.target) - len(HTML_FOOTER.encode()))
+        self._footer_cut = True
+
+    def _emit(self, text: str):
+        if isinstance(self.target, str):
+            self._file.write(text.encode('utf-8'))
+        else:
+            self._file.write(text)
+
+    # -- rendering
+
+    def _header(self) -> str:
+        if self.format == 'csv':
+            self._csv.writerow(self.headers)
+            return ''
+        if self.format == 'html':
+            cells = ''.join(f"<th>{html.escape(str(h))}</th>" for h in self.headers)
+            return f"{HTML_HEADER}<thead>\n<tr>{cells}</tr>\n</thead>\n"
+        return ''
+
+    def _render(self, rows: List[Dict[str, Any]]) -> str:
+        if self.format == 'jsonl':
+            return ''.join(json.dumps(row, default=str) + '\n' for row in rows)
+        if self.format == 'csv':
+            self._csv.writerows([row.get(h, '') for h in self.headers] for row in rows)
+            return ''
+        return ''.join('<tr>' + ''.join(f"<td>{html.escape(_cell(row.get(h)))}</td>" for h in self.headers)
+                       + '</tr>\n' for row in rows)
+
+    def write(self, records: Iterable[Any]) -> int:
+        """
+        Exports records, chunk_size at a time.
+
+        Returns:
+            int: Records written by this call.
+        """
+        if self._file is None:
+            self._open()  # first, so appending picks up the existing header for tuple records
+        written = 0
+        chunk: List[Dict[str, Any]] = []
+        for record in records:
+            chunk.append(as_row(record, self.headers))
+            if len(chunk) == self.chunk_size:
+                self._write_chunk(chunk)
+                written += len(chunk)
+                chunk = []
+        if chunk:
+            self._write_chunk(chunk)
+            written += len(chunk)
+        return written
+
+    def _write_chunk(self, rows: List[Dict[str, Any]]):
+        if self.headers is None:
+            self.headers = list(rows[0])
+        out = io.StringIO()
+        if self.format == 'csv':
+            self._csv = csv.writer(out, lineterminator='\n')
+        if self._appending and self.format == 'html' and not self._footer_cut:
+            self._cut_footer()
+        text = '' if self._started else self._header()
+        self._started = True
+        text += self._render(rows)
+        self._emit(text + out.getvalue())
+        self.rows += len(rows)
+
+    def close(self):
+        """Finishes the export; for a new file this is when it appears at its path."""
+        if self._file is None:
+            if self.append and isinstance(self.target, str) and os.path.exists(self.target):
+                return  # nothing to add
+            self._open()
+        if self.format == 'html' and (self._footer_cut or not self._appending):
+            if not self._started:
+                self._emit(HTML_HEADER)
+            self._emit(HTML_FOOTER)
+        if isinstance(self.target, str):
+            self._file.close()
+            if not self._appending:
+                os.replace(self._tmp, self.target)
+        else:
+            self._file.flush()
+        self._file = None
+
+    def abort(self):
+        """Drops a new export (an append keeps what was already flushed, and stays a valid table)."""
+        if self._file is not None and isinstance(self.target, str):
+            if self._footer_cut:
+                self._emit(HTML_FOOTER)
+            self._file.close()
+            if not self._appending:
+                try:
+                    os.unlink(self._tmp)
+                except FileNotFoundError:
+                    pass
+        self._file = None
+
+    def __enter__(self) -> 'StreamExporter':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def _cell(value: Any) -> str:
+    return '' if value is None else str(value)
+
+
+def export(records: Iterable[Any], target: Union[str, IO[str]], **kwargs) -> int:
+    """
+    Writes records to target in one go; see StreamExporter for the keyword arguments.
+
+    Returns:
+        int: Records written.
+    """
+    with StreamExporter(target, **kwargs) as exporter:
+        exporter.write(records)
+    return exporter.rows
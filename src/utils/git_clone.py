@@ -1,9 +1,131 @@
+import os
+import re
+import time
 import subprocess
-from dataclasses import dataclass
-from typing import List, Tuple
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from src.utils.git_mirror import MirrorCache, SyncResult, pinned_commits
+
+PROGRESS_LINE = re.compile(r'\d+% \(\d+/\d+\)')
+
+
+@dataclass
+class Submodule:
+    name: str
+    path: str
+    url: str
+    branch: Optional[str] = None
+
+
+@dataclass
+class CloneResult:
+    name: str
+    path: str
+    url: str
+    returncode: int
+    elapsed: float  # seconds
+    stderr: str = ""
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0
+
+
+def _config_value(raw: str) -> str:
+    """Unquotes a git-config value and strips trailing comments outside quotes."""
+    value, quoted, escaped = [], False, False
+    for c in raw.strip():
+        if escaped:
+            value.append({'n': '\n', 't': '\t'}.get(c, c))
+            escaped = False
+        elif c == '\\':
+            escaped = True
+        elif c == '"':
+            quoted = not quoted
+        elif c in '#;' and not quoted:
+            break
+        else:
+            value.append(c)
+    return ''.join(value).strip()
+
+
+def superproject_url(repo_root: str) -> str:
+    """The url relative submodule urls are resolved against: origin's, else the checkout itself (as git does)."""
+    try:
+        proc = subprocess.run(['git', '-C', repo_root, 'config', '--get', 'remote.origin.url'],
+                              capture_output=True, text=True)
+    except OSError:
+        return os.path.abspath(repo_root)
+    return proc.stdout.strip() or os.path.abspath(repo_root)
+
+
+def resolve_url(url: str, base: str) -> str:
+    """
+    Resolves a relative submodule url (`./x`, `../x.git`) against the superproject's url, as
+    `git submodule` does: each `../` drops one path component of base, scp-style `host:path`
+    included. Absolute urls are returned unchanged.
+    """
+    if not url.startswith(('./', '../')):
+        return url
+    base = base.rstrip('/')
+    while url.startswith(('./', '../')):
+        if url.startswith('./'):
+            url = url[2:]
+            continue
+        url = url[3:]
+        slash, colon = base.rfind('/'), base.rfind(':')
+        base = base[:colon + 1] if colon > slash else base[:max(slash, 0)]
+    return base + url if base.endswith(':') else f"{base}/{url}"
+
+
+def parse_gitmodules(gitmodules_path: str, base_url: Optional[str] = None) -> List[Submodule]:
+    """
+    Parses a .gitmodules file (git-config syntax) into Submodule entries, in file order.
+
+    Args:
+        gitmodules_path (str): The path of the .gitmodules file.
+        base_url (str): Superproject url that relative submodule urls are resolved against
+            (see superproject_url); left relative if None.
+
+    Returns:
+        List[Submodule]: One entry per `[submodule "name"]` section that has a url.
+    """
+    sections = {}
+    current = None
+    with open(gitmodules_path, 'r') as file:
+        for line in file:
+            line = line.strip()
+            if not line or line[0] in '#;':
+                continue
+            section = re.match(r'^\[\s*submodule\s+"((?:[^"\\]|\\.)*)"\s*\]', line)
+            if section:
+                current = sections.setdefault(section.group(1), {})
+                continue
+            if line.startswith('['):
+                current = None  # some other section type
+                continue
+            if current is not None and '=' in line:
+                key, raw = line.split('=', 1)
+                current[key.strip().lower()] = _config_value(raw)
+    return [Submodule(name, options.get('path', name),
+                      options['url'] if base_url is None else resolve_url(options['url'], base_url),
+                      options.get('branch'))
+            for name, options in sections.items() if 'url' in options]
+
 
 @dataclass
 class GitModuleManager:
+    max_workers: int = 4
+    depth: Optional[int] = None  # shallow clones: --depth N
+    filter: Optional[str] = None  # partial clones, e.g. 'blob:none'
+    progress: Optional[Callable[[str, str], None]] = None  # called with (submodule name, git progress line)
+    extra_args: List[str] = field(default_factory=list)
+    mirrors: Optional[MirrorCache] = None  # clone against local bare mirrors, see git_mirror.py
+    dissociate: bool = True  # copy borrowed objects so the clone does not depend on the mirror
+
     def find_gitmodules_path(self) -> str:
         """
         Finds the path of the .gitmodules file.
@@ -25,53 +147,138 @@ class GitModuleManager:
         Returns:
             Tuple[str, List[str]]: A tuple containing the gitmodules_path and a list of repository URLs.
         """
-        # Read the .gitmodules file
-        with open(gitmodules_path, 'r') as file:
-            gitmodules_content = file.read()
-
-        # Extract the repository URLs from the .gitmodules file
-        repo_urls = [line.split('\t')[1].strip() for line in gitmodules_content.split('\n') if line.startswith('url = ')]
-        for i, line in enumerate(gitmodules_content.split('\n')):
-            if line.startswith('[submodule "'):
-                path_line = gitmodules_content.split('\n')[i+1]
-                url_line = gitmodules_content.split('\n')[i+2]
-                url = url_line.split('=')[1].strip()
-                repo_urls.append(url)
-
-        # Clone the repositories
-        for repo_url in repo_urls:
-            subprocess.run(['git', 'clone', repo_url])
-
+        repo_urls = []
+        base_url = superproject_url(os.path.dirname(gitmodules_path))
+        for submodule in parse_gitmodules(gitmodules_path, base_url):
+            if submodule.url not in repo_urls:
+                repo_urls.append(submodule.url)
         return gitmodules_path, repo_urls
 
-    def clone_gitmodules(self):
+    def clone_gitmodules(self, target_dir: Optional[str] = None) -> List[CloneResult]:
         """
-        Clones the repositories specified in the .gitmodules file.
+        Clones the repositories specified in the .gitmodules file, concurrently.
+
+        Args:
+            target_dir (str): Directory the submodule paths are relative to (defaults to the .gitmodules directory).
+
+        Returns:
+            List[CloneResult]: One result per submodule, in .gitmodules order.
         """
-        # Invoke the find_gitmodules_path() method
         gitmodules_path = self.find_gitmodules_path()
-
-        # Invoke the readgitmodules(gitmodules_path) method
-        gitmodules_path, repo_urls = self.readgitmodules(gitmodules_path)
+        submodules = parse_gitmodules(gitmodules_path, superproject_url(os.path.dirname(gitmodules_path)))
+        if self.mirrors is not None:
+            self.sync_mirrors(submodules, os.path.dirname(gitmodules_path))
+        results = self.clone_submodules(submodules, target_dir or os.path.dirname(gitmodules_path))
         print("Repository URLs:")
-        for url in repo_urls:
-            print(url)
-    
-    def clone_repositories(self, repo_urls: List[str], target_dir: str):
+        for result in results:
+            print(f"{result.url} -> {result.path}: {'ok' if result.ok else 'failed'} ({result.elapsed:.1f}s)")
+        return results
+
+    def clone_repositories(self, repo_urls: List[str], target_dir: str = '.') -> List[CloneResult]:
         """
         Clones the repositories specified in the repo_urls list into the target directory.
 
         Args:
             repo_urls (List[str]): A list of repository URLs to clone.
-            target_dir (str): The target directory to clone the repositories into.
+            target_dir (str): The target directory; each repository gets a subdirectory named after it.
+
+        Returns:
+            List[CloneResult]: One result per URL, in input order.
         """
+        submodules = []
         for repo_url in repo_urls:
-            subprocess.run(['git', 'clone', repo_url, target_dir])
+            name = os.path.basename(repo_url.rstrip('/'))
+            name = name[:-len('.git')] if name.endswith('.git') else name
+            submodules.append(Submodule(name, name, repo_url))
+        return self.clone_submodules(submodules, target_dir)
+
+    def clone_submodules(self, submodules: List[Submodule], target_dir: str) -> List[CloneResult]:
+        """
+        Clones submodules with at most max_workers concurrent `git clone` processes.
+
+        Args:
+            submodules (List[Submodule]): What to clone; each lands in target_dir/submodule.path.
+            target_dir (str): Base directory.
+
+        Returns:
+            List[CloneResult]: One result per submodule, in input order.
+        """
+        if not submodules:
+            return []
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(submodules)))) as pool:
+            return list(pool.map(lambda s: self.clone_one(s, target_dir), submodules))
+
+    def sync_mirrors(self, submodules: List[Submodule], repo_root: Optional[str] = None) -> List[SyncResult]:
+        """
+        Creates or updates the local mirrors, skipping those that already hold the pinned commit.
+
+        Args:
+            submodules (List[Submodule]): Submodules whose remotes should be mirrored.
+            repo_root (str): Superproject checkout used to look up pinned commits (optional).
+
+        Returns:
+            List[SyncResult]: One result per distinct URL.
+        """
+        pins: Dict[str, str] = {}
+        if repo_root is not None:
+            by_path = pinned_commits(repo_root, [s.path for s in submodules])
+            pins = {s.url: by_path[s.path] for s in submodules if s.path in by_path}
+        urls = list(dict.fromkeys(s.url for s in submodules))
+        return self.mirrors.sync(urls, pins)
+
+    def clone_command(self, submodule: Submodule, dest: str) -> List[str]:
+        url = submodule.url
+        cmd = ['git', 'clone', '--progress']
+        if self.depth:
+            cmd += ['--depth', str(self.depth)]
+            if submodule.branch:
+                cmd += ['--branch', submodule.branch]
+        if self.filter:
+            cmd += [f'--filter={self.filter}']
+        if (self.depth or self.filter) and os.path.isdir(url):
+            url = 'file://' + os.path.abspath(url)  # git ignores --depth/--filter for plain local paths
+        if self.mirrors is not None:
+            cmd += ['--reference-if-able', self.mirrors.mirror_path(submodule.url)]
+            if self.dissociate:
+                cmd += ['--dissociate']
+        return cmd + self.extra_args + [url, dest]
+
+    def clone_one(self, submodule: Submodule, target_dir: str) -> CloneResult:
+        """Runs one clone, streaming git's progress lines to self.progress; never raises for a missing git."""
+        dest = os.path.join(target_dir, submodule.path)
+        start = time.monotonic()
+        try:
+            process = subprocess.Popen(self.clone_command(submodule, dest), stdin=subprocess.DEVNULL,
+                                       stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        except OSError as e:  # git not installed or not executable: fail this clone, not the batch
+            return CloneResult(submodule.name, dest, submodule.url, 127, time.monotonic() - start, str(e))
+        messages, pending = deque(maxlen=20), b''
+        while True:
+            chunk = process.stderr.read1(4096)
+            if not chunk:
+                break
+            # git redraws progress with '\r'; report each update as its own line
+            parts = re.split(rb'[\r\n]', pending + chunk)
+            pending = parts.pop()
+            for part in parts:
+                if part:
+                    self._report(submodule, part.decode(errors='replace'), messages)
+        if pending:
+            self._report(submodule, pending.decode(errors='replace'), messages)
+        process.wait()
+        return CloneResult(submodule.name, dest, submodule.url, process.returncode,
+                           time.monotonic() - start, '\n'.join(messages))
+
+    def _report(self, submodule: Submodule, line: str, messages: deque):
+        if not PROGRESS_LINE.search(line):
+            messages.append(line)  # keep errors and notices, not every progress redraw
+        if self.progress is not None:
+            self.progress(submodule.name, line)
 
 
 if __name__ == '__main__':
     # Create an instance of the GitModuleManager class
-    git_manager = GitModuleManager()
+    git_manager = GitModuleManager(progress=lambda name, line: print(f"[{name}] {line}"))
 
     # Specify the repository URLs to clone
     repo_urls = [
@@ -83,8 +290,5 @@ if __name__ == '__main__':
     # Invoke the clone_repositories() method with the repo_urls list
     git_manager.clone_repositories(repo_urls)
 
-    # Create an instance of the GitModuleManager class
-    git_manager = GitModuleManager()
-
-    # Invoke the clone_repositories() method
-    git_manager.clone_repositories()
+    # Invoke the clone_gitmodules() method
+    git_manager.clone_gitmodules()
@@ -0,0 +1,133 @@
+import os
+import re
+import time
+import shutil
+import hashlib
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+"""
+Persistent bare mirrors of submodule remotes, so fresh sandboxes clone from local disk.
+
+Each remote URL gets one `git clone --mirror` under the cache directory (ELE_MIRROR_CACHE,
+default ~/.cache/ele/mirrors). sync() only fetches into a mirror when the superproject's
+pinned commit for that submodule is missing from it, and GitModuleManager clones with
+`--reference-if-able <mirror> --dissociate`, so only objects the mirror lacks cross the network
+and the workspace ends up independent of the cache.
+"""
+
+DEFAULT_CACHE = os.environ.get('ELE_MIRROR_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'ele', 'mirrors'))
+
+
+@dataclass
+class SyncResult:
+    url: str
+    mirror: str
+    action: str  # 'cloned', 'fetched', 'skipped' or 'failed'
+    elapsed: float  # seconds
+    stderr: str = ""
+
+    @property
+    def ok(self) -> bool:
+        return self.action != 'failed'
+
+
+def pinned_commits(repo_root: str, paths: List[str]) -> Dict[str, str]:
+    """
+    Reads the commits the superproject's HEAD pins for the given submodule paths.
+
+    Returns:
+        Dict[str, str]: path -> commit id, for paths recorded as gitlinks.
+    """
+    if not paths:
+        return {}
+    try:
+        proc = subprocess.run(['git', '-C', repo_root, 'ls-tree', '-z', 'HEAD', '--', *paths],
+                              capture_output=True)
+    except OSError:  # no git: nothing is known to be pinned, so every mirror gets fetched (and fails alone)
+        return {}
+    pins = {}
+    for entry in proc.stdout.decode(errors='replace').split('\0'):
+        meta, _, path = entry.partition('\t')
+        parts = meta.split()
+        if len(parts) == 3 and parts[0] == '160000':
+            pins[path] = parts[2]
+    return pins
+
+
+@dataclass
+class MirrorCache:
+    cache_dir: str = DEFAULT_CACHE
+    max_workers: int = 4
+    _locks: Dict[str, threading.Lock] = field(default_factory=dict, repr=False)
+    _guard: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def mirror_path(self, url: str) -> str:
+        """Stable bare-repo location for a remote URL."""
+        name = re.sub(r'\.git$', '', os.path.basename(url.rstrip('/'))) or 'repo'
+        digest = hashlib.sha1(url.encode()).hexdigest()[:12]
+        return os.path.join(self.cache_dir, f"{re.sub(r'[^A-Za-z0-9._-]', '_', name)}-{digest}.git")
+
+    def _lock(self, path: str) -> threading.Lock:
+        with self._guard:
+            return self._locks.setdefault(path, threading.Lock())
+
+    def has_commit(self, mirror: str, commit: str) -> bool:
+        return subprocess.run(['git', '--git-dir', mirror, 'cat-file', '-e', f'{commit}^{{commit}}'],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode == 0
+
+    def ensure(self, url: str, pinned: Optional[str] = None) -> SyncResult:
+        """
+        Creates the mirror for url, or fetches into it unless the pinned commit is already there.
+        Never raises for a missing git: the result is 'failed' with the error as stderr.
+        """
+        mirror = self.mirror_path(url)
+        start = time.monotonic()
+        try:
+            return self._ensure(url, mirror, pinned, start)
+        except OSError as e:  # git not installed or not executable: fail this mirror, not the batch
+            return SyncResult(url, mirror, 'failed', time.monotonic() - start, str(e))
+
+    def _ensure(self, url: str, mirror: str, pinned: Optional[str], start: float) -> SyncResult:
+        with self._lock(mirror):
+            if os.path.isdir(mirror):
+                if pinned and self.has_commit(mirror, pinned):
+                    return SyncResult(url, mirror, 'skipped', time.monotonic() - start)
+                cmd, action = ['git', '--git-dir', mirror, 'fetch', '--prune', '--quiet', 'origin'], 'fetched'
+            else:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                tmp = f"{mirror}.tmp{os.getpid()}"
+                cmd, action = ['git', 'clone', '--mirror', '--quiet', url, tmp], 'cloned'
+            try:
+                proc = subprocess.run(cmd, stdin=subprocess.DEVNULL, capture_output=True, text=True)
+            except OSError:
+                if action == 'cloned':
+                    shutil.rmtree(tmp, ignore_errors=True)
+                raise
+            if action == 'cloned':
+                if proc.returncode == 0:
+                    os.replace(tmp, mirror)  # a half-written mirror is never visible under its final name
+                else:
+                    shutil.rmtree(tmp, ignore_errors=True)
+            return SyncResult(url, mirror, action if proc.returncode == 0 else 'failed',
+                              time.monotonic() - start, proc.stderr.strip())
+
+    def sync(self, urls: List[str], pins: Optional[Dict[str, str]] = None) -> List[SyncResult]:
+        """
+        Brings the mirrors for urls up to date concurrently.
+
+        Args:
+            urls (List[str]): Remote URLs.
+            pins (Dict[str, str]): url -> commit the workspace needs; mirrors that already hold it are not fetched.
+
+        Returns:
+            List[SyncResult]: One result per URL, in input order.
+        """
+        pins = pins or {}
+        if not urls:
+            return []
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(urls)))) as pool:
+            return list(pool.map(lambda url: self.ensure(url, pins.get(url)), urls))
@@ -0,0 +1,196 @@
+import os
+import json
+import subprocess
+from typing import Dict, List, Optional, Tuple
+
+"""
+Cached repository metadata (HEAD hash, tag list) for main.hash() and BasedModel.
+
+Metadata is read straight from the git directory - `HEAD`, loose refs and `packed-refs`,
+including linked worktrees (`.git` files and `commondir`) - without forking git. Layouts the
+reader does not understand (e.g. the reftable ref backend) fall back to the `git` binary.
+Results are cached in memory and in a small JSON file inside the git directory, keyed on the
+mtimes of `HEAD`, `packed-refs`, the `refs/heads` and `refs/tags` directories and the
+checked-out branch's ref file. Git updates refs by renaming a lock file into place, so any
+commit, checkout or tag changes the key.
+"""
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+CACHE_NAME = 'ele-meta.json'
+
+PER_WORKTREE_REFS = ('HEAD', 'refs/bisect/', 'refs/worktree/', 'refs/rewritten/')
+MAX_SYMREF_DEPTH = 5
+
+_memory: Dict[str, Tuple[list, dict]] = {}
+
+
+class UnsupportedRepository(Exception):
+    """Raised for repository layouts the pure-Python reader does not handle."""
+
+
+def find_git_dir(path: Optional[str] = None) -> Optional[str]:
+    """Finds the git directory for path (default: the project root), following `.git` files."""
+    current = os.path.abspath(path or PROJECT_ROOT)
+    while True:
+        dotgit = os.path.join(current, '.git')
+        if os.path.isdir(dotgit):
+            return dotgit
+        if os.path.isfile(dotgit):
+            with open(dotgit) as f:
+                content = f.read().strip()
+            if content.startswith('gitdir:'):
+                return os.path.normpath(os.path.join(current, content[len('gitdir:'):].strip()))
+        parent = os.path.dirname(current)
+        if parent == current:
+            return None
+        current = parent
+
+
+def _mtime(path: str) -> int:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return 0
+
+
+def common_dir(git_dir: str) -> str:
+    """The directory holding shared refs; differs from git_dir for linked worktrees."""
+    try:
+        with open(os.path.join(git_dir, 'commondir')) as f:
+            return os.path.normpath(os.path.join(git_dir, f.read().strip()))
+    except OSError:
+        return git_dir
+
+
+def cache_key(git_dir: str) -> list:
+    common = common_dir(git_dir)
+    head = os.path.join(git_dir, 'HEAD')
+    paths = [head, os.path.join(common, 'packed-refs'),
+             os.path.join(common, 'refs', 'heads'), os.path.join(common, 'refs', 'tags')]
+    try:
+        with open(head) as f:
+            content = f.read().strip()
+        if content.startswith('ref:'):
+            paths.append(os.path.join(common, content[4:].strip()))
+    except OSError:
+        pass
+    return [_mtime(p) for p in paths]
+
+
+def _is_oid(value: str) -> bool:
+    return len(value) in (40, 64) and all(c in '0123456789abcdef' for c in value)
+
+
+def packed_refs(common: str) -> Dict[str, str]:
+    """Parses packed-refs into {refname: oid}, ignoring peeled ('^') lines."""
+    refs = {}
+    try:
+        with open(os.path.join(common, 'packed-refs')) as f:
+            for line in f:
+                if line.startswith(('#', '^')):
+                    continue
+                oid, _, name = line.strip().partition(' ')
+                if name:
+                    refs[name] = oid
+    except FileNotFoundError:
+        pass
+    return refs
+
+
+def read_ref(git_dir: str, ref: str, depth: int = 0) -> Optional[str]:
+    """Resolves a ref (following symbolic refs) to an object id; None if it does not exist yet."""
+    if depth > MAX_SYMREF_DEPTH:
+        raise UnsupportedRepository(f"symbolic ref loop at {ref}")
+    base = git_dir if ref.startswith(PER_WORKTREE_REFS) else common_dir(git_dir)
+    try:
+        with open(os.path.join(base, *ref.split('/'))) as f:
+            content = f.read().strip()
+    except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+        return packed_refs(common_dir(git_dir)).get(ref)
+    if content.startswith('ref:'):
+        return read_ref(git_dir, content[4:].strip(), depth + 1)
+    if not _is_oid(content):
+        raise UnsupportedRepository(f"unexpected content in {ref}")
+    return content
+
+
+def list_tags(git_dir: str) -> List[str]:
+    """Tag names from loose refs and packed-refs, in `git tag --list` (refname) order."""
+    common = common_dir(git_dir)
+    names = {name[len('refs/tags/'):] for name in packed_refs(common) if name.startswith('refs/tags/')}
+    root = os.path.join(common, 'refs', 'tags')
+    for directory, _, files in os.walk(root):
+        for name in files:
+            if not name.endswith('.lock'):
+                names.add(os.path.relpath(os.path.join(directory, name), root).replace(os.sep, '/'))
+    return sorted(names, key=lambda n: n.encode())
+
+
+def read_metadata(git_dir: str) -> dict:
+    """Reads the metadata from the git directory without running git."""
+    common = common_dir(git_dir)
+    if os.path.isdir(os.path.join(common, 'reftable')) or not os.path.isfile(os.path.join(git_dir, 'HEAD')):
+        raise UnsupportedRepository(git_dir)
+    return {'head': read_ref(git_dir, 'HEAD'), 'tags': list_tags(git_dir)}
+
+
+def _git(git_dir: str, *args: str) -> Optional[str]:
+    try:
+        return subprocess.check_output(['git', '--git-dir', git_dir, *args],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def resolve(git_dir: str) -> dict:
+    """Reads the metadata, uncached; git itself is only run for unsupported layouts."""
+    try:
+        return read_metadata(git_dir)
+    except (UnsupportedRepository, OSError, UnicodeDecodeError):
+        return resolve_with_git(git_dir)
+
+
+def resolve_with_git(git_dir: str) -> dict:
+    """Reads the metadata with the git binary."""
+    return {
+        'head': _git(git_dir, 'rev-parse', '--verify', 'HEAD'),
+        'tags': [t for t in (_git(git_dir, 'tag', '--list') or '').split('\n') if t != ''],
+    }
+
+
+def repo_metadata(path: Optional[str] = None) -> dict:
+    """Returns {'head': str | None, 'tags': [str]} for the repository containing path."""
+    git_dir = find_git_dir(path)
+    if git_dir is None:
+        return {'head': None, 'tags': []}
+    key = cache_key(git_dir)
+    cached = _memory.get(git_dir)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    cache_file = os.path.join(git_dir, CACHE_NAME)
+    try:
+        with open(cache_file) as f:
+            stored = json.load(f)
+        if stored['key'] == key:
+            _memory[git_dir] = (key, stored['meta'])
+            return stored['meta']
+    except (OSError, ValueError, KeyError):
+        pass
+    meta = resolve(git_dir)
+    _memory[git_dir] = (key, meta)
+    try:
+        tmp = f"{cache_file}.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump({'key': key, 'meta': meta}, f)
+        os.replace(tmp, cache_file)
+    except OSError:
+        pass  # read-only checkout: the in-memory cache still applies
+    return meta
+
+
+def head_hash(path: Optional[str] = None) -> Optional[str]:
+    return repo_metadata(path)['head']
+
+
+def tags(path: Optional[str] = None) -> List[str]:
+    return repo_metadata(path)['tags']
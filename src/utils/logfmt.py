@@ -0,0 +1,198 @@
+import os
+import io
+import re
+import mmap
+import struct
+import logging
+from logging.handlers import RotatingFileHandler
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+"""
+Compact binary segment format for Lager file handlers, plus an mmap-backed reader.
+
+**Segment layout**
+
+* A 4-byte magic header (`LGR1`).
+* A stream of frames; every frame is `<kind:u8><length:u32><payload>` (little-endian).
+    * **N (name):** `<id:u32><utf-8 logger name>` - written once per segment, the first time a logger is seen.
+    * **R (record):** `<ts_ns:i64><level:u8><name_id:u32><utf-8 message>`.
+
+Numeric levels and epoch-nanosecond timestamps avoid strftime/strptime entirely, and logger
+names are interned per segment so a record costs 17 bytes plus its message. Each segment is
+self-contained, so a rotated backup can be read without the live file.
+"""
+
+MAGIC = b'LGR1'
+FRAME = struct.Struct('<BI')
+NAME = struct.Struct('<I')
+RECORD = struct.Struct('<qBI')
+KIND_NAME = ord('N')
+KIND_RECORD = ord('R')
+
+
+class LogEntry(NamedTuple):
+    ts_ns: int
+    level: int
+    name: str
+    message: str
+    offset: int  # byte offset of the frame inside its segment
+
+
+def encode_name(name_id: int, name: str) -> bytes:
+    payload = NAME.pack(name_id) + name.encode('utf-8')
+    return FRAME.pack(KIND_NAME, len(payload)) + payload
+
+
+def encode_record(ts_ns: int, level: int, name_id: int, message: str) -> bytes:
+    payload = RECORD.pack(ts_ns, level, name_id) + message.encode('utf-8', 'backslashreplace')
+    return FRAME.pack(KIND_RECORD, len(payload)) + payload
+
+
+class StructuredFileHandler(RotatingFileHandler):
+    """RotatingFileHandler that writes the binary segment format instead of text lines.
+
+    Takes the same arguments as RotatingFileHandler; the configured formatter is only
+    used to render exception tracebacks, which are appended to the message.
+    """
+
+    def __init__(self, filename, mode='a', maxBytes=0, backupCount=0, encoding=None, delay=False, errors=None):
+        self.names: Dict[str, int] = {}
+        super().__init__(filename, mode, maxBytes, backupCount, encoding, delay, errors)
+
+    def _open(self):
+        stream = open(self.baseFilename, 'a+b')
+        stream.seek(0, io.SEEK_END)
+        self.names = {}
+        if stream.tell() == 0:
+            stream.write(MAGIC)
+        else:
+            # appending to an existing segment: recover its interned names
+            self.names = {name: name_id for name_id, name in SegmentReader(self.baseFilename).names().items()}
+        return stream
+
+    def encode(self, record) -> bytes:
+        message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = record.exc_text or (self.formatter or logging.Formatter()).formatException(record.exc_info)
+        if record.exc_text:
+            message = f"{message}\n{record.exc_text}"
+        if record.stack_info:
+            message = f"{message}\n{record.stack_info}"
+        frames = b''
+        name_id = self.names.get(record.name)
+        if name_id is None:
+            name_id = self.names[record.name] = len(self.names)
+            frames = encode_name(name_id, record.name)
+        return frames + encode_record(int(record.created * 1e9), min(record.levelno, 255), name_id, message)
+
+    def shouldRollover(self, record):
+        # the stock check formats the record as text just to measure it
+        if self.stream is None:
+            self.stream = self._open()
+        return self.maxBytes > 0 and self.stream.tell() >= self.maxBytes
+
+    def emit(self, record):
+        try:
+            if self.shouldRollover(record):
+                self.doRollover()
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(self.encode(record))
+            self.flush()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+
+class SegmentReader:
+    """Lazily iterates the records of one binary segment through a read-only mmap.
+
+    Args:
+        path (str): Path of the segment.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._names: Optional[Dict[int, str]] = None
+
+    def _map(self) -> Optional[mmap.mmap]:
+        with open(self.path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size <= len(MAGIC):
+                return None
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if mm[:len(MAGIC)] != MAGIC:
+            mm.close()
+            raise ValueError(f"{self.path} is not a Lager binary segment")
+        return mm
+
+    def _frames(self, mm: mmap.mmap, offset: int):
+        end = len(mm)
+        while offset + FRAME.size <= end:
+            kind, length = FRAME.unpack_from(mm, offset)
+            body = offset + FRAME.size
+            if body + length > end:
+                return  # torn frame from a writer that is still appending
+            yield kind, offset, body, length
+            offset = body + length
+
+    def names(self) -> Dict[int, str]:
+        """Returns the segment's interned logger names, skipping over record payloads."""
+        if self._names is None:
+            names = {}
+            mm = self._map()
+            if mm is not None:
+                with mm:
+                    for kind, _, body, length in self._frames(mm, len(MAGIC)):
+                        if kind == KIND_NAME:
+                            (name_id,) = NAME.unpack_from(mm, body)
+                            names[name_id] = mm[body + NAME.size:body + length].decode('utf-8')
+            self._names = names
+        return self._names
+
+    def __iter__(self) -> Iterator[LogEntry]:
+        return self.read_from(len(MAGIC))
+
+    def read_from(self, offset: int, levelno: int = 0) -> Iterator[LogEntry]:
+        """Yields records starting at a frame boundary.
+
+        Args:
+            offset (int): Byte offset of a frame (e.g. from an index checkpoint).
+            levelno (int): Skip records below this level without decoding their message.
+        """
+        names = self.names() if offset > len(MAGIC) else {}
+        mm = self._map()
+        if mm is None:
+            return
+        with mm:
+            for kind, start, body, length in self._frames(mm, max(offset, len(MAGIC))):
+                if kind == KIND_NAME:
+                    (name_id,) = NAME.unpack_from(mm, body)
+                    names[name_id] = mm[body + NAME.size:body + length].decode('utf-8')
+                elif kind == KIND_RECORD:
+                    ts_ns, level, name_id = RECORD.unpack_from(mm, body)
+                    if level < levelno:
+                        continue
+                    message = mm[body + RECORD.size:body + length].decode('utf-8')
+                    yield LogEntry(ts_ns, level, names.get(name_id, str(name_id)), message, start)
+
+
+def segment_paths(filename: str) -> List[str]:
+    """Returns a rotating file's segments oldest first: `app.lgr.N`, ..., `app.lgr.1`, `app.lgr`."""
+    directory, base = os.path.split(os.path.abspath(filename))
+    pattern = re.compile(re.escape(base) + r'\.(\d+)$')
+    backups = []
+    for entry in os.listdir(directory or '.'):
+        match = pattern.match(entry)
+        if match:
+            backups.append((int(match.group(1)), os.path.join(directory, entry)))
+    paths = [path for _, path in sorted(backups, reverse=True)]
+    if os.path.exists(filename):
+        paths.append(os.path.abspath(filename))
+    return paths
+
+
+def read_segments(filename: str, levelno: int = 0) -> Iterator[LogEntry]:
+    """Lazily yields every record of a rotating file and its backups in write order."""
+    for path in segment_paths(filename):
+        yield from SegmentReader(path).read_from(len(MAGIC), levelno)
@@ -0,0 +1,297 @@
+import os
+import sys
+import json
+import bisect
+import logging
+import argparse
+from datetime import datetime, time as dtime
+from typing import Dict, Iterator, List, Optional
+
+from src.utils.logfmt import MAGIC, LogEntry, encode_name, SegmentReader, StructuredFileHandler, segment_paths
+
+"""
+Sidecar time/level indexes over rotated binary log segments.
+
+Every segment `app.lgr[.N]` gets an `app.lgr[.N].idx` JSON sidecar holding:
+
+* **blocks:** sparse checkpoints `[offset, min_ts, max_ts]`, one per BLOCK_RECORDS records.
+* **levels:** record counts per numeric level.
+* **names:** per level, a bitmap over the segment's interned logger ids that logged at that level.
+
+A query first drops whole segments whose time span, levels or logger bitmap cannot match,
+then bisects the checkpoints to the first block that can hold `start` and reads from there.
+IndexedFileHandler keeps the index of the live segment in memory while writing and stores it
+when the segment rotates, shifting existing sidecars along with their backups.
+
+Only the binary format is indexed: text logs (app.log and its backups) have no frames to point
+into, so query() and `ele-logs` refuse them rather than silently finding nothing. Run Lager with
+LAGER_FORMAT=binary to get queryable logs.
+"""
+
+BLOCK_RECORDS = 256
+BINARY_REQUIRED = "ele-logs only reads binary logs: run Lager with LAGER_FORMAT=binary (text logs are not indexed)"
+LEVELS = {name: getattr(logging, name) for name in ['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL']}
+
+
+class SegmentIndex:
+    """Index of one segment; built incrementally with add() or loaded from a sidecar."""
+
+    def __init__(self, size: int = len(MAGIC)):
+        self.size = size  # bytes of the segment covered by the index
+        self.first_ts: Optional[int] = None
+        self.last_ts: Optional[int] = None
+        self.levels: Dict[int, int] = {}
+        self.names: Dict[int, int] = {}
+        self.name_list: List[str] = []
+        self.blocks: List[List[int]] = []
+        self._block_fill = BLOCK_RECORDS
+        self._reach: Optional[List[int]] = None
+        self._floor: Optional[List[int]] = None
+
+    def add(self, offset: int, ts_ns: int, level: int, name_id: int):
+        """Accounts for one record frame written at offset."""
+        if self._block_fill >= BLOCK_RECORDS:
+            self.blocks.append([offset, ts_ns, ts_ns])
+            self._block_fill = 0
+            self._reach = self._floor = None
+        block = self.blocks[-1]
+        block[1] = min(block[1], ts_ns)
+        block[2] = max(block[2], ts_ns)
+        self._block_fill += 1
+        self.first_ts = ts_ns if self.first_ts is None else min(self.first_ts, ts_ns)
+        self.last_ts = ts_ns if self.last_ts is None else max(self.last_ts, ts_ns)
+        self.levels[level] = self.levels.get(level, 0) + 1
+        self.names[level] = self.names.get(level, 0) | (1 << name_id)
+
+    @classmethod
+    def build(cls, path: str) -> 'SegmentIndex':
+        """Indexes a segment by scanning it once."""
+        index = cls()
+        reader = SegmentReader(path)
+        names = reader.names()
+        ids = {name: name_id for name_id, name in names.items()}
+        index.name_list = [names[i] for i in sorted(names)]
+        for entry in reader:
+            index.add(entry.offset, entry.ts_ns, entry.level, ids[entry.name])
+        index.size = os.path.getsize(path)
+        return index
+
+    def to_dict(self) -> dict:
+        return {'size': self.size, 'first_ts': self.first_ts, 'last_ts': self.last_ts,
+                'levels': self.levels, 'names': {lvl: hex(bits) for lvl, bits in self.names.items()},
+                'name_list': self.name_list, 'blocks': self.blocks}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'SegmentIndex':
+        index = cls(data['size'])
+        index.first_ts, index.last_ts = data['first_ts'], data['last_ts']
+        index.levels = {int(lvl): n for lvl, n in data['levels'].items()}
+        index.names = {int(lvl): int(bits, 16) for lvl, bits in data['names'].items()}
+        index.name_list = data['name_list']
+        index.blocks = data['blocks']
+        return index
+
+    def save(self, path: str):
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(self.to_dict(), f, separators=(',', ':'))
+        os.replace(tmp, path)
+
+    def may_match(self, start: Optional[int], end: Optional[int], levelno: int, name: Optional[str]) -> bool:
+        """Whether the segment can hold a matching record at all."""
+        if self.first_ts is None:
+            return False
+        if (start is not None and self.last_ts < start) or (end is not None and self.first_ts > end):
+            return False
+        levels = [lvl for lvl, count in self.levels.items() if lvl >= levelno and count]
+        if not levels:
+            return False
+        if name is None:
+            return True
+        wanted = 0
+        for name_id, candidate in enumerate(self.name_list):
+            if candidate == name or candidate.startswith(name + '.'):
+                wanted |= 1 << name_id
+        return any(self.names.get(lvl, 0) & wanted for lvl in levels)
+
+    def seek(self, start: Optional[int]) -> int:
+        """Offset of the first block that may hold records at or after start."""
+        if start is None or not self.blocks:
+            return len(MAGIC)
+        if self._reach is None:
+            # running max of block max_ts; monotonic even if records interleave slightly
+            reach, top = [], None
+            for _, _, max_ts in self.blocks:
+                top = max_ts if top is None else max(top, max_ts)
+                reach.append(top)
+            self._reach = reach
+        i = bisect.bisect_left(self._reach, start)
+        return self.blocks[min(i, len(self.blocks) - 1)][0]
+
+    def stop(self, end: Optional[int]) -> Optional[int]:
+        """Offset from which no record can be at or before end (None if reading must go on to EOF)."""
+        if end is None or not self.blocks:
+            return None
+        if self._floor is None:
+            # running min of block min_ts taken from the tail, monotonic in the same way
+            floor, low = [], None
+            for _, min_ts, _ in reversed(self.blocks):
+                low = min_ts if low is None else min(low, min_ts)
+                floor.append(low)
+            self._floor = floor[::-1]
+        i = bisect.bisect_right(self._floor, end)
+        return self.blocks[i][0] if i < len(self.blocks) else None
+
+
+def index_path(segment: str) -> str:
+    return f"{segment}.idx"
+
+
+def load_index(segment: str, write: bool = True) -> SegmentIndex:
+    """Loads a segment's sidecar, (re)building it when missing or stale."""
+    size = os.path.getsize(segment)
+    try:
+        with open(index_path(segment)) as f:
+            index = SegmentIndex.from_dict(json.load(f))
+        if index.size == size:
+            return index
+    except (FileNotFoundError, ValueError, KeyError):
+        pass
+    index = SegmentIndex.build(segment)
+    if write:
+        index.save(index_path(segment))
+    return index
+
+
+class IndexedFileHandler(StructuredFileHandler):
+    """StructuredFileHandler that maintains the live segment's index and stores it on rotation."""
+
+    def _open(self):
+        stream = super()._open()
+        if stream.tell() > len(MAGIC):
+            self.index = SegmentIndex.build(self.baseFilename)
+        else:
+            self.index = SegmentIndex()
+        return stream
+
+    def emit(self, record):
+        try:
+            if self.shouldRollover(record):
+                self.doRollover()
+            if self.stream is None:
+                self.stream = self._open()
+            known = len(self.names)
+            frame = self.encode(record)
+            offset = self.stream.tell()
+            name_id = self.names[record.name]
+            if len(self.names) > known:
+                self.index.name_list.append(record.name)
+                offset += len(encode_name(name_id, record.name))  # index the record, not its name frame
+            self.stream.write(frame)
+            self.index.add(offset, int(record.created * 1e9), min(record.levelno, 255), name_id)
+            self.index.size = self.stream.tell()
+            self.flush()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+    def doRollover(self):
+        index = getattr(self, 'index', None)
+        super().doRollover()
+        if self.backupCount <= 0 or index is None:
+            return
+        for i in range(self.backupCount - 1, 0, -1):
+            src = index_path(self.rotation_filename(f"{self.baseFilename}.{i}"))
+            if os.path.exists(src):
+                os.replace(src, index_path(self.rotation_filename(f"{self.baseFilename}.{i + 1}")))
+        index.save(index_path(self.rotation_filename(f"{self.baseFilename}.1")))
+
+
+def binary_segments(filename: str) -> List[str]:
+    """
+    The segments of a rotating binary log, oldest first.
+
+    Raises:
+        ValueError: If there are none, or one of them is not a binary segment (e.g. a text log).
+    """
+    segments = segment_paths(filename)
+    if not segments:
+        raise ValueError(f"no log segments at {filename}; {BINARY_REQUIRED}")
+    for segment in segments:
+        with open(segment, 'rb') as f:
+            head = f.read(len(MAGIC))
+        if head and head != MAGIC:
+            raise ValueError(f"{segment} is not a binary log segment; {BINARY_REQUIRED}")
+    return segments
+
+
+def to_ns(value) -> Optional[int]:
+    """Converts a datetime, epoch seconds or 'HH:MM[:SS]'/ISO string to epoch nanoseconds."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        try:
+            value = datetime.combine(datetime.now().date(), dtime.fromisoformat(value))
+        except ValueError:
+            value = datetime.fromisoformat(value)
+    if isinstance(value, datetime):
+        value = value.timestamp()
+    return int(value * 1e9)
+
+
+def query(filename: str, start=None, end=None, level='NOTSET', name: Optional[str] = None) -> Iterator[LogEntry]:
+    """Yields records of a rotating binary log and its backups matching a time/level/logger filter.
+
+    Args:
+        filename (str): The live segment, e.g. 'logs/app.lgr'.
+        start, end: Inclusive bounds as datetime, epoch seconds or 'HH:MM[:SS]'/ISO strings.
+        level (str | int): Minimum level.
+        name (str): Logger name; its child loggers match too.
+
+    Raises:
+        ValueError: If filename is not a binary log (see binary_segments).
+    """
+    start_ns, end_ns = to_ns(start), to_ns(end)
+    levelno = LEVELS.get(level, 0) if isinstance(level, str) else level
+    for segment in binary_segments(filename):
+        index = load_index(segment, write=segment != os.path.abspath(filename))
+        if not index.may_match(start_ns, end_ns, levelno, name):
+            continue
+        stop = index.stop(end_ns)
+        for entry in SegmentReader(segment).read_from(index.seek(start_ns), levelno):
+            if stop is not None and entry.offset >= stop:
+                break
+            if (start_ns is not None and entry.ts_ns < start_ns) or (end_ns is not None and entry.ts_ns > end_ns):
+                continue
+            if name is not None and entry.name != name and not entry.name.startswith(name + '.'):
+                continue
+            yield entry
+
+
+def main(argv=None):
+    """`ele-logs`: query Lager's binary logs by time, level and logger."""
+    default = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'logs', 'app.lgr'))
+    parser = argparse.ArgumentParser(prog='ele-logs', description=main.__doc__)
+    parser.add_argument('file', nargs='?', default=default, help='live segment (default: logs/app.lgr)')
+    parser.add_argument('--since', help="start time, 'HH:MM[:SS]' today or ISO datetime")
+    parser.add_argument('--until', help="end time, 'HH:MM[:SS]' today or ISO datetime")
+    parser.add_argument('--level', default='NOTSET', choices=['NOTSET', *LEVELS])
+    parser.add_argument('--logger', help='logger name, e.g. root.main (children included)')
+    parser.add_argument('--reindex', action='store_true', help='rebuild every rotated segment index')
+    args = parser.parse_args(argv)
+
+    try:
+        segments = binary_segments(args.file)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.reindex:
+        for segment in segments[:-1]:
+            SegmentIndex.build(segment).save(index_path(segment))
+    for entry in query(args.file, args.since, args.until, args.level, args.logger):
+        stamp = datetime.fromtimestamp(entry.ts_ns / 1e9).astimezone().strftime('%Y-%m-%d~%H:%M:%S%z')
+        sys.stdout.write(f"[{logging.getLevelName(entry.level)}]{stamp}||{entry.name}: {entry.message}\n")
+
+
+if __name__ == "__main__":
+    main()
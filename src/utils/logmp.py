@@ -0,0 +1,105 @@
+import logging
+import threading
+import multiprocessing
+import multiprocessing.util
+from logging.handlers import QueueHandler, QueueListener
+from typing import List
+
+"""
+Multi-process log aggregation for Lager.
+
+Worker processes never configure file handlers of their own. init_worker() (meant as the
+`initializer` of a multiprocessing.Pool or ProcessPoolExecutor) replaces the worker's handlers
+with a WorkerHandler that formats records locally and ships them in small batches over one
+multiprocessing queue. In the parent, AggregatingListener drains that queue into the real
+handlers, so a single process writes, rotates and indexes every log file.
+
+Each worker sends its batches through its own queue feeder thread, so records from one worker
+arrive in the order they were logged; batching keeps the queue's cross-process write lock and
+pickling overhead per record small enough that throughput grows with the number of workers.
+"""
+
+
+class WorkerHandler(QueueHandler):
+    """QueueHandler that ships lists of prepared records instead of one record per put().
+
+    Args:
+        queue (multiprocessing.Queue): The parent's aggregation queue.
+        batch_size (int): Send as soon as this many records are buffered.
+        flush_interval (float): Send whatever is buffered at least this often (seconds).
+    """
+
+    def __init__(self, queue, batch_size=64, flush_interval=0.1):
+        super().__init__(queue)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._batch: List[logging.LogRecord] = []
+        self._batch_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._flusher = threading.Thread(target=self._run, name='lager-worker-flush', daemon=True)
+        self._flusher.start()
+
+    def enqueue(self, record):
+        with self._batch_lock:
+            self._batch.append(record)
+            if len(self._batch) >= self.batch_size:
+                self._send()
+
+    def _send(self):
+        if self._batch:
+            self.queue.put(self._batch)
+            self._batch = []
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        with self._batch_lock:
+            self._send()
+
+    def close(self):
+        self._stop.set()
+        self.flush()
+        super().close()
+
+
+class AggregatingListener(QueueListener):
+    """QueueListener that accepts both single records and WorkerHandler batches, and flushes on stop()."""
+
+    def handle(self, record):
+        if isinstance(record, list):
+            for item in record:
+                super().handle(item)
+        else:
+            super().handle(record)
+
+    def stop(self):
+        super().stop()
+        for handler in self.handlers:
+            try:
+                handler.flush()
+            except Exception:
+                pass
+
+
+def init_worker(log_queue, level=logging.INFO, batch_size=64, flush_interval=0.1):
+    """Configures logging in a worker process to ship records to the parent's aggregator.
+
+    Args:
+        log_queue (multiprocessing.Queue): Queue returned by Lager.start_aggregator().
+        level (int): Root level inside the worker.
+    """
+    from src.lager import Lager
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)  # inherited from a forked parent; the parent still owns them
+    handler = WorkerHandler(log_queue, batch_size, flush_interval)
+    root.addHandler(handler)
+    root.setLevel(level)
+    Lager.root_logger = root
+    Lager.queue_handler = Lager.queue_listener = None
+    # multiprocessing skips atexit in its children but runs finalizers, highest priority
+    # first; the queue closes its feeder at priority 10, so the last batch must go out before
+    multiprocessing.util.Finalize(handler, handler.close, exitpriority=100)
@@ -0,0 +1,138 @@
+import os
+import re
+import gzip
+import lzma
+import time
+import shutil
+import threading
+from datetime import datetime
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from logging.handlers import RotatingFileHandler
+from typing import List, Optional
+
+"""
+Background-compressed rotation for Lager's text file handlers.
+
+CompressingRotatingFileHandler only renames the live file inside emit() - a single rename,
+no copying - and hands the renamed segment to a shared background worker that compresses
+it with gzip or lzma. Rotation triggers on size (maxBytes), on a wall-clock interval aligned
+to multiples of `interval` seconds, or whichever comes first when both are set. Retention is
+a byte budget over all compressed backups of a file rather than a backup count. With
+compression=None backups stay as renamed and the worker is not used at all.
+
+Backups are named `app.log.<YYYYmmdd-HHMMSS-ffffff>[.gz|.xz]`, so names sort chronologically
+and nothing has to be renumbered while the compressor is still working on older ones.
+"""
+
+COMPRESSORS = {
+    'gzip': ('.gz', lambda path: gzip.open(path, 'wb', compresslevel=6)),
+    'lzma': ('.xz', lambda path: lzma.open(path, 'wb', preset=6)),
+    None: ('', None),
+}
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def compressor() -> ThreadPoolExecutor:
+    """Single shared worker; its thread is joined at interpreter exit so backups are never left half-written."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='lager-compress')
+        return _executor
+
+
+class CompressingRotatingFileHandler(RotatingFileHandler):
+    """Rotating file handler that compresses backups off the logging thread.
+
+    Args:
+        filename (str): Live log file.
+        maxBytes (int): Rotate once the file reaches this size (0 disables size rotation).
+        interval (float): Rotate every `interval` seconds of wall-clock time (0 disables it).
+        compression (str): 'gzip', 'lzma' or None to keep backups uncompressed.
+        retentionBytes (int): Total size allowed for all backups; the oldest are deleted first.
+    """
+
+    def __init__(self, filename, mode='a', maxBytes=0, interval=0, compression='gzip',
+                 retentionBytes=100*1024*1024, encoding=None, delay=False, errors=None):
+        if compression not in COMPRESSORS:
+            raise ValueError(f"Unknown compression: {compression}")
+        super().__init__(filename, mode, maxBytes, 0, encoding, delay, errors)
+        self.interval = interval
+        self.compression = compression
+        self.retentionBytes = retentionBytes
+        self.pending: List[Future] = []
+        self.rolloverAt = self.compute_rollover(time.time())
+        self._backup = re.compile(re.escape(os.path.basename(self.baseFilename)) + r'\.\d{8}-\d{6}-\d{6}(\.gz|\.xz)?$')
+        if compression is not None:
+            for path in self.backups():
+                if not path.endswith(('.gz', '.xz')):
+                    self.pending.append(compressor().submit(self.compress, path))  # left over from an interrupted run
+
+    def compute_rollover(self, now: float) -> Optional[float]:
+        if not self.interval:
+            return None
+        return (now // self.interval + 1) * self.interval
+
+    def shouldRollover(self, record):
+        if self.rolloverAt is not None and time.time() >= self.rolloverAt:
+            return True
+        if self.maxBytes > 0:
+            if self.stream is None:
+                self.stream = self._open()
+            return self.stream.tell() >= self.maxBytes  # no formatting just to measure the record
+        return False
+
+    def doRollover(self):
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        now = time.time()
+        self.rolloverAt = self.compute_rollover(now)
+        if os.path.exists(self.baseFilename) and os.path.getsize(self.baseFilename) > 0:
+            stamp = datetime.fromtimestamp(now).strftime('%Y%m%d-%H%M%S-%f')
+            dest = self.rotation_filename(f"{self.baseFilename}.{stamp}")
+            os.rename(self.baseFilename, dest)
+            if self.compression is None:
+                self.enforce_retention()  # nothing to compress: no worker round-trip
+            else:
+                self.pending = [f for f in self.pending if not f.done()]
+                self.pending.append(compressor().submit(self.compress, dest))
+        if not self.delay:
+            self.stream = self._open()
+
+    def backups(self) -> List[str]:
+        """Rotated backups of this file, oldest first."""
+        directory = os.path.dirname(self.baseFilename)
+        return sorted(os.path.join(directory, name) for name in os.listdir(directory) if self._backup.match(name))
+
+    def compress(self, path: str):
+        """Runs on the compressor thread: compress one backup, then enforce the retention budget."""
+        ext, opener = COMPRESSORS[self.compression]
+        if opener is not None:
+            tmp = f"{path}{ext}.tmp"
+            with open(path, 'rb') as src, opener(tmp) as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            os.replace(tmp, path + ext)
+            os.remove(path)
+        self.enforce_retention()
+
+    def enforce_retention(self):
+        ext = COMPRESSORS[self.compression][0]
+        backups = [(path, os.path.getsize(path)) for path in self.backups() if path.endswith(ext)]
+        total = sum(size for _, size in backups)
+        for path, size in backups:
+            if total <= self.retentionBytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def close(self):
+        """Waits for this handler's outstanding compressions before closing."""
+        wait(self.pending)
+        self.pending = []
+        super().close()
@@ -0,0 +1,158 @@
+import os
+import sys
+import time
+import random
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+
+"""
+Hot-path controls for Lager loggers: sampling and per-call-site rate limits.
+
+HotPathLogger makes every decision in _log(), i.e. before findCaller(), makeRecord() or any
+argument formatting, so a dropped call costs a dict lookup and (for rate limits) a frame
+peek. Disabled levels are left to the stdlib's isEnabledFor() and its per-logger cache; handler
+levels are not folded into it, since Handler.setLevel() gives no hook to invalidate such a cache.
+
+Controls are registered per logger name and inherited by child loggers:
+
+    configure({'root': {'sampling': {'DEBUG': 0.01}},
+               'root.main': {'sampling': {'INFO': 0.25}, 'rate': 5, 'burst': 20}})
+
+`rate`/`burst` define a token bucket per call site (file and line); the first record that
+gets through after a suppressed run carries a "(suppressed N similar messages)" suffix.
+"""
+
+_SRCFILES = (os.path.normcase(logging.__file__), os.path.normcase(__file__))
+_registry: Dict[str, 'HotPathControls'] = {}
+_generation = 0
+
+
+class lazy:
+    """Defers an expensive log argument until the record is actually formatted.
+
+    Example:
+        ml.debug("state: %s", lazy(json.dumps, big_state))
+    """
+    __slots__ = ('func', 'args', '_value')
+
+    def __init__(self, func, *args):
+        self.func = func
+        self.args = args
+
+    def __str__(self):
+        try:
+            return str(self._value)
+        except AttributeError:
+            self._value = self.func(*self.args)
+            return str(self._value)
+
+    __repr__ = __str__
+
+
+class HotPathControls:
+    """Sampling probabilities per level plus a token bucket per call site.
+
+    Args:
+        sampling (dict): Level name or number -> probability of keeping a record.
+        rate (float): Tokens added per second to each call site's bucket (None disables limiting).
+        burst (int): Bucket capacity.
+    """
+
+    def __init__(self, sampling=None, rate=None, burst=None):
+        self.sampling = {logging._checkLevel(level): float(p) for level, p in (sampling or {}).items()}
+        self.rate = rate
+        self.burst = burst or (rate and max(1, int(rate)))
+        self.buckets: Dict[Tuple[str, int], list] = {}  # site -> [tokens, last refill, suppressed]
+        self._lock = threading.Lock()
+
+    def admit(self, level: int, site: Optional[Tuple[str, int]]) -> Optional[int]:
+        """Returns None to drop the call, else the number of suppressed calls to report."""
+        p = self.sampling.get(level)
+        if p is not None and random.random() >= p:
+            return None
+        if self.rate is None or site is None:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            bucket = self.buckets.get(site)
+            if bucket is None:
+                bucket = self.buckets[site] = [float(self.burst), now, 0]
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return None
+            bucket[0] -= 1
+            suppressed, bucket[2] = bucket[2], 0
+            return suppressed
+
+
+def configure(config: Dict[str, dict]):
+    """Replaces the registered controls; keys are logger names, values HotPathControls kwargs."""
+    global _generation
+    _registry.clear()
+    for name, options in (config or {}).items():
+        _registry[name] = HotPathControls(**options)
+    _generation += 1
+
+
+def from_env(sample: Optional[str], rate_limit: Optional[str]) -> Dict[str, dict]:
+    """Parses LAGER_SAMPLE ('DEBUG=0.01,INFO=0.5') and LAGER_RATE_LIMIT ('rate[:burst]') for the root logger."""
+    options = {}
+    if sample:
+        options['sampling'] = dict(item.split('=', 1) for item in sample.split(',') if item)
+    if rate_limit:
+        rate, _, burst = rate_limit.partition(':')
+        options['rate'] = float(rate)
+        options['burst'] = int(burst) if burst else None
+    return {'root': options} if options else {}
+
+
+class HotPathLogger(logging.Logger):
+    """Logger that applies registered HotPathControls before a LogRecord is built."""
+
+    _hot = (None, None)  # (generation, controls) cache
+
+    def controls(self) -> Optional[HotPathControls]:
+        generation, controls = self._hot
+        if generation != _generation:
+            controls = None
+            name = self.name
+            while name:
+                controls = _registry.get(name)
+                if controls is not None:
+                    break
+                name = name.rpartition('.')[0]
+            self._hot = (_generation, controls)
+        return controls
+
+    def _log(self, level, msg, args, exc_info=None, extra=None, stack_info=False, stacklevel=1):
+        controls = self.controls() if _registry else None
+        if controls is not None:
+            site = None
+            if controls.rate is not None:
+                frame = sys._getframe(1)
+                while frame is not None and os.path.normcase(frame.f_code.co_filename) in _SRCFILES:
+                    frame = frame.f_back
+                if frame is not None:
+                    site = (frame.f_code.co_filename, frame.f_lineno)
+            suppressed = controls.admit(level, site)
+            if suppressed is None:
+                return
+            if suppressed:
+                msg = f"{msg} (suppressed {suppressed} similar messages)"
+        super()._log(level, msg, args, exc_info, extra, stack_info, stacklevel + 1)
+
+
+class HotPathRootLogger(HotPathLogger, logging.RootLogger):
+    pass
+
+
+def install(*loggers: logging.Logger):
+    """Upgrades existing loggers to HotPathLoggers in place; other logger classes are left alone."""
+    for logger in loggers:
+        if type(logger) is logging.Logger:
+            logger.__class__ = HotPathLogger
+        elif type(logger) is logging.RootLogger:
+            logger.__class__ = HotPathRootLogger
@@ -0,0 +1,266 @@
+import os
+import re
+import sys
+import gzip
+import json
+import time
+import threading
+import logging
+import http.client
+from urllib.parse import urlsplit
+from typing import List, Tuple
+
+"""
+Batched HTTP log shipping for Lager's `http:` handler specs.
+
+The stdlib HTTPHandler opens a connection and POSTs once per record on the caller's thread.
+ShippingHandler instead buffers records and a background thread ships them as NDJSON batches
+over one keep-alive connection, optionally gzipped, retrying with exponential backoff.
+While the collector is unreachable batches are spilled to a bounded spool under `logs/` and
+replayed, oldest first, as soon as a POST succeeds again, whenever the handler is idle past the
+retry delay, and once more at close(). A batch the collector rejects with a 4xx other than 429
+cannot succeed on retry: it is counted as dropped and reported on stderr.
+"""
+
+SPOOL_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'logs'))
+SENT, REJECTED, FAILED = 'sent', 'rejected', 'failed'  # outcomes of one POST
+
+
+def parse_http_spec(spec: str) -> Tuple[str, str, bool]:
+    """Parses the part of an `http:` handler spec after the handler type.
+
+    Accepts both `host[:port]:/url` (the original Lager format) and full
+    `http(s)://host[:port]/url` addresses.
+
+    Returns:
+        Tuple[str, str, bool]: host (with port), url path and whether to use TLS.
+    """
+    if re.match(r'^https?://', spec):
+        parts = urlsplit(spec)
+        url = parts.path or '/'
+        if parts.query:
+            url = f"{url}?{parts.query}"
+        return parts.netloc, url, parts.scheme == 'https'
+    host, sep, url = spec.rpartition(':/')
+    if not sep:
+        host, _, url = spec.partition(':')
+        return host, url or '/', False
+    return host, '/' + url, False
+
+
+class ShippingHandler(logging.Handler):
+    """Ships records to an HTTP collector in batches from a background thread.
+
+    Args:
+        host (str): Collector host, optionally with ':port'.
+        url (str): Path records are POSTed to.
+        secure (bool): Use HTTPS.
+        batch_size (int): Ship as soon as this many records are buffered.
+        flush_interval (float): Ship whatever is buffered at least this often (seconds).
+        compress (bool): gzip each request body.
+        max_retries (int): Attempts per batch before it is spilled to disk.
+        backoff (float): Initial retry delay in seconds, doubled on every attempt.
+        timeout (float): Socket timeout for the collector connection.
+        spool_dir (str): Directory for the on-disk spool (defaults to `logs/`).
+        spool_bytes (int): Upper bound on spooled bytes; the oldest segments are discarded first.
+        max_buffer (int): Records held in memory before the oldest are discarded.
+    """
+
+    def __init__(self, host, url, secure=False, batch_size=500, flush_interval=1.0, compress=True,
+                 max_retries=4, backoff=0.25, timeout=5.0, spool_dir=None, spool_bytes=50*1024*1024,
+                 max_buffer=100000):
+        super().__init__()
+        self.host = host
+        self.url = url
+        self.secure = secure
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.compress = compress
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.spool_bytes = spool_bytes
+        self.max_buffer = max_buffer
+        self.spool_dir = spool_dir or SPOOL_DIR
+        self.spool_prefix = 'spool_' + re.sub(r'[^A-Za-z0-9]+', '_', f"{host}{url}").strip('_')
+        self.shipped = 0
+        self.spilled = 0
+        self.dropped = 0
+        self._buffer: List[bytes] = []
+        self._cond = threading.Condition()
+        self._closing = False
+        self._busy = False
+        self._conn = None
+        self._retry_at = 0.0
+        self._spool_seq = 0
+        self._spooled = bool(self._spool_files())  # left over from an earlier run, or spilled since
+        self._thread = threading.Thread(target=self._run, name=f'lager-ship-{host}', daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def from_spec(cls, spec, **kwargs):
+        """Builds a handler from the part of an `http:` spec after the handler type."""
+        host, url, secure = parse_http_spec(spec)
+        return cls(host, url, secure=secure, **kwargs)
+
+    def serialize(self, record) -> bytes:
+        """Encodes one record as a single NDJSON line."""
+        return json.dumps({
+            'ts': record.created,
+            'level': record.levelname,
+            'name': record.name,
+            'msg': self.format(record),
+        }).encode() + b'\n'
+
+    def emit(self, record):
+        try:
+            line = self.serialize(record)
+        except Exception:
+            self.handleError(record)
+            return
+        with self._cond:
+            self._buffer.append(line)
+            if len(self._buffer) > self.max_buffer:
+                del self._buffer[0]
+                self.dropped += 1
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify()
+
+    def flush(self):
+        """Blocks until everything buffered so far has been shipped or spilled."""
+        with self._cond:
+            self._cond.notify_all()
+            while (self._buffer or self._busy) and self._thread.is_alive():
+                self._cond.wait(0.05)
+
+    def close(self):
+        with self._cond:
+            self._closing = True
+            self._cond.notify()
+        self._thread.join()
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        super().close()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._closing and len(self._buffer) < self.batch_size:
+                    self._cond.wait(self.flush_interval)
+                batch, self._buffer = self._buffer, []
+                self._busy = bool(batch)
+                closing = self._closing
+            if batch:
+                self._ship(b''.join(batch), len(batch))
+            elif self._spooled and (closing or time.monotonic() >= self._retry_at):
+                self._replay()
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
+            if closing and not self._buffer:
+                return
+
+    def _ship(self, body: bytes, count: int):
+        if time.monotonic() < self._retry_at:
+            self._spill(body, count)
+            return
+        outcome = self._post(body, retries=self.max_retries)
+        if outcome == FAILED:
+            self._spill(body, count)
+            self._retry_at = time.monotonic() + self.backoff * 2 ** self.max_retries
+            return
+        if outcome == SENT:
+            self.shipped += count
+        else:
+            self.dropped += count
+        if self._spooled:
+            self._replay()
+
+    def _connection(self):
+        if self._conn is None:
+            conn_class = http.client.HTTPSConnection if self.secure else http.client.HTTPConnection
+            self._conn = conn_class(self.host, timeout=self.timeout)
+        return self._conn
+
+    def _post(self, body: bytes, retries: int) -> str:
+        """POSTs one batch; returns SENT, REJECTED (a 4xx other than 429) or FAILED."""
+        headers = {'Content-Type': 'application/x-ndjson', 'Connection': 'keep-alive'}
+        if self.compress:
+            body = gzip.compress(body, compresslevel=5)
+            headers['Content-Encoding'] = 'gzip'
+        delay = self.backoff
+        for attempt in range(retries + 1):
+            try:
+                conn = self._connection()
+                conn.request('POST', self.url, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()  # drain so the connection can be reused
+                if response.will_close:
+                    self._drop_connection()
+                if 200 <= response.status < 300:
+                    return SENT
+                if 400 <= response.status < 500 and response.status != 429:
+                    # retrying would not help; not logged through logging, which may route back here
+                    print(f"{self.name or 'ShippingHandler'}: {self.host}{self.url} rejected a batch: "
+                          f"{response.status} {response.reason}", file=sys.stderr)
+                    return REJECTED
+            except (OSError, http.client.HTTPException):
+                self._drop_connection()
+            if attempt < retries:
+                with self._cond:
+                    if self._closing:
+                        return FAILED
+                    self._cond.wait(delay)
+                delay *= 2
+        return FAILED
+
+    def _drop_connection(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _spool_files(self) -> List[str]:
+        try:
+            names = os.listdir(self.spool_dir)
+        except FileNotFoundError:
+            return []
+        return sorted(os.path.join(self.spool_dir, n) for n in names
+                      if n.startswith(self.spool_prefix + '.') and n.endswith('.ndjson'))
+
+    def _spill(self, body: bytes, count: int):
+        """Writes a failed batch to the spool, discarding the oldest segments past spool_bytes."""
+        os.makedirs(self.spool_dir, exist_ok=True)
+        files = self._spool_files()
+        if files:
+            self._spool_seq = max(self._spool_seq, int(files[-1].rsplit('.', 2)[-2]) + 1)
+        path = os.path.join(self.spool_dir, f"{self.spool_prefix}.{self._spool_seq:010d}.ndjson")
+        self._spool_seq += 1
+        with open(path, 'wb') as f:
+            f.write(body)
+        self.spilled += count
+        self._spooled = True
+        files.append(path)
+        total = sum(os.path.getsize(f) for f in files)
+        while total > self.spool_bytes and len(files) > 1:
+            oldest = files.pop(0)
+            total -= os.path.getsize(oldest)
+            with open(oldest, 'rb') as f:
+                self.dropped += f.read().count(b'\n')
+            os.remove(oldest)
+
+    def _replay(self):
+        """Ships spooled segments oldest first; stops at the first failure."""
+        for path in self._spool_files():
+            with open(path, 'rb') as f:
+                body = f.read()
+            outcome = self._post(body, retries=0)
+            if outcome == FAILED:
+                self._retry_at = time.monotonic() + self.backoff * 2 ** self.max_retries
+                return
+            os.remove(path)
+            if outcome == SENT:
+                self.shipped += body.count(b'\n')
+            else:
+                self.dropped += body.count(b'\n')
+        self._spooled = False
@@ -0,0 +1,663 @@
+import os
+import re
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import itertools
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, FrozenSet, Iterator, List, Mapping, Optional, Tuple
+
+"""
+Compiled templates for ele's pseudo-markup (see "Placeholders and Variables" in README.md).
+
+A template is parsed once into a flat list of constant segments plus a few slots; render()
+then only looks up variables and joins. Compiled templates are kept in an LRU keyed by a
+hash of the template text, so rendering the same prompt over and over never re-parses it.
+
+What rendering does with each construct:
+
+- `{{key}}` is replaced by the value of key. `{{key|text}}` falls back to text when key is
+  unbound (`{{SHELL|BASH}}` renders BASH unless SHELL is given).
+- `${{key}}` declares key and renders nothing.
+- Modifiers (`~ + = ! - * > < <= >=`) are instructions for the model reading the prompt, so
+  they are kept in front of the substituted value: `~{{n}}` with n=5 renders `~5`.
+- `?{{a}}{{b}}` and `?{{a}}:{{b}}` render b when a is truthy and nothing otherwise. The README
+  writes the `:` form inside function arguments, but it is accepted anywhere:
+  `?{{b}}:{{c}}` with b=1, c=2 renders `2`.
+- Keywords (ANY, ALWAYS, ...) are plain text. Functions (`contains()`, `optimize()`, ...) are
+  plain text with their placeholders substituted, unless the engine was given an
+  implementation for them, in which case the call is evaluated at render time. BUILTINS has
+  random(), mixed(), between() and limit(): `limit({{k}}, 3)` renders `<k> at most 3 times`.
+
+A key bound to None, NaN, NaT or pandas.NA counts as unbound, in render() as in
+render_columns(). An unbound placeholder without a fallback is left as written
+(missing='keep'), rendered as nothing (missing='empty') or raises KeyError (missing='error').
+
+For bulk prompt generation, TemplateEngine.render_columns() renders one template over the rows
+of a DataFrame, tablib.Dataset or dict of columns, a chunk of rows at a time, and
+write_jsonl() streams those renders to disk.
+"""
+
+MODIFIERS = ('<=', '>=', '~', '+', '=', '!', '-', '*', '>', '<')
+KEYWORDS = ('ANY', 'ALWAYS', 'NEVER', 'WITH', 'AND', 'ONLY', 'NOT', 'UNIQUE')
+CHUNK_ROWS = 4096
+FALSE_STRINGS = frozenset(('', '0', 'false', 'no', 'none', 'null'))
+
+_PLACEHOLDER = re.compile(r'\{\{\s*([^{}|]*?)\s*(?:\|([^{}]*))?\}\}')
+
+
+def truthy(value: Any) -> bool:
+    """Condition test for `?{{a}}{{b}}`; 'false', '0', 'no' and the like count as false."""
+    if isinstance(value, str):
+        return value.strip().lower() not in FALSE_STRINGS
+    return bool(value)
+
+
+def _between(low: str, high: str) -> str:
+    return f"between {low} and {high}"
+
+
+def _mixed(*values: str) -> str:
+    return ', '.join(v for v in values if v)
+
+
+def _limit(subject: str, count: str) -> str:
+    return f"{subject} at most {count} times"
+
+
+def _random(*values: str) -> str:
+    values = [v for v in values if v]  # a false ?{{a}}:{{b}} argument is not a choice
+    return random.choice(values) if values else ''
+
+
+PER_ROW = frozenset(('random',))  # not pure: never folded into a constant by render_columns()
+
+BUILTINS: Dict[str, Callable[..., str]] = {
+    'random': _random,
+    'mixed': _mixed,
+    'between': _between,
+    'limit': _limit,
+}
+
+
+# -- parsed form
+#
+# A node is a tuple whose first item is its kind:
+#   ('text', s)
+#   ('var', key, modifier, fallback, source)
+#   ('decl', key)
+#   ('cond', test_key, node)            node is a 'var'
+#   ('call', name, [[node, ...], ...], source)
+
+
+@dataclass
+class Template:
+    source: str
+    digest: str
+    parts: List[str]  # constant segments; dynamic positions hold ''
+    slots: List[Tuple[int, tuple]]  # (index into parts, node)
+    variables: Tuple[str, ...]  # every key the template reads, in order of first use
+    declared: Tuple[str, ...]  # keys declared with ${{key}}
+    _render: List[Tuple[int, Callable[[Mapping], str]]] = field(default_factory=list, repr=False)
+
+    def render(self, variables: Optional[Mapping[str, Any]] = None, **kwargs) -> str:
+        """Binds variables to the compiled template."""
+        if kwargs:
+            variables = {**(variables or {}), **kwargs}
+        elif variables is None:
+            variables = {}
+        out = self.parts.copy()
+        for index, fn in self._render:
+            out[index] = fn(variables)
+        return ''.join(out)
+
+    __call__ = render
+
+
+def _split_args(text: str) -> List[str]:
+    """Splits function arguments on top-level commas (commas inside {{ }} or ( ) are kept)."""
+    args, depth, start = [], 0, 0
+    i = 0
+    while i < len(text):
+        if text.startswith('{{', i) or text[i] == '(':
+            depth += 1
+            i += 2 if text[i] == '{' else 1
+            continue
+        if text.startswith('}}', i) or text[i] == ')':
+            depth -= 1
+            i += 2 if text[i] == '}' else 1
+            continue
+        if text[i] == ',' and depth == 0:
+            args.append(text[start:i])
+            start = i + 1
+        i += 1
+    args.append(text[start:])
+    return [a.strip() for a in args]
+
+
+def _closing_paren(text: str, start: int) -> int:
+    """Index of the ')' matching the '(' just before start, or -1."""
+    depth = 1
+    for i in range(start, len(text)):
+        if text[i] == '(':
+            depth += 1
+        elif text[i] == ')':
+            depth -= 1
+            if depth == 0:
+                return i
+    return -1
+
+
+def parse(text: str, functions: Mapping[str, Callable] = ()) -> List[tuple]:
+    """Parses ele markup into nodes. Only names in `functions` become 'call' nodes."""
+    call = re.compile(r'\b(' + '|'.join(map(re.escape, sorted(functions, key=len, reverse=True))) + r')\(') \
+        if functions else None
+    nodes: List[tuple] = []
+    literal_start = i = 0
+
+    def flush(end: int):
+        if end > literal_start:
+            nodes.append(('text', text[literal_start:end]))
+
+    while True:
+        brace = text.find('{{', i)
+        fn = call.search(text, i) if call else None
+        if fn and (brace < 0 or fn.start() < brace):
+            close = _closing_paren(text, fn.end())
+            if close < 0:
+                fn = None
+            else:
+                flush(fn.start())
+                args = [parse(arg, functions) for arg in _split_args(text[fn.end():close])]
+                nodes.append(('call', fn.group(1), args, text[fn.start():close + 1]))
+                literal_start = i = close + 1
+                continue
+        if brace < 0:
+            break
+        match = _PLACEHOLDER.match(text, brace)
+        if not match:
+            i = brace + 2
+            continue
+        key, fallback = match.group(1), match.group(2)
+        before = text[literal_start:brace]
+        if before.endswith('$'):
+            flush(brace - 1)
+            nodes.append(('decl', key))
+            literal_start = i = match.end()
+            continue
+        if before.endswith('?'):
+            follow = _PLACEHOLDER.match(text, match.end() + (text.startswith(':{{', match.end())))
+            if follow:
+                flush(brace - 1)
+                then = ('var', follow.group(1), '', follow.group(2), follow.group(0))
+                nodes.append(('cond', key, then))
+                literal_start = i = follow.end()
+                continue
+        modifier = next((m for m in MODIFIERS if before.endswith(m)), '')
+        flush(brace - len(modifier))
+        nodes.append(('var', key, modifier, fallback, modifier + match.group(0)))
+        literal_start = i = match.end()
+    flush(len(text))
+    return nodes
+
+
+class _Missing:
+    pass
+
+
+_MISSING = _Missing()
+
+
+def _lookup(variables: Mapping, key: str):
+    try:
+        return variables[key]
+    except KeyError:
+        return _MISSING
+
+
+@dataclass
+class TemplateEngine:
+    """
+    Compiles ele templates and caches them.
+
+    Args:
+        maxsize (int): Compiled templates kept in the LRU.
+        missing (str): 'keep', 'empty' or 'error' for unbound placeholders without a fallback.
+        functions (Dict[str, Callable[..., str]]): Functions evaluated at render time; they
+            receive their rendered arguments as strings. Others stay in the output as text.
+        per_row (FrozenSet[str]): Functions that are not pure (e.g. random); render_columns()
+            calls them once per row even when their arguments are the same for every row.
+    """
+    maxsize: int = 256
+    missing: str = 'keep'
+    functions: Dict[str, Callable[..., str]] = field(default_factory=dict)
+    per_row: FrozenSet[str] = PER_ROW
+    hits: int = 0
+    misses: int = 0
+    _cache: 'OrderedDict[str, Template]' = field(default_factory=OrderedDict, repr=False)
+
+    def __post_init__(self):
+        if self.missing not in ('keep', 'empty', 'error'):
+            raise ValueError(f"missing must be 'keep', 'empty' or 'error', not {self.missing!r}")
+
+    @staticmethod
+    def digest(text: str) -> str:
+        return hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=16).hexdigest()
+
+    def compile(self, text: str) -> Template:
+        """Returns the compiled form of text, parsing it only on a cache miss."""
+        key = self.digest(text)
+        template = self._cache.get(key)
+        if template is not None and template.source == text:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return template
+        self.misses += 1
+        template = self._compile(text, key)
+        self._cache[key] = template
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+        return template
+
+    def render(self, text: str, variables: Optional[Mapping[str, Any]] = None, **kwargs) -> str:
+        return self.compile(text).render(variables, **kwargs)
+
+    def clear(self):
+        self._cache.clear()
+        self.hits = self.misses = 0
+
+    # -- compilation
+
+    def _compile(self, text: str, digest: str) -> Template:
+        nodes = parse(text, self.functions)
+        parts: List[str] = []
+        slots: List[Tuple[int, tuple]] = []
+        variables: Dict[str, None] = {}
+        declared: Dict[str, None] = {}
+        for node in nodes:
+            if node[0] == 'text':
+                if parts and not (slots and slots[-1][0] == len(parts) - 1):
+                    parts[-1] += node[1]  # merge adjacent constants
+                else:
+                    parts.append(node[1])
+                continue
+            if node[0] == 'decl':
+                declared[node[1]] = None
+                continue
+            self._collect(node, variables)
+            slots.append((len(parts), node))
+            parts.append('')
+        template = Template(text, digest, parts, slots, tuple(variables), tuple(declared))
+        template._render = [(index, self._closure(node)) for index, node in slots]
+        return template
+
+    def _collect(self, node: tuple, variables: Dict[str, None]):
+        if node[0] == 'var':
+            variables[node[1]] = None
+        elif node[0] == 'cond':
+            variables[node[1]] = None
+            self._collect(node[2], variables)
+        elif node[0] == 'call':
+            for arg in node[2]:
+                for inner in arg:
+                    self._collect(inner, variables)
+
+    def _unbound(self, key: str, source: str) -> str:
+        if self.missing == 'error':
+            raise KeyError(key)
+        return source if self.missing == 'keep' else ''
+
+    def _closure(self, node: tuple) -> Callable[[Mapping], str]:
+        kind = node[0]
+        if kind == 'var':
+            _, key, modifier, fallback, source = node
+            unbound = self._unbound
+
+            def var(variables, key=key, modifier=modifier, fallback=fallback, source=source):
+                value = _lookup(variables, key)
+                if type(value) is str:
+                    return modifier + value
+                if value is _MISSING or _absent(value):
+                    if fallback is not None:
+                        return modifier + fallback
+                    return unbound(key, source)
+                return modifier + str(value)
+            return var
+        if kind == 'cond':
+            _, test, then = node
+            inner = self._closure(then)
+
+            def cond(variables, test=test, inner=inner):
+                value = _lookup(variables, test)
+                return inner(variables) if value is not _MISSING and not _absent(value) and truthy(value) else ''
+            return cond
+        if kind == 'call':
+            _, name, args, _ = node
+            fn = self.functions[name]
+            renderers = [self._sequence(arg) for arg in args]
+
+            def call(variables, fn=fn, renderers=renderers):
+                return str(fn(*[render(variables) for render in renderers]))
+            return call
+        if kind == 'text':
+            return lambda variables, text=node[1]: text
+        return lambda variables: ''  # 'decl'
+
+    def _sequence(self, nodes: List[tuple]) -> Callable[[Mapping], str]:
+        fns = [self._closure(node) for node in nodes]
+        if len(fns) == 1:
+            return fns[0]
+        return lambda variables: ''.join(fn(variables) for fn in fns)
+
+    # -- batches
+
+    def render_columns(self, text: str, data, constants: Optional[Mapping[str, Any]] = None,
+                       chunk_size: int = CHUNK_ROWS) -> Iterator[str]:
+        """
+        Renders text once per row of a columnar dataset, streaming the results.
+
+        Placeholders are resolved a column at a time instead of a row at a time, and constant
+        segments (including placeholders bound by constants) are baked into one format string
+        per chunk, so only chunk_size rendered rows exist at once however long the dataset is.
+
+        Args:
+            text (str): The template.
+            data: A pandas DataFrame, a tablib.Dataset, a mapping of column name -> sequence,
+                or an iterable of those (e.g. pandas.read_csv(..., chunksize=n)).
+            constants (Mapping[str, Any]): Variables shared by every row. A column of the same
+                name takes precedence.
+            chunk_size (int): Rows rendered per step.
+
+        Yields:
+            str: One rendered template per row, in order.
+        """
+        template = self.compile(text)
+        constants = constants or {}
+        for rows, column in _column_chunks(data, chunk_size):
+            fmt, columns = [], []
+            slot_nodes = dict(template.slots)
+            for index, part in enumerate(template.parts):
+                node = slot_nodes.get(index)
+                if node is None:
+                    fmt.append(part.replace('{', '{{').replace('}', '}}'))
+                    continue
+                values = self._column(node, column, constants, rows)
+                if isinstance(values, str):
+                    fmt.append(values.replace('{', '{{').replace('}', '}}'))
+                else:
+                    fmt.append('{}')
+                    columns.append(values)
+            fmt = ''.join(fmt)
+            if columns:
+                yield from map(fmt.format, *columns)
+            else:
+                yield from itertools.repeat(fmt.format(), rows)
+
+    def write_jsonl(self, text: str, data, path: str, key: str = 'prompt',
+                    constants: Optional[Mapping[str, Any]] = None, chunk_size: int = CHUNK_ROWS,
+                    append: bool = False) -> int:
+        """
+        Streams render_columns() into a JSON Lines file of {"row": n, key: rendered} objects.
+
+        Each chunk is written with a single f.write(). A new file is written next to path and
+        renamed into place, so readers never see a partial export; append=True adds to it
+        instead, continuing the row numbering.
+
+        Returns:
+            int: Rows written.
+        """
+        start = 0
+        if append and os.path.exists(path):
+            with open(path, 'rb') as f:
+                start = sum(chunk.count(b'\n') for chunk in iter(lambda: f.read(1 << 20), b''))
+        target = path if append else f"{path}.tmp"
+        written = 0
+        with open(target, 'a' if append else 'w', encoding='utf-8') as f:
+            lines = []
+            for written, rendered in enumerate(self.render_columns(text, data, constants, chunk_size), 1):
+                lines.append(json.dumps({'row': start + written - 1, key: rendered}))
+                if len(lines) == chunk_size:
+                    f.write('\n'.join(lines) + '\n')
+                    lines.clear()
+            if lines:
+                f.write('\n'.join(lines) + '\n')
+        if not append:
+            os.replace(target, path)
+        return written
+
+    def _column(self, node: tuple, column: Callable[[str], Optional[list]], constants: Mapping[str, Any],
+                rows: int):
+        """A node's rendered values for one chunk: a list, or one str when every row is the same."""
+        kind = node[0]
+        if kind == 'text':
+            return node[1]
+        if kind == 'decl':
+            return ''
+        if kind == 'var':
+            _, key, modifier, fallback, source = node
+            values = column(key)
+            if values is None:
+                return self._closure(node)(constants)
+            if not modifier and all(type(v) is str for v in values):
+                return values  # the common case: a text column, used as is
+            out = [modifier + v if type(v) is str else None if _absent(v) else modifier + str(v) for v in values]
+            if None in out:
+                absent = modifier + fallback if fallback is not None else self._unbound(key, source)
+                out = [absent if v is None else v for v in out]
+            return out
+        if kind == 'cond':
+            _, test, then = node
+            tests = column(test)
+            if tests is None:
+                if test in constants and not _absent(constants[test]) and truthy(constants[test]):
+                    return self._column(then, column, constants, rows)
+                return ''
+            values = self._column(then, column, constants, rows)
+            if isinstance(values, str):
+                values = itertools.repeat(values)
+            memo = {}  # test columns are mostly a handful of distinct values
+
+            def test_value(t):
+                try:
+                    return memo[t]
+                except KeyError:
+                    memo[t] = result = not _absent(t) and truthy(t)
+                    return result
+                except TypeError:  # unhashable
+                    return not _absent(t) and truthy(t)
+            return [v if test_value(t) else '' for t, v in zip(tests, values)]
+        _, name, args, _ = node  # 'call'
+        fn = self.functions[name]
+        args = [self._sequence_column(arg, column, constants, rows) for arg in args]
+        if all(isinstance(a, str) for a in args) and name not in self.per_row:
+            return str(fn(*args))  # pure and constant: one call serves the whole chunk
+        return [str(v) for v in map(fn, *(itertools.repeat(a, rows) if isinstance(a, str) else a for a in args))]
+
+    def _sequence_column(self, nodes: List[tuple], column, constants, rows):
+        values = [self._column(node, column, constants, rows) for node in nodes]
+        if all(isinstance(v, str) for v in values):
+            return ''.join(values)
+        return [''.join(row) for row in zip(*(itertools.repeat(v) if isinstance(v, str) else v for v in values))]
+
+
+def _absent(value) -> bool:
+    """None, NaN, NaT and pandas.NA cells count as unbound."""
+    if value is None:
+        return True
+    try:
+        return bool(value != value)
+    except TypeError:  # pandas.NA
+        return True
+
+
+def _column_chunks(data, chunk_size: int) -> Iterator[Tuple[int, Callable[[str], Optional[list]]]]:
+    """Yields (rows, column) per chunk, where column(name) is that chunk's values or None."""
+    if hasattr(data, 'iloc') and hasattr(data, 'columns'):  # pandas.DataFrame
+        names = set(data.columns)
+        for start in range(0, len(data), chunk_size):
+            frame = data.iloc[start:start + chunk_size]
+            yield len(frame), lambda name, frame=frame: frame[name].tolist() if name in names else None
+    elif hasattr(data, 'headers') and hasattr(data, 'height'):  # tablib.Dataset
+        index = {name: i for i, name in enumerate(data.headers or ())}
+        for start in range(0, data.height, chunk_size):
+            rows = data[start:start + chunk_size]
+            yield len(rows), lambda name, rows=rows: [row[index[name]] for row in rows] if name in index else None
+    elif isinstance(data, Mapping):
+        lengths = {len(values) for values in data.values()}
+        if len(lengths) > 1:
+            raise ValueError(f"columns have different lengths: {sorted(lengths)}")
+        total = lengths.pop() if lengths else 0
+        for start in range(0, total, chunk_size):
+            end = min(start + chunk_size, total)
+            yield end - start, lambda name, start=start, end=end: list(data[name][start:end]) if name in data else None
+    else:
+        for part in data:
+            yield from _column_chunks(part, chunk_size)
+
+
+_default = TemplateEngine()
+
+
+def compile_template(text: str) -> Template:
+    """Compiles with the module's shared engine (missing='keep', no evaluated functions)."""
+    return _default.compile(text)
+
+
+def render(text: str, variables: Optional[Mapping[str, Any]] = None, **kwargs) -> str:
+    return _default.render(text, variables, **kwargs)
+
+
+def render_columns(text: str, data, constants: Optional[Mapping[str, Any]] = None,
+                   chunk_size: int = CHUNK_ROWS) -> Iterator[str]:
+    return _default.render_columns(text, data, constants, chunk_size)
+
+
+SAMPLE = """You are playing the role of a {{domain|general}}/{{agent}} chatbot. ${{SHELL}}
+Commands run in {{SHELL|BASH}} inside ${{SANDBOX}}{{SANDBOX|WSB}}.
+Answer in ~{{words}} words, ALWAYS in {{language}}, NEVER mention !{{secret}}.
+?{{verbose}}{{detail}} Keep between({{low}}, {{high}}) examples, limit({{topic}}, {{max}}).
+Focus: mixed({{a}}, {{b}}, {{c}}); tone: random(?{{formal}}:{{register}}, {{tone}}).
+"""
+
+
+def _replace_render(text: str, variables: Mapping[str, Any]) -> str:
+    """The ad-hoc approach: re-scan the template on every call."""
+    def sub(match):
+        value = variables.get(match.group(1))
+        return match.group(0) if value is None else str(value)
+    return _PLACEHOLDER.sub(sub, re.sub(r'\$\{\{[^{}]*\}\}', '', text))
+
+
+def benchmark(renders: int = 100_000, template: str = SAMPLE, out=None) -> Dict[str, float]:
+    """Times parsing versus rendering, and compares with per-call regex substitution."""
+    out = out or sys.stdout
+    variables = {'domain': 'ops', 'agent': 'ele', 'words': 200, 'language': 'English', 'secret': 'keys',
+                 'verbose': 'yes', 'detail': 'Explain each step.', 'low': 2, 'high': 5, 'topic': 'git',
+                 'max': 3, 'a': 'bash', 'b': 'python', 'c': 'C', 'formal': 0, 'register': 'formal',
+                 'tone': 'plain'}
+    results = {}
+    engine = TemplateEngine(functions=dict(BUILTINS))
+    cold = max(1, renders // 100)
+    start = time.perf_counter()
+    for i in range(cold):
+        engine._compile(template, str(i))
+    results['parse_us'] = (time.perf_counter() - start) / cold * 1e6
+    compiled = engine.compile(template)
+    start = time.perf_counter()
+    for _ in range(renders):
+        compiled.render(variables)
+    results['render_us'] = (time.perf_counter() - start) / renders * 1e6
+    start = time.perf_counter()
+    for _ in range(renders):
+        engine.render(template, variables)
+    results['cached_render_us'] = (time.perf_counter() - start) / renders * 1e6
+    start = time.perf_counter()
+    for _ in range(renders):
+        _replace_render(template, variables)
+    results['regex_replace_us'] = (time.perf_counter() - start) / renders * 1e6
+    for name, value in results.items():
+        out.write(f"{name:>17}: {value:.2f} us\n")
+    return results
+
+
+def benchmark_columns(rows: int = 100_000, template: str = SAMPLE, out=None) -> Dict[str, float]:
+    """Renders a DataFrame of `rows` rows per row and by column; reports rows/s and peak memory."""
+    import tracemalloc
+    import pandas as pd
+    out = out or sys.stdout
+    rng = random.Random(7)
+    frame = pd.DataFrame({
+        'agent': [f"agent{i % 97}" for i in range(rows)],
+        'words': [rng.randint(50, 500) for _ in range(rows)],
+        'language': rng.choices(['English', 'German', 'French'], k=rows),
+        'verbose': rng.choices(['yes', 'no'], k=rows),
+        'detail': [f"detail {i}" for i in range(rows)],
+        'topic': rng.choices(['git', 'bash', 'vaults'], k=rows),
+    })
+    constants = {'secret': 'keys', 'low': 2, 'high': 5, 'max': 3, 'a': 'bash', 'b': 'python', 'c': 'C',
+                 'formal': 0, 'tone': 'plain'}
+    engine = TemplateEngine(functions=dict(BUILTINS))
+    compiled = engine.compile(template)
+    results = {}
+    start = time.perf_counter()
+    for row in frame.to_dict('records'):
+        compiled.render({**constants, **row})
+    results['per_row_rows_s'] = rows / (time.perf_counter() - start)
+    start = time.perf_counter()
+    for _ in engine.render_columns(template, frame, constants):
+        pass
+    results['columnar_rows_s'] = rows / (time.perf_counter() - start)
+    tracemalloc.start()  # a second pass: tracing slows allocation down too much to time
+    for _ in engine.render_columns(template, frame, constants):
+        pass
+    results['columnar_peak_mb'] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+    for name, value in results.items():
+        out.write(f"{name:>17}: {value:,.1f}\n")
+    return results
+
+
+def main(argv=None):
+    """`python -m src.utils.markup`: render a template file, or benchmark the engine."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    sub = parser.add_subparsers(dest='command', required=True)
+    show = sub.add_parser('render', help='render a template with key=value variables')
+    show.add_argument('template', help="template file, or '-' for stdin")
+    show.add_argument('variables', nargs='*', metavar='key=value')
+    show.add_argument('--missing', choices=('keep', 'empty', 'error'), default='keep')
+    show.add_argument('--functions', action='store_true', help='evaluate random(), mixed(), between() and limit()')
+    batch = sub.add_parser('batch', help='render a template over every row of a CSV file into JSON Lines')
+    batch.add_argument('template')
+    batch.add_argument('csv')
+    batch.add_argument('out')
+    batch.add_argument('--chunk-size', type=int, default=CHUNK_ROWS)
+    batch.add_argument('--append', action='store_true')
+    bench = sub.add_parser('bench', help='parse vs render timings')
+    bench.add_argument('--renders', type=int, default=100_000)
+    bench.add_argument('--rows', type=int, default=0, help='also time columnar rendering over this many rows')
+    args = parser.parse_args(argv)
+
+    if args.command == 'render':
+        text = sys.stdin.read() if args.template == '-' else open(args.template).read()
+        engine = TemplateEngine(missing=args.missing, functions=dict(BUILTINS) if args.functions else {})
+        sys.stdout.write(engine.render(text, dict(v.split('=', 1) for v in args.variables)))
+    elif args.command == 'batch':
+        import pandas as pd
+        with open(args.template) as f:
+            text = f.read()
+        frames = pd.read_csv(args.csv, chunksize=args.chunk_size, dtype=str, keep_default_na=False,
+                             na_values=[''])  # an empty cell is unbound
+        rows = _default.write_jsonl(text, frames, args.out, chunk_size=args.chunk_size, append=args.append)
+        print(f"{rows} rows -> {args.out}")
+    else:
+        benchmark(args.renders)
+        if args.rows:
+            benchmark_columns(args.rows)
+
+
+if __name__ == "__main__":
+    main()
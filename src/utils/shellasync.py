@@ -0,0 +1,170 @@
+import sys
+import time
+import shlex
+import asyncio
+import dataclasses
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from src.utils.shelltils import ShellCall
+
+"""
+Runs batches of independent ShellCalls concurrently on asyncio subprocesses.
+
+ShellCall is frozen, so results come back as new ShellCall instances (dataclasses.replace)
+with output, stderr, return_code and timestamp filled in; the inputs are left untouched.
+Commands are split with shlex and started with create_subprocess_exec, never through a shell.
+At most max_concurrency processes run at once per executor; the rest wait on its semaphore, and
+every call's wait time, run time and the queue depth it saw are kept in AsyncShellExecutor.stats.
+A command that cannot be started (e.g. not installed) comes back with return code 127 and the
+error as stderr instead of failing the whole batch.
+"""
+
+
+@dataclass
+class CallStats:
+    command: str
+    queue_depth: int  # calls waiting for a slot when this one was submitted
+    waited: float  # seconds spent waiting for a slot
+    elapsed: float  # seconds the process ran
+    submitted: float = 0.0  # time.perf_counter() values
+    finished: float = 0.0
+    return_code: Optional[int] = None
+    timed_out: bool = False
+    cancelled: bool = False
+
+
+@dataclass
+class AsyncShellExecutor:
+    max_concurrency: int = 8
+    timeout: Optional[float] = None  # default per-call timeout in seconds
+    cwd: Optional[str] = None
+    env: Optional[Dict[str, str]] = None
+    encoding: str = field(default_factory=lambda: sys.stdin.encoding or 'utf-8')
+    stats: List[CallStats] = field(default_factory=list)
+    _waiting: int = field(default=0, repr=False)
+    _running: int = field(default=0, repr=False)
+    _slots: Optional[asyncio.Semaphore] = field(default=None, repr=False)
+    _slots_loop: Optional[asyncio.AbstractEventLoop] = field(default=None, repr=False)
+
+    @property
+    def queue_depth(self) -> int:
+        """Calls currently waiting for a free slot."""
+        return self._waiting
+
+    @property
+    def in_flight(self) -> int:
+        return self._running
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        # one per executor; asyncio semaphores are bound to a loop, so it is replaced when the executor
+        # is reused, idle, on a new loop (the next asyncio.run()), never while calls hold or await it
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._slots_loop is not loop:
+            if self._waiting or self._running:
+                raise RuntimeError("AsyncShellExecutor is already running calls on another event loop")
+            self._slots, self._slots_loop = asyncio.Semaphore(self.max_concurrency), loop
+        return self._slots
+
+    async def run(self, call: ShellCall, timeout: Optional[float] = None) -> ShellCall:
+        """
+        Runs one call once a slot is free.
+
+        Args:
+            call (ShellCall): The command to run.
+            timeout (float): Seconds before the process is killed (defaults to self.timeout).
+
+        Returns:
+            ShellCall: A copy of call with the results; a timed-out call gets the kill's return code
+            and a note appended to stderr.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        semaphore = self._semaphore()
+        queued = time.perf_counter()
+        stats = CallStats(call.command, self._waiting, 0.0, 0.0, submitted=queued)
+        self.stats.append(stats)
+        self._waiting += 1
+        try:
+            await semaphore.acquire()
+        except asyncio.CancelledError:
+            stats.cancelled = True
+            stats.finished = time.perf_counter()
+            raise
+        finally:
+            self._waiting -= 1
+        stats.waited = time.perf_counter() - queued
+        self._running += 1
+        started = time.perf_counter()
+        process = None
+        try:
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    *shlex.split(call.command), stdin=asyncio.subprocess.DEVNULL,
+                    stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE, cwd=self.cwd, env=self.env)
+            except OSError as e:  # not found / not executable: fail this call, not the gather
+                stats.return_code = 127
+                return dataclasses.replace(call, output='', stderr=str(e), return_code=127, timestamp=datetime.now())
+            try:
+                out, err = await asyncio.wait_for(process.communicate(), timeout)
+            except asyncio.TimeoutError:
+                stats.timed_out = True
+                process.kill()
+                out, err = await process.communicate()
+                err += f"\ntimed out after {timeout}s".encode()
+            stats.return_code = process.returncode
+            return dataclasses.replace(call, output=out.decode(self.encoding, errors='replace'),
+                                       stderr=err.decode(self.encoding, errors='replace'),
+                                       return_code=process.returncode, timestamp=datetime.now())
+        except asyncio.CancelledError:
+            stats.cancelled = True
+            if process is not None and process.returncode is None:
+                process.kill()
+                await asyncio.shield(process.wait())
+            raise
+        finally:
+            stats.finished = time.perf_counter()
+            stats.elapsed = stats.finished - started
+            self._running -= 1
+            semaphore.release()
+
+    async def map(self, calls: Iterable[ShellCall], timeout: Optional[float] = None) -> List[ShellCall]:
+        """Runs calls concurrently and returns the results in submission order."""
+        return list(await asyncio.gather(*(self.run(call, timeout) for call in calls)))
+
+    async def as_completed(self, calls: Iterable[ShellCall],
+                           timeout: Optional[float] = None) -> AsyncIterator[Tuple[int, ShellCall]]:
+        """Yields (submission index, result) pairs as the calls finish; leaving early cancels the rest."""
+        tasks = {asyncio.ensure_future(self.run(call, timeout)): i for i, call in enumerate(calls)}
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in sorted(done, key=tasks.get):
+                    yield tasks[task], task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    def run_batch(self, calls: Iterable[ShellCall], timeout: Optional[float] = None) -> List[ShellCall]:
+        """Synchronous entry point: runs a batch on a fresh event loop, results in submission order."""
+        return asyncio.run(self.map(calls, timeout))
+
+    def summary(self) -> Dict[str, float]:
+        """Aggregate latency and queueing figures over self.stats."""
+        if not self.stats:
+            return {'calls': 0}
+        elapsed = sorted(s.elapsed for s in self.stats)
+        span = max(s.finished for s in self.stats) - min(s.submitted for s in self.stats)
+        return {
+            'calls': len(self.stats),
+            'throughput': len(self.stats) / span if span > 0 else float('inf'),  # calls per second
+            'timed_out': sum(s.timed_out for s in self.stats),
+            'cancelled': sum(s.cancelled for s in self.stats),
+            'max_queue_depth': max(s.queue_depth for s in self.stats),
+            'mean_wait': sum(s.waited for s in self.stats) / len(self.stats),
+            'p50_elapsed': elapsed[len(elapsed) // 2],
+            'p95_elapsed': elapsed[min(len(elapsed) - 1, int(len(elapsed) * 0.95))],
+        }
@@ -0,0 +1,203 @@
+import os
+import json
+import time
+import shlex
+import hashlib
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Mapping, Optional, Sequence, Union
+
+from src.fs.snapshot import DigestCache
+
+"""
+Opt-in, on-disk memoization of command results (see ShellCall.execute and calldef.call).
+
+Commands that are pure functions of their inputs and have no side effects - linters, checks,
+git queries - can be given a ResultCache and the files they read. The cache key is a sha256
+over the command, the working directory, the values of a few relevant environment variables
+(env_keys) and a fingerprint of every declared input: each file's content digest, found
+through a persistent (size, mtime_ns, inode) stat cache so unchanged inputs are not read
+again. Directories count as all the files under them. A hit returns the stored stdout, stderr
+and return code without starting a process.
+
+Commands that write files, such as formatters run in place, must not be cached: a hit would
+skip the writes. As a guard, store() keeps a result only if the declared inputs are unchanged
+after the run.
+
+Entries are small JSON files under <root>/entries/. A hit refreshes the entry's mtime, and
+once the entries outgrow max_bytes the least recently used are deleted, down to 90% of it.
+"""
+
+DEFAULT_CACHE = os.environ.get('ELE_SHELL_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'ele', 'shell'))
+DEFAULT_ENV_KEYS = ('PATH', 'LANG', 'LC_ALL', 'LC_CTYPE', 'PYTHONPATH', 'VIRTUAL_ENV')
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+@dataclass
+class ResultCache:
+    root: str = DEFAULT_CACHE
+    max_bytes: int = DEFAULT_MAX_BYTES
+    env_keys: Sequence[str] = DEFAULT_ENV_KEYS
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    skipped: int = 0  # results not stored because the run changed its own inputs
+    _digests: Optional[DigestCache] = field(default=None, repr=False)
+    _size: Optional[int] = field(default=None, repr=False)  # bytes under entries/, counted on first put
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @property
+    def entries_dir(self) -> str:
+        return os.path.join(self.root, 'entries')
+
+    def entry_path(self, key: str) -> str:
+        return os.path.join(self.entries_dir, key[:2], f"{key[2:]}.json")
+
+    @property
+    def digests(self) -> DigestCache:
+        if self._digests is None:
+            os.makedirs(self.root, exist_ok=True)
+            self._digests = DigestCache(os.path.join(self.root, 'statcache.json'))
+        return self._digests
+
+    # -- keys
+
+    def fingerprint(self, inputs: Sequence[str], cwd: Optional[str] = None) -> List[list]:
+        """[path, digest] for every input file (None if missing), directories expanded, sorted."""
+        cwd = cwd or os.getcwd()
+        digests = self.digests
+        result = []
+        for name in inputs:
+            path = os.path.abspath(os.path.join(cwd, name))
+            if os.path.isdir(path):
+                result.extend([f"{name}/{e.path}", e.digest] for e in digests.entries_for(path))
+                continue
+            try:
+                result.append([name, digests.digest(path)])
+            except FileNotFoundError:
+                result.append([name, None])
+        digests.save()
+        return sorted(result)
+
+    def key(self, command: Union[str, Sequence[str]], cwd: Optional[str] = None,
+            env: Optional[Mapping[str, str]] = None, inputs: Sequence[str] = ()) -> str:
+        """
+        The cache key of one invocation.
+
+        Args:
+            command (Union[str, Sequence[str]]): As passed to the shell or to Popen.
+            cwd (str): Working directory (default: the current one).
+            env (Mapping[str, str]): The command's environment (default: os.environ); only
+                env_keys are part of the key.
+            inputs (Sequence[str]): Files or directories the command reads, relative to cwd.
+        """
+        cwd = os.path.abspath(cwd or os.getcwd())
+        env = os.environ if env is None else env
+        material = {
+            'command': command if isinstance(command, str) else shlex.join(map(str, command)),
+            'cwd': cwd,
+            'env': {k: env.get(k) for k in self.env_keys},
+            'inputs': self.fingerprint(inputs, cwd),
+        }
+        return hashlib.sha256(json.dumps(material, sort_keys=True).encode()).hexdigest()
+
+    # -- entries
+
+    def get(self, key: str) -> Optional[Dict]:
+        """The stored result for key ({'stdout', 'stderr', 'return_code'}), counting a hit or miss."""
+        path = self.entry_path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+            os.utime(path)  # most recently used
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return entry
+
+    def store(self, key: str, command: Union[str, Sequence[str]], cwd: Optional[str],
+              env: Optional[Mapping[str, str]], inputs: Sequence[str],
+              stdout: str, stderr: str, return_code: int) -> bool:
+        """
+        Stores the result of a run keyed before it started, unless the run changed its declared
+        inputs (the command is not side-effect free, or something else wrote them meanwhile).
+
+        Returns:
+            bool: Whether the result was stored.
+        """
+        if inputs and self.key(command, cwd, env, inputs) != key:
+            with self._lock:
+                self.skipped += 1
+            return False
+        self.put(key, stdout, stderr, return_code,
+                 command if isinstance(command, str) else shlex.join(map(str, command)))
+        return True
+
+    def put(self, key: str, stdout: str, stderr: str, return_code: int, command: str = ''):
+        path = self.entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = json.dumps({'command': command, 'stdout': stdout, 'stderr': stderr,
+                           'return_code': return_code, 'created': time.time()})
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'w') as f:
+            f.write(data)
+        os.replace(tmp, path)
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._scan())
+            else:
+                self._size += len(data.encode())
+            over = self._size > self.max_bytes
+        if over:
+            self.evict()
+
+    def _scan(self):
+        """(path, size, mtime) of every entry."""
+        for directory, _, files in os.walk(self.entries_dir):
+            for name in files:
+                path = os.path.join(directory, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, st.st_size, st.st_mtime
+
+    def evict(self, target: Optional[int] = None) -> int:
+        """
+        Deletes least recently used entries until they take at most target bytes (default 90%
+        of max_bytes).
+
+        Returns:
+            int: Entries deleted.
+        """
+        target = int(self.max_bytes * 0.9) if target is None else target
+        entries = sorted(self._scan(), key=lambda e: e[2])
+        size = sum(e[1] for e in entries)
+        removed = 0
+        for path, entry_size, _ in entries:
+            if size <= target:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+            removed += 1
+        with self._lock:
+            self._size = size
+            self.evictions += removed
+        return removed
+
+    def clear(self):
+        self.evict(0)
+        with self._lock:
+            self.hits = self.misses = self.evictions = self.skipped = 0
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'skipped': self.skipped,
+                'hit_rate': self.hits / lookups if lookups else 0.0}
@@ -0,0 +1,238 @@
+import os
+import sys
+import time
+import uuid
+import shlex
+import selectors
+import threading
+import subprocess
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+"""
+Long-lived bash sessions driven over pipes, and a pool that lends them out.
+
+A session runs `bash --noprofile --norc` once. Each command is sent as
+`eval '<command>' </dev/null` followed by a printf of a per-session sentinel (plus the exit
+status) on stdout and on stderr; output is read until both sentinels arrive. eval keeps a
+malformed command from desynchronising the framing, and running it in the session's own shell
+means `cd`, `export` and shell variables persist to the next command. Commands cannot read the
+session's stdin.
+
+ShellSessionPool hands each session to one caller at a time (pool.session()); the borrower's
+cd/export state lasts for the block, and the session is replaced on release so none of it leaks
+to the next borrower. pool.run() runs one command in a subshell of an idle session instead, so
+those sessions are reused. Sessions that died, timed out or have run max_commands commands are
+replaced too, and only sessions that saw an error are health-checked on the way back.
+"""
+
+
+class SessionError(Exception):
+    """The session died or stopped answering; it cannot be used again."""
+
+
+@dataclass
+class SessionResult:
+    stdout: str
+    stderr: str
+    return_code: int
+
+
+class ShellSession:
+    """One bash process; not thread-safe on its own, borrow it through ShellSessionPool."""
+
+    def __init__(self, cwd: Optional[str] = None, env: Optional[Dict[str, str]] = None,
+                 shell: str = 'bash', encoding: Optional[str] = None):
+        self.encoding = encoding or sys.stdin.encoding or 'utf-8'
+        self.commands = 0
+        self.dirty = False  # ran a command outside a subshell, so cwd/env/variables may have changed
+        self.suspect = False  # a command failed in a way that may have left the framing out of step
+        self.sentinel = f"__ele_{uuid.uuid4().hex}__"
+        self.process = subprocess.Popen([shell, '--noprofile', '--norc'], cwd=cwd, env=env,
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    @property
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def run(self, command: str, timeout: Optional[float] = None, isolated: bool = False) -> SessionResult:
+        """
+        Runs a command in the session's shell.
+
+        Args:
+            command (str): Shell source; state changes (cwd, exports) persist.
+            timeout (float): Seconds to wait for the command; on expiry the session is killed.
+            isolated (bool): Run it in a subshell, so state changes do not persist.
+
+        Raises:
+            SessionError: The shell exited (e.g. the command ran `exit`) or timed out.
+        """
+        if not self.alive:
+            raise SessionError(f"session exited with {self.process.returncode}")
+        self.commands += 1
+        self.dirty = self.dirty or not isolated
+        run = f"( eval {shlex.quote(command)} )" if isolated else f"eval {shlex.quote(command)}"
+        script = (f"{run} </dev/null\n"
+                  f"printf '\\n{self.sentinel} %d\\n' $?\n"
+                  f"printf '\\n{self.sentinel}\\n' >&2\n")
+        try:
+            self.process.stdin.write(script.encode(self.encoding))
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            self.kill()
+            raise SessionError(f"session stdin closed: {e}") from e
+        try:
+            out, err, status = self._read_frames(timeout)
+        except BaseException:
+            self.suspect = True  # e.g. interrupted mid-read: the next frame may hold this one's tail
+            raise
+        return SessionResult(out.decode(self.encoding, errors='replace'),
+                             err.decode(self.encoding, errors='replace'), status)
+
+    def _read_frames(self, timeout: Optional[float]):
+        marker = f"\n{self.sentinel}".encode()
+        buffers = {self.process.stdout: bytearray(), self.process.stderr: bytearray()}
+        scanned = {pipe: 0 for pipe in buffers}
+        done = {}
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with selectors.DefaultSelector() as selector:
+            for pipe in buffers:
+                selector.register(pipe, selectors.EVENT_READ)
+            while len(done) < 2:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    self.kill()
+                    raise SessionError(f"command timed out after {timeout}s")
+                for key, _ in selector.select(remaining):
+                    chunk = os.read(key.fd, 65536)
+                    if not chunk:
+                        self.kill()
+                        raise SessionError(f"session exited with {self.process.returncode}")
+                    buffer = buffers[key.fileobj]
+                    buffer += chunk
+                    # the sentinel line is complete once its trailing newline has arrived
+                    at = buffer.find(marker, scanned[key.fileobj])
+                    if at == -1:
+                        scanned[key.fileobj] = max(0, len(buffer) - len(marker))
+                    elif buffer.find(b'\n', at + len(marker)) != -1:
+                        done[key.fileobj] = at
+                        selector.unregister(key.fileobj)
+                    else:
+                        scanned[key.fileobj] = at
+        out = buffers[self.process.stdout]
+        at = done[self.process.stdout]
+        status = int(out[at + len(marker):].split(b'\n', 1)[0])
+        return bytes(out[:at]), bytes(buffers[self.process.stderr][:done[self.process.stderr]]), status
+
+    def ping(self, timeout: float = 2.0) -> bool:
+        """True if the shell still answers a no-op command."""
+        try:
+            ok = self.alive and self.run(':', timeout=timeout, isolated=True).return_code == 0
+            self.suspect = self.suspect and not ok
+            return ok
+        except SessionError:
+            return False
+
+    def kill(self):
+        if self.alive:
+            self.process.kill()
+        self.process.wait()
+        for pipe in (self.process.stdin, self.process.stdout, self.process.stderr):
+            try:
+                pipe.close()
+            except OSError:
+                pass
+
+    def close(self):
+        """Asks the shell to exit, killing it if it does not."""
+        if self.alive:
+            try:
+                self.process.stdin.close()
+                self.process.wait(timeout=2)
+            except (OSError, subprocess.TimeoutExpired):
+                pass
+        self.kill()
+
+
+@dataclass
+class ShellSessionPool:
+    size: int = 4
+    max_commands: int = 500  # recycle a session after this many commands
+    cwd: Optional[str] = None
+    env: Optional[Dict[str, str]] = None
+    shell: str = 'bash'
+    health_check: bool = True  # ping sessions that come back after an error before lending them out again
+    created: int = 0
+    recycled: int = 0
+    _idle: List[ShellSession] = field(default_factory=list, repr=False)
+    _lent: int = field(default=0, repr=False)
+    _closed: bool = field(default=False, repr=False)
+    _cond: threading.Condition = field(default_factory=threading.Condition, repr=False)
+
+    def _new_session(self) -> ShellSession:
+        self.created += 1
+        return ShellSession(self.cwd, self.env, self.shell)
+
+    def acquire(self, timeout: Optional[float] = None) -> ShellSession:
+        """Borrows a session for exclusive use, starting one if fewer than size exist."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._closed or self._lent < self.size, timeout):
+                raise TimeoutError("no shell session became available")
+            if self._closed:
+                raise SessionError("pool is closed")
+            self._lent += 1
+            session = self._idle.pop() if self._idle else None
+        if session is None:
+            try:
+                session = self._new_session()
+            except OSError:
+                self.release(None)
+                raise
+        return session
+
+    def release(self, session: Optional[ShellSession]):
+        """
+        Returns a session. Dead, worn-out or unresponsive ones are discarded, and so are sessions
+        whose state a borrower may have changed, so that nothing leaks to the next borrower.
+        Only sessions that saw an error are pinged.
+        """
+        if session is not None and (not session.alive or session.commands >= self.max_commands
+                                    or self._closed or session.dirty
+                                    or (self.health_check and session.suspect and not session.ping())):
+            self.recycled += 1
+            session.close()
+            session = None
+        with self._cond:
+            self._lent -= 1
+            if session is not None:
+                self._idle.append(session)
+            self._cond.notify()
+
+    @contextmanager
+    def session(self, timeout: Optional[float] = None):
+        """Context manager around acquire()/release(); the session's state lasts for the block."""
+        session = self.acquire(timeout)
+        try:
+            yield session
+        except BaseException:
+            session.suspect = True
+            raise
+        finally:
+            self.release(session)
+
+    def run(self, command: str, timeout: Optional[float] = None) -> SessionResult:
+        """
+        Runs a single command on whichever session is free, in a subshell: it starts from the
+        pool's cwd/env and its state changes are dropped. Borrow a session() to keep state.
+        """
+        with self.session() as session:
+            return session.run(command, timeout, isolated=True)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for session in idle:
+            session.close()
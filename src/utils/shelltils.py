@@ -3,12 +3,32 @@ import shutil
 import os
 import re
 import sys
+import shlex
 import subprocess
+import codecs
+import queue
+import threading
+from collections import deque
 from datetime import datetime, date
-from dataclasses import dataclass, field, fields
+from dataclasses import dataclass, field, fields, replace
+
+CHUNK_SIZE = 64 * 1024  # bytes per pipe read; also the longest line kept whole
+QUEUE_LINES = 1024  # lines in flight between the reader threads and the consumer
+
+
+@dataclass
+class SubprocessResult:
+    stdout: str
+    stderr: str
+    return_code: int
+    truncated: bool = False  # the ring buffer dropped earlier output
+    early_exit: bool = False  # terminated by us once an expect pattern matched
+
 
 class calldef:
     """ Contains the platform-independent implementation of the file system. """
+    SubprocessResult = SubprocessResult
+
     def call(self, cmd, **kwargs):
             """
             Executes a command and checks if its output matches expectations.
@@ -17,31 +37,159 @@ class calldef:
                 cmd: The command to execute.
                 **kwargs: Keyword arguments, including:
                     expect: A list of dictionaries with keys "return_codes", "stdout", and "stderr".
+                    on_output: Called as on_output(stream, line) for each line as it arrives,
+                        with stream being "stdout" or "stderr".
+                    retain: Keep at most this many lines per stream (default: everything).
+                    terminate_on_match: Stop the command as soon as the stdout/stderr patterns of
+                        an expectation have been seen, without waiting for it to exit.
+                    encoding: Output encoding (default: sys.stdin.encoding).
+                    cache: A ResultCache (src/utils/shellcache.py). A command already run with
+                        the same cwd, env and inputs is answered from it without running it;
+                        on_output still sees its lines.
+                    inputs: Files or directories the command reads, for the cache key. Only
+                        side-effect-free commands may be cached; a run that changes its inputs
+                        is not stored.
+                The rest are passed to subprocess.Popen.
+            """
+            on_output = kwargs.pop("on_output", None)
+            cache = kwargs.pop("cache", None)
+            inputs = kwargs.pop("inputs", ())
+            if cache is not None:
+                key = cache.key(cmd, kwargs.get("cwd"), kwargs.get("env"), inputs)
+                hit = cache.get(key)
+                if hit is not None:
+                    return self._replay(cmd, hit, kwargs.get("expect", [dict(return_codes=[0])]), on_output)
+            output = self.iter_output(cmd, **kwargs)
+            while True:
+                try:
+                    stream, line = next(output)
+                except StopIteration as done:
+                    result = done.value
+                    break
+                if on_output is not None:
+                    on_output(stream, line)
+            if cache is not None and not (result.truncated or result.early_exit):
+                cache.store(key, cmd, kwargs.get("cwd"), kwargs.get("env"), inputs,
+                            result.stdout, result.stderr, result.return_code)
+            return result
+
+    def _replay(self, cmd, hit, expect, on_output):
+        """Answers call() from a cached result, as if the command had produced it again."""
+        print(f'Cached "{cmd}"', file=sys.stderr)
+        out, err, return_code = hit["stdout"], hit["stderr"], hit["return_code"]
+        if on_output is not None:
+            for stream, text in (("stdout", out), ("stderr", err)):
+                for line in text.splitlines(keepends=True):
+                    on_output(stream, line)
+        for expected in expect:
+            if self._match(return_code, out, err, expected):
+                return self.SubprocessResult(out, err, return_code)
+        print(err)
+        raise subprocess.CalledProcessError(return_code, cmd, output=out)
+
+    def iter_output(self, cmd, **kwargs):
+            """
+            Like call(), but yields (stream, line) tuples while the command runs.
+
+            The generator's return value (StopIteration.value, or the result of `yield from`)
+            is the SubprocessResult. Closing the generator early kills the command.
             """
             print(f'Running "{cmd}"', file=sys.stderr)
 
             expect = kwargs.pop("expect", [dict(return_codes=[0], stdout=None, stderr=None)])
-            process = subprocess.Popen(cmd, stdin=kwargs.get("stdin", subprocess.PIPE), 
+            retain = kwargs.pop("retain", None)
+            terminate_on_match = kwargs.pop("terminate_on_match", False)
+            encoding = kwargs.pop("encoding", None) or sys.stdin.encoding or "utf-8"
+            process = subprocess.Popen(cmd, stdin=kwargs.pop("stdin", subprocess.PIPE),
                                     stdout=subprocess.PIPE, stderr=subprocess.PIPE, **kwargs)
-            out, err = process.communicate()
-            return_code = process.poll()
-            out = out.decode(sys.stdin.encoding)
-            err = err.decode(sys.stdin.encoding)
+            if process.stdin is not None:
+                process.stdin.close()  # like communicate() without input
+
+            events, stop = queue.Queue(maxsize=QUEUE_LINES), threading.Event()
+            for name, pipe in (("stdout", process.stdout), ("stderr", process.stderr)):
+                threading.Thread(target=self._pump, args=(pipe, name, encoding, events, stop), daemon=True).start()
+
+            buffers = {"stdout": deque(maxlen=retain), "stderr": deque(maxlen=retain)}
+            seen = [{stream: not expected.get(stream) for stream in buffers} for expected in expect]
+            truncated = early_exit = False
+            open_streams = 2
+            try:
+                while open_streams:
+                    stream, line = events.get()
+                    if line is None:
+                        open_streams -= 1
+                        continue
+                    buffer = buffers[stream]
+                    truncated = truncated or len(buffer) == buffer.maxlen
+                    buffer.append(line)
+                    for expected, found in zip(expect, seen):
+                        if not found[stream] and re.search(expected[stream], line):
+                            found[stream] = True
+                    yield stream, line
+                    if terminate_on_match and any(
+                            all(found.values()) and (expected.get("stdout") or expected.get("stderr"))
+                            for expected, found in zip(expect, seen)):
+                        early_exit = True
+                        break
+            finally:
+                stop.set()
+                if process.poll() is None and (early_exit or open_streams):
+                    process.kill()
+                return_code = process.wait()
 
-            for expected in expect:
-                if self._match(return_code, out, err, expected):
-                    return self.SubprocessResult(out, err, return_code)
+            out, err = "".join(buffers["stdout"]), "".join(buffers["stderr"])
+            for expected, found in zip(expect, seen):
+                if early_exit:
+                    if all(found.values()):
+                        return self.SubprocessResult(out, err, return_code, truncated, True)
+                elif self._match(return_code, out, err, expected, found):
+                    return self.SubprocessResult(out, err, return_code, truncated)
 
             print(err)
             raise subprocess.CalledProcessError(return_code, cmd, output=out)
 
-    def _match(self, return_code, out, err, expected):
+    @staticmethod
+    def _pump(pipe, stream, encoding, events, stop):
+        """Reads one pipe on its own thread and queues decoded lines; None marks EOF."""
+        def put(line):
+            # the queue is bounded so a chatty command cannot outrun the consumer;
+            # once the consumer is gone (stop), give up instead of blocking forever
+            while not stop.is_set():
+                try:
+                    events.put((stream, line), timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        pending = ""
+        try:
+            for chunk in iter(lambda: pipe.read1(CHUNK_SIZE), b""):
+                lines = (pending + decoder.decode(chunk)).splitlines(keepends=True)
+                pending = lines.pop() if lines and not lines[-1].endswith(("\n", "\r")) else ""
+                if len(pending) > CHUNK_SIZE:
+                    lines.append(pending)  # no newline in sight: hand it over in pieces
+                    pending = ""
+                if not all(put(line) for line in lines):
+                    return
+            pending += decoder.decode(b"", final=True)
+            if not pending or put(pending):
+                put(None)
+        except (OSError, ValueError):
+            put(None)  # pipe closed underneath us
+
+    def _match(self, return_code, out, err, expected, found=None):
         """
         Checks if the command output matches the expected criteria.
+
+        Patterns already seen line by line (found) are not searched again; the retained
+        output is searched for the rest, which catches patterns spanning lines.
         """
+        found = found or {}
         exit_ok = return_code in expected.get("return_codes", [0])  # Default to expecting 0
-        stdout_ok = re.search(expected.get("stdout") or "", out)
-        stderr_ok = re.search(expected.get("stderr") or "", err)
+        stdout_ok = found.get("stdout") or re.search(expected.get("stdout") or "", out)
+        stderr_ok = found.get("stderr") or re.search(expected.get("stderr") or "", err)
         return exit_ok and stdout_ok and stderr_ok
 
 @dataclass(frozen=True)
@@ -51,18 +199,56 @@ class ShellCall:
     stderr: str = ""
     return_code: int = -1
     timestamp: datetime = field(default_factory=datetime.now)
-    file_system_snapshot: str = ""  # Path to the snapshot directory 
-
-    def execute(self):
-        call_def = calldef()
-        result = call_def.call(self.command)
-        self.output = result.stdout
-        self.stderr = result.stderr
-        self.return_code = result.return_code
-        self.create_file_system_snapshot()
-
-    def create_file_system_snapshot(self):
-        snapshot_dir = f"snapshot_{self.timestamp.strftime('%Y%m%d_%H%M%S')}"
-        os.makedirs(snapshot_dir, exist_ok=True)  # Create snapshot directory
-        # ... Use shutil to copy the relevant file system portion into 'snapshot_dir' 
-        self.file_system_snapshot = snapshot_dir
\ No newline at end of file
+    file_system_snapshot: str = ""  # Path to the snapshot manifest
+
+    def execute(self, pool=None, cache=None, inputs=(), snapshot=False, store=None, session=None):
+        """
+        Runs the command and returns a new ShellCall holding the results (this one is frozen).
+
+        Args:
+            pool (ShellSessionPool): Run in a subshell of an idle persistent shell session instead
+                of starting a fresh process (optional). A non-zero exit is recorded, not raised.
+            cache (ResultCache): Reuse the result of an earlier identical run (same command,
+                cwd, relevant env and inputs) instead of running the command (optional; see
+                src/utils/shellcache.py). Only for commands that depend on nothing else and
+                write nothing; not together with session, whose cwd/env are unknown.
+            inputs (Sequence[str]): Files or directories the command reads.
+            snapshot (bool): Snapshot the working directory after the run and record the manifest
+                path in file_system_snapshot (default: no snapshot, ""). Costs a walk of the tree.
+            store (SnapshotStore): Store for the snapshot; passing one implies snapshot=True.
+            session (ShellSession): A session borrowed with pool.session(); the command runs in
+                its shell, so cd/export state carries over between calls. A non-zero exit is
+                recorded, not raised.
+        """
+        if session is not None:
+            if cache is not None:
+                raise ValueError("cache cannot be used with a session: earlier commands may have changed its cwd/env")
+            result = session.run(self.command)
+        elif pool is not None:
+            # pool.run() starts from the pool's env in a fresh subshell; cd pins the cwd the key names
+            cwd = os.path.abspath(pool.cwd or os.getcwd())
+            key = cache.key(self.command, cwd, pool.env, inputs) if cache is not None else None
+            hit = cache.get(key) if key else None
+            if hit is not None:
+                result = calldef.SubprocessResult(hit["stdout"], hit["stderr"], hit["return_code"])
+            else:
+                result = pool.run(f"cd -- {shlex.quote(cwd)} && {self.command}" if key else self.command)
+                if key:
+                    cache.store(key, self.command, cwd, pool.env, inputs,
+                                result.stdout, result.stderr, result.return_code)
+        else:
+            result = calldef().call(self.command, cache=cache, inputs=inputs)
+        manifest = self.create_file_system_snapshot(store=store) if snapshot or store is not None else ""
+        return replace(self, output=result.stdout, stderr=result.stderr, return_code=result.return_code,
+                       file_system_snapshot=manifest)
+
+    def create_file_system_snapshot(self, source=".", store=None):
+        """
+        Snapshots source into a content-addressed store (see src/fs/snapshot.py) and returns the
+        manifest path. Only files changed since the last snapshot are hashed or copied.
+        """
+        from src.fs.snapshot import SnapshotStore
+
+        store = store or SnapshotStore()
+        manifest, _ = store.snapshot(source)
+        return store.manifest_path(manifest.id)
\ No newline at end of file
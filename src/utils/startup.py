@@ -0,0 +1,62 @@
+import os
+import sys
+import time
+import subprocess
+import importlib.util
+from typing import List, Sequence, Tuple
+
+"""
+Startup helpers: the `--profile-startup` report.
+"""
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+PROFILED_MODULES = ('src.lager', 'src.utils.gitmeta', 'src.utils.startup', 'dotenv')
+
+
+def import_times(modules: Sequence[str]) -> Tuple[float, List[Tuple[int, int, str]]]:
+    """Imports modules in a fresh interpreter under `-X importtime`.
+
+    Returns:
+        Tuple[float, List[Tuple[int, int, str]]]: wall seconds, and (self us, cumulative us, module) rows.
+    """
+    code = ';'.join(f'import {m}' for m in modules)
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=PROJECT_ROOT,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    wall = time.perf_counter() - start
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|', 2)
+        rows.append((int(own), int(cumulative), name.rstrip()))
+    return wall, rows
+
+
+def profile_startup(modules: Sequence[str] = PROFILED_MODULES, top: int = 20, out=None):
+    """Prints where CLI startup time goes: imports by cumulative cost, then git metadata."""
+    out = out or sys.stdout
+    available = [m for m in modules if importlib.util.find_spec(m) is not None]
+    wall, rows = import_times(available)
+    out.write(f"startup profile ({', '.join(available)})\n")
+    out.write(f"  interpreter + imports: {wall * 1000:8.1f} ms wall\n\n")
+    out.write(f"  {'cumulative ms':>13} {'self ms':>8}  module\n")
+    for own, cumulative, name in sorted(rows, key=lambda r: -r[1])[:top]:
+        out.write(f"  {cumulative / 1000:13.1f} {own / 1000:8.1f}  {name}\n")
+
+    from src.utils import gitmeta
+    git_dir = gitmeta.find_git_dir()
+    if git_dir is not None:
+        start = time.perf_counter()
+        gitmeta.resolve_with_git(git_dir)
+        forked = time.perf_counter() - start
+        start = time.perf_counter()
+        gitmeta.resolve(git_dir)
+        uncached = time.perf_counter() - start
+        gitmeta.repo_metadata()  # make sure the file cache is current
+        gitmeta._memory.clear()
+        start = time.perf_counter()
+        gitmeta.repo_metadata()
+        cached = time.perf_counter() - start
+        out.write(f"\n  git metadata: {forked * 1000:.1f} ms via git, {uncached * 1000:.2f} ms read directly, "
+                  f"{cached * 1000:.2f} ms from cache\n")
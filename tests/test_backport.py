@@ -0,0 +1,99 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from src.fs.backport import JOURNAL_DIR, Backport, BackportConflict, pending, recover
+from src.fs.merkle import diff, tree_from_directory
+
+
+def write(root, path, text):
+    full = os.path.join(root, *path.split('/'))
+    os.makedirs(os.path.dirname(full), exist_ok=True)
+    with open(full, 'w') as f:
+        f.write(text)
+
+
+def read_tree(root):
+    found = {}
+    for directory, subdirs, files in os.walk(root):
+        subdirs[:] = [d for d in subdirs if d != JOURNAL_DIR]
+        for name in files:
+            full = os.path.join(directory, name)
+            with open(full) as f:
+                found[os.path.relpath(full, root).replace(os.sep, '/')] = f.read()
+    return found
+
+
+class BackportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, True)
+        self.vault, self.clone = os.path.join(self.root, 'vault'), os.path.join(self.root, 'clone')
+        write(self.vault, 'a.md', 'a')
+        write(self.vault, 'notes/b.md', 'b')
+        shutil.copytree(self.vault, self.clone)
+        write(self.clone, 'a.md', 'a, edited')
+        os.remove(os.path.join(self.clone, 'notes', 'b.md'))
+        write(self.clone, 'notes/c.md', 'c')
+        self.before = read_tree(self.vault)
+        self.changes = diff(tree_from_directory(self.vault), tree_from_directory(self.clone))
+
+    def test_applies_the_change_set(self):
+        Backport(self.vault, self.clone).run(self.changes)
+        self.assertEqual(read_tree(self.vault), read_tree(self.clone))
+        self.assertEqual(pending(self.vault), [])
+
+    def test_vault_edit_is_a_conflict(self):
+        write(self.vault, 'a.md', 'edited in the vault meanwhile')
+        with self.assertRaises(BackportConflict) as raised:
+            Backport(self.vault, self.clone).run(self.changes)
+        self.assertEqual((raised.exception.conflicts, raised.exception.where), (['a.md'], 'vault'))
+
+    def test_clone_edit_after_review_is_a_conflict(self):
+        write(self.clone, 'a.md', 'not what was reviewed')
+        with self.assertRaises(BackportConflict) as raised:
+            Backport(self.vault, self.clone).run(self.changes)
+        self.assertEqual((raised.exception.conflicts, raised.exception.where), (['a.md'], 'clone'))
+        self.assertEqual(read_tree(self.vault), self.before)  # no staged temp files either
+        self.assertEqual(pending(self.vault), [])
+
+    def test_crash_while_staging_is_discarded(self):
+        with mock.patch.object(Backport, '_stage', side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                Backport(self.vault, self.clone).run(self.changes)
+        self.assertEqual(len(pending(self.vault)), 1)
+        self.assertEqual(list(recover(self.vault).values()), ['discarded'])
+        self.assertEqual(read_tree(self.vault), self.before)
+        self.assertEqual(pending(self.vault), [])
+
+    def test_crash_after_commit_rolls_forward(self):
+        with mock.patch.object(Backport, 'roll_forward', side_effect=RuntimeError("power cut")):
+            with self.assertRaises(RuntimeError):
+                Backport(self.vault, self.clone).run(self.changes)
+        self.assertEqual(list(recover(self.vault).values()), ['rolled forward'])
+        self.assertEqual(read_tree(self.vault), read_tree(self.clone))
+        self.assertEqual(pending(self.vault), [])
+
+    def test_crash_after_commit_rolls_back(self):
+        with mock.patch.object(Backport, 'roll_forward', side_effect=RuntimeError("power cut")):
+            with self.assertRaises(RuntimeError):
+                Backport(self.vault, self.clone).run(self.changes)
+        self.assertEqual(list(recover(self.vault, rollback=True).values()), ['rolled back'])
+        self.assertEqual(read_tree(self.vault), self.before)
+
+    def test_journal_without_a_header_is_discarded(self):
+        journal_dir = os.path.join(self.vault, JOURNAL_DIR)
+        os.makedirs(journal_dir)
+        for name, content in (('empty.journal', ''), ('torn.journal', '{"txid": "torn", "va')):
+            with open(os.path.join(journal_dir, name), 'w') as f:
+                f.write(content)
+        self.assertEqual(recover(self.vault), {'empty': 'discarded', 'torn': 'discarded'})
+        self.assertEqual(pending(self.vault), [])
+        self.assertEqual(read_tree(self.vault), self.before)
+
+
+if __name__ == '__main__':
+    unittest.main()
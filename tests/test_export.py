@@ -0,0 +1,91 @@
+import os
+import csv
+import gzip
+import json
+import shutil
+import tempfile
+import unittest
+
+from src.utils.export import HTML_FOOTER, StreamExporter, export
+
+
+def rows(start, stop, fail_at=None):
+    for i in range(start, stop):
+        if i == fail_at:
+            raise RuntimeError("source failed")
+        yield {'id': i, 'name': f"row <{i}>"}
+
+
+def read(path):
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', newline='', encoding='utf-8') as f:
+        return f.read()
+
+
+def ids(path):
+    text = read(path)
+    if '.csv' in path:
+        return [int(r['id']) for r in csv.DictReader(text.splitlines())]
+    if '.jsonl' in path:
+        return [json.loads(line)['id'] for line in text.splitlines()]
+    return [int(cell.split('</td>')[0]) for cell in text.split('<tr><td>')[1:]]
+
+
+class ExportTest(unittest.TestCase):
+    FORMATS = ('csv', 'jsonl', 'html', 'csv.gz', 'jsonl.gz')
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, True)
+
+    def path(self, fmt):
+        return os.path.join(self.dir, f"out.{fmt}")
+
+    def test_new_export(self):
+        for fmt in self.FORMATS + ('html.gz',):
+            with self.subTest(fmt=fmt):
+                self.assertEqual(export(rows(0, 25), self.path(fmt), chunk_size=10), 25)
+                self.assertEqual(ids(self.path(fmt)), list(range(25)))
+
+    def test_append(self):
+        for fmt in self.FORMATS:
+            with self.subTest(fmt=fmt):
+                export(rows(0, 5), self.path(fmt))
+                export(rows(5, 12), self.path(fmt), append=True, chunk_size=3)
+                export([], self.path(fmt), append=True)
+                self.assertEqual(ids(self.path(fmt)), list(range(12)))
+                if fmt == 'csv':
+                    self.assertEqual(read(self.path(fmt)).count('id,name'), 1)
+                if fmt == 'html':
+                    self.assertEqual(read(self.path(fmt)).count('<table>'), 1)
+                    self.assertTrue(read(self.path(fmt)).endswith(HTML_FOOTER))
+
+    def test_aborted_new_export_leaves_nothing(self):
+        for fmt in self.FORMATS:
+            with self.subTest(fmt=fmt):
+                with self.assertRaises(RuntimeError):
+                    export(rows(0, 25, fail_at=15), self.path(fmt), chunk_size=10)
+                self.assertEqual(os.listdir(self.dir), [])
+
+    def test_aborted_append_keeps_a_valid_export(self):
+        for fmt in self.FORMATS:
+            with self.subTest(fmt=fmt):
+                export(rows(0, 5), self.path(fmt))
+                with self.assertRaises(RuntimeError):
+                    export(rows(5, 30, fail_at=20), self.path(fmt), append=True, chunk_size=10)
+                with self.assertRaises(RuntimeError):  # fails before its first chunk
+                    export(rows(100, 110, fail_at=100), self.path(fmt), append=True)
+                self.assertEqual(ids(self.path(fmt)), list(range(15)))
+                export(rows(15, 17), self.path(fmt), append=True)  # still appendable
+                self.assertEqual(ids(self.path(fmt)), list(range(17)))
+                if fmt == 'html':
+                    self.assertTrue(read(self.path(fmt)).endswith(HTML_FOOTER))
+
+    def test_append_checks_columns(self):
+        export(rows(0, 2), self.path('csv'))
+        with self.assertRaises(ValueError):
+            StreamExporter(self.path('csv'), headers=['other'], append=True).write([{'other': 1}])
+
+
+if __name__ == '__main__':
+    unittest.main()
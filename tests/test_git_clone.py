@@ -0,0 +1,84 @@
+import os
+import shutil
+import tempfile
+import subprocess
+import unittest
+from unittest import mock
+
+from src.utils.git_clone import GitModuleManager, Submodule, parse_gitmodules, resolve_url, superproject_url
+from src.utils.git_mirror import MirrorCache
+
+GIT = ['git', '-c', 'user.name=test', '-c', 'user.email=test@example.com', '-c', 'init.defaultBranch=main',
+       '-c', 'protocol.file.allow=always']
+
+
+def git(*args, cwd=None):
+    subprocess.run(GIT + list(args), cwd=cwd, check=True, capture_output=True)
+
+
+class ResolveUrlTest(unittest.TestCase):
+
+    def test_relative_urls(self):
+        self.assertEqual(resolve_url('../lib.git', 'https://host/org/app.git'), 'https://host/org/lib.git')
+        self.assertEqual(resolve_url('./lib.git', 'https://host/org/app'), 'https://host/org/app/lib.git')
+        self.assertEqual(resolve_url('../../other/lib', 'https://host/org/app/'), 'https://host/other/lib')
+        self.assertEqual(resolve_url('../lib.git', 'git@host:org/app.git'), 'git@host:org/lib.git')
+        self.assertEqual(resolve_url('../../lib.git', 'git@host:org/app.git'), 'git@host:lib.git')
+        self.assertEqual(resolve_url('../lib.git', '/srv/git/app.git'), '/srv/git/lib.git')
+
+    def test_absolute_urls_are_unchanged(self):
+        for url in ('https://host/lib.git', 'git@host:lib.git', '/srv/git/lib.git'):
+            self.assertEqual(resolve_url(url, 'https://host/org/app.git'), url)
+
+
+@unittest.skipIf(shutil.which('git') is None, "git is not installed")
+class CloneTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, True)
+        # bare remotes: app.git, and lib.git with one commit
+        work = os.path.join(self.root, 'work')
+        git('init', '-q', work)
+        with open(os.path.join(work, 'README'), 'w') as f:
+            f.write('lib\n')
+        git('add', 'README', cwd=work)
+        git('commit', '-q', '-m', 'lib', cwd=work)
+        git('clone', '-q', '--bare', work, os.path.join(self.root, 'lib.git'))
+        git('init', '-q', '--bare', os.path.join(self.root, 'app.git'))
+        # a superproject checkout whose origin is app.git and whose submodule url is relative
+        self.app = os.path.join(self.root, 'app')
+        git('init', '-q', self.app)
+        git('remote', 'add', 'origin', os.path.join(self.root, 'app.git'), cwd=self.app)
+        with open(os.path.join(self.app, '.gitmodules'), 'w') as f:
+            f.write('[submodule "lib"]\n\tpath = vendor/lib\n\turl = ../lib.git\n')
+
+    def test_relative_submodule_url_is_cloned(self):
+        base = superproject_url(self.app)
+        self.assertEqual(base, os.path.join(self.root, 'app.git'))
+        submodules = parse_gitmodules(os.path.join(self.app, '.gitmodules'), base)
+        self.assertEqual(submodules[0].url, os.path.join(self.root, 'lib.git'))
+        target = os.path.join(self.root, 'out')
+        results = GitModuleManager().clone_submodules(submodules, target)
+        self.assertTrue(results[0].ok, results[0].stderr)
+        self.assertTrue(os.path.isfile(os.path.join(target, 'vendor', 'lib', 'README')))
+
+    def test_missing_git_fails_each_clone(self):
+        submodules = [Submodule('a', 'a', os.path.join(self.root, 'lib.git')),
+                      Submodule('b', 'b', os.path.join(self.root, 'lib.git'))]
+        with mock.patch.dict(os.environ, {'PATH': self.root}):
+            results = GitModuleManager().clone_submodules(submodules, os.path.join(self.root, 'out'))
+        self.assertEqual([(r.name, r.ok) for r in results], [('a', False), ('b', False)])
+        self.assertTrue(all(r.returncode == 127 and r.stderr for r in results))
+
+    def test_missing_git_fails_each_mirror(self):
+        manager = GitModuleManager(mirrors=MirrorCache(os.path.join(self.root, 'mirrors')))
+        submodules = [Submodule('a', 'a', 'https://example.com/a.git'), Submodule('b', 'b', 'https://example.com/b.git')]
+        with mock.patch.dict(os.environ, {'PATH': self.root}):
+            results = manager.sync_mirrors(submodules, self.app)
+        self.assertEqual([(r.url, r.ok) for r in results], [(s.url, False) for s in submodules])
+        self.assertTrue(all(r.stderr for r in results))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import os
+import gzip
+import logging
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.utils.logship import ShippingHandler
+
+
+class Collector(ThreadingHTTPServer):
+    """An HTTP collector on an ephemeral port that answers every POST with `status`."""
+
+    def __init__(self, status=200):
+        self.status = status
+        self.batches = []
+        super().__init__(('127.0.0.1', 0), CollectorRequest)
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def host(self):
+        return f"127.0.0.1:{self.server_address[1]}"
+
+    @property
+    def lines(self):
+        return [line for batch in self.batches for line in batch.splitlines()]
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class CollectorRequest(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        if self.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        if 200 <= self.server.status < 300:
+            self.server.batches.append(body)
+        self.send_response(self.server.status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class ShippingHandlerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.spool = tempfile.mkdtemp()
+        self.logger = logging.getLogger(f"test_logship.{self.id()}")
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+
+    def handler(self, host, **kwargs):
+        kwargs = {'flush_interval': 0.05, 'backoff': 0.01, 'max_retries': 1, 'timeout': 1.0, **kwargs}
+        handler = ShippingHandler(host, '/logs', spool_dir=self.spool, **kwargs)
+        self.logger.addHandler(handler)
+        self.addCleanup(self.logger.removeHandler, handler)
+        return handler
+
+    def log(self, count):
+        for i in range(count):
+            self.logger.info("record %d", i)
+
+    def spooled(self):
+        return [name for name in os.listdir(self.spool) if name.endswith('.ndjson')]
+
+    def test_ships_batches(self):
+        collector = Collector()
+        self.addCleanup(collector.stop)
+        handler = self.handler(collector.host, batch_size=10)
+        self.log(25)
+        handler.close()
+        self.assertEqual(handler.shipped, 25)
+        self.assertEqual(len(collector.lines), 25)
+
+    def test_rejected_batch_is_dropped(self):
+        collector = Collector(status=400)
+        self.addCleanup(collector.stop)
+        handler = self.handler(collector.host)
+        self.log(5)
+        handler.close()
+        self.assertEqual((handler.shipped, handler.dropped, handler.spilled), (0, 5, 0))
+        self.assertEqual(self.spooled(), [])
+
+    def test_spool_is_replayed_on_a_timer(self):
+        collector = Collector(status=503)
+        self.addCleanup(collector.stop)
+        handler = self.handler(collector.host)
+        self.log(5)
+        handler.flush()
+        self.assertEqual(handler.spilled, 5)
+        self.assertTrue(self.spooled())
+        collector.status = 200
+        for _ in range(100):  # no new records: the idle loop has to pick the spool up
+            if handler.shipped == 5:
+                break
+            threading.Event().wait(0.05)
+        handler.close()
+        self.assertEqual(handler.shipped, 5)
+        self.assertEqual(len(collector.lines), 5)
+        self.assertEqual(self.spooled(), [])
+
+    def test_spool_is_replayed_at_close(self):
+        collector = Collector(status=503)
+        self.addCleanup(collector.stop)
+        handler = self.handler(collector.host, flush_interval=60, backoff=60, max_retries=0)
+        self.log(3)
+        handler.flush()
+        self.assertEqual(handler.spilled, 3)
+        collector.status = 200
+        handler.close()
+        self.assertEqual(handler.shipped, 3)
+        self.assertEqual(self.spooled(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
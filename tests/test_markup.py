@@ -0,0 +1,119 @@
+import math
+import unittest
+
+import pandas as pd
+import tablib
+
+from src.utils.markup import BUILTINS, TemplateEngine
+
+TEMPLATES = [
+    'plain text, no placeholders',
+    'Hello {{name}}, you are {{age}}.',
+    'Use {{shell|BASH}} and {{editor | vim}}.',
+    'Aim for ~{{n}} words, >={{low}} and <{{high}}.',
+    '?{{formal}}{{title}} {{name}}',
+    'Result: ?{{formal}}:{{title}} done',
+    '${{name}}Declared, not rendered: {{age}}',
+    'limit({{name}}, 3); between({{low}}, {{high}}); mixed({{title}}, ?{{formal}}:{{shell}})',
+    'braces {like} {{this}} stay {{name}}',
+]
+
+ROWS = [
+    {'name': 'Ada', 'age': 36, 'shell': 'zsh', 'n': 5, 'low': 1, 'high': 9.5, 'formal': 'yes', 'title': 'Dr.'},
+    {'name': 'Bob', 'age': None, 'shell': None, 'n': 0, 'low': 'a', 'high': 'b', 'formal': 'no', 'title': 'Mr.'},
+    {'name': '', 'age': math.nan, 'shell': math.nan, 'n': pd.NA, 'low': None, 'high': 2, 'formal': math.nan,
+     'title': None},
+    {'name': 'Cy', 'age': 4, 'shell': '', 'n': -1, 'low': 0, 'high': 0, 'formal': 1, 'title': math.nan},
+    {'name': 'Di', 'age': pd.NaT, 'shell': 'fish', 'n': 2, 'low': 3, 'high': 4, 'formal': 0, 'title': 'Ms.'},
+]
+
+
+def columns(rows):
+    return {key: [row[key] for row in rows] for key in rows[0]}
+
+
+class RenderParityTest(unittest.TestCase):
+    """render_columns() must produce, row for row, what render() produces for that row."""
+
+    def engines(self):
+        for missing in ('keep', 'empty'):
+            yield TemplateEngine(missing=missing)
+            yield TemplateEngine(missing=missing, functions={k: v for k, v in BUILTINS.items() if k != 'random'})
+
+    def assert_parity(self, data, rows, constants=None, chunk_size=2):
+        for engine in self.engines():
+            for template in TEMPLATES:
+                with self.subTest(template=template, missing=engine.missing, functions=bool(engine.functions)):
+                    expected = [engine.render(template, {**(constants or {}), **row}) for row in rows]
+                    self.assertEqual(list(engine.render_columns(template, data, constants, chunk_size)), expected)
+
+    def test_dict_of_columns(self):
+        self.assert_parity(columns(ROWS), ROWS)
+
+    def test_dataframe(self):
+        self.assert_parity(pd.DataFrame(ROWS), ROWS)
+
+    def test_tablib_dataset(self):
+        dataset = tablib.Dataset(*[tuple(row.values()) for row in ROWS], headers=list(ROWS[0]))
+        self.assert_parity(dataset, ROWS)
+
+    def test_chunked_input(self):
+        frame = pd.DataFrame(ROWS)
+        self.assert_parity([frame.iloc[:3], frame.iloc[3:]], ROWS, chunk_size=4)
+
+    def test_constants_fill_missing_columns(self):
+        rows = [{k: v for k, v in row.items() if k not in ('title', 'shell')} for row in ROWS]
+        self.assert_parity(columns(rows), rows, constants={'title': 'Prof.', 'shell': 'sh', 'editor': 'ed'})
+
+    def test_absent_constant_is_unbound(self):
+        rows = [{'name': row['name']} for row in ROWS]
+        self.assert_parity(columns(rows), rows, constants={'title': math.nan, 'formal': None, 'age': pd.NA})
+
+    def test_missing_error_raises_in_both(self):
+        engine = TemplateEngine(missing='error')
+        for value in (None, math.nan, pd.NA, pd.NaT):
+            with self.subTest(value=value):
+                with self.assertRaises(KeyError):
+                    engine.render('{{age}}', {'age': value})
+                with self.assertRaises(KeyError):
+                    list(engine.render_columns('{{age}}', {'age': [1, value]}))
+        self.assertEqual(engine.render('{{age|?}}', age=math.nan), '?')
+        self.assertEqual(list(engine.render_columns('{{age|?}}', {'age': [1, math.nan]})), ['1', '?'])
+
+
+class TemplateTest(unittest.TestCase):
+
+    def test_compiled_once(self):
+        engine = TemplateEngine(maxsize=2)
+        for _ in range(3):
+            engine.render('{{a}}', a=1)
+        self.assertEqual((engine.hits, engine.misses), (2, 1))
+        engine.render('{{b}}')
+        engine.render('{{c}}')
+        engine.render('{{a}}', a=1)  # evicted by the two above
+        self.assertEqual(engine.misses, 4)
+
+    def test_conditional_forms(self):
+        engine = TemplateEngine()
+        for template in ('?{{a}}{{b}}', '?{{a}}:{{b}}'):
+            with self.subTest(template=template):
+                self.assertEqual(engine.render(template, a='yes', b=2), '2')
+                self.assertEqual(engine.render(template, a='false', b=2), '')
+                self.assertEqual(engine.render(template, b=2), '')
+        self.assertEqual(engine.render('x ?{{b}}:{{c}} y', b=1, c=2), 'x 2 y')  # ':' form outside a call
+        self.assertEqual(engine.render('?{{b}}: {{c}}', b=1, c=2), '?1: 2')  # with a space it is plain text
+
+    def test_variables_and_declarations(self):
+        template = TemplateEngine().compile('${{x}}?{{a}}{{b}} {{c|d}} f({{e}})')
+        self.assertEqual(template.variables, ('a', 'b', 'c', 'e'))
+        self.assertEqual(template.declared, ('x',))
+
+    def test_per_row_functions_are_called_per_row(self):
+        calls = []
+        engine = TemplateEngine(functions={'tick': lambda *_: calls.append(1) or str(len(calls))},
+                                per_row=frozenset(('tick',)))
+        self.assertEqual(list(engine.render_columns('tick()', {'a': [1, 2, 3]})), ['1', '2', '3'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from src.fs.snapshot import DigestCache
+from src.utils.shellcache import ResultCache
+
+
+class ResultCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.work = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, True)
+        self.addCleanup(shutil.rmtree, self.work, True)
+        self.write('a.txt', 'alpha')
+        self.write('src/b.py', 'print(1)')
+
+    def write(self, name, text, mtime_ns=None):
+        path = os.path.join(self.work, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(text)
+        if mtime_ns is not None:
+            os.utime(path, ns=(mtime_ns, mtime_ns))
+
+    def key(self, cache=None, inputs=('a.txt', 'src'), env=None, command='lint'):
+        cache = cache or ResultCache(self.root)
+        return cache.key(command, self.work, env or {'PATH': '/bin'}, inputs)
+
+    def test_unchanged_inputs_keep_the_key_without_rereading(self):
+        first = self.key()
+        with mock.patch.object(DigestCache, 'hash_file', side_effect=AssertionError('re-read')):
+            self.assertEqual(self.key(ResultCache(self.root)), first)  # stat cache was persisted
+
+    def test_content_change_invalidates(self):
+        first = self.key()
+        self.write('a.txt', 'ALPHA', mtime_ns=os.stat(os.path.join(self.work, 'a.txt')).st_mtime_ns + 10 ** 9)
+        self.assertNotEqual(self.key(), first)
+
+    def test_directory_inputs_cover_added_and_removed_files(self):
+        first = self.key()
+        self.write('src/c.py', '')
+        second = self.key()
+        self.assertNotEqual(second, first)
+        os.remove(os.path.join(self.work, 'src', 'c.py'))
+        self.assertEqual(self.key(), first)
+
+    def test_missing_input_is_part_of_the_key(self):
+        cache = ResultCache(self.root)
+        self.assertEqual(cache.fingerprint(['nope.txt'], self.work), [['nope.txt', None]])
+        first = self.key(inputs=('nope.txt',))
+        self.write('nope.txt', '')
+        self.assertNotEqual(self.key(inputs=('nope.txt',)), first)
+
+    def test_only_env_keys_count(self):
+        first = self.key(env={'PATH': '/bin', 'HOME': '/a'})
+        self.assertEqual(self.key(env={'PATH': '/bin', 'HOME': '/b'}), first)
+        self.assertNotEqual(self.key(env={'PATH': '/usr/bin'}), first)
+
+    def test_store_skips_a_run_that_changed_its_inputs(self):
+        cache = ResultCache(self.root)
+        env = {'PATH': '/bin'}
+        key = cache.key('fmt', self.work, env, ['a.txt'])
+        self.write('a.txt', 'formatted', mtime_ns=os.stat(os.path.join(self.work, 'a.txt')).st_mtime_ns + 10 ** 9)
+        self.assertFalse(cache.store(key, 'fmt', self.work, env, ['a.txt'], '', '', 0))
+        self.assertEqual(cache.skipped, 1)
+        self.assertIsNone(cache.get(key))
+        key = cache.key('fmt', self.work, env, ['a.txt'])
+        self.assertTrue(cache.store(key, 'fmt', self.work, env, ['a.txt'], 'out', '', 0))
+        self.assertEqual(cache.get(key)['stdout'], 'out')
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_eviction_drops_least_recently_used(self):
+        cache = ResultCache(self.root, max_bytes=10 ** 6)
+        for i, key in enumerate(('aa' * 32, 'bb' * 32, 'cc' * 32)):
+            cache.put(key, 'x' * 100, '', 0)
+            os.utime(cache.entry_path(key), (i, i))
+        cache.get('aa' * 32)  # now the most recent
+        entry = os.path.getsize(cache.entry_path('aa' * 32))
+        self.assertEqual(cache.evict(2 * entry), 1)
+        self.assertIsNone(cache.get('bb' * 32))
+        self.assertIsNotNone(cache.get('aa' * 32))
+        self.assertIsNotNone(cache.get('cc' * 32))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import os
+import stat
+import shutil
+import tempfile
+import unittest
+
+from src.fs.snapshot import SnapshotStore
+
+
+class SnapshotStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.source = tempfile.mkdtemp()
+        self.scratch = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.source, True)
+        self.addCleanup(self.remove_scratch)
+        self.store = SnapshotStore(os.path.join(self.scratch, 'store'))
+        self.write('note.md', 'hello', 0o644)
+        self.write('copy.md', 'hello', 0o644)
+        self.write('bin/run.sh', '#!/bin/sh\n', 0o755)
+        self.write('ro/frozen.txt', 'frozen', 0o444)
+        os.symlink('../note.md', os.path.join(self.source, 'bin', 'link'))
+
+    def remove_scratch(self):
+        for directory, subdirs, files in os.walk(self.scratch):
+            os.chmod(directory, 0o755)  # objects are read-only
+        shutil.rmtree(self.scratch, True)
+
+    def write(self, name, text, mode):
+        path = os.path.join(self.source, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(text)
+        os.chmod(path, mode)
+
+    def tree(self, root):
+        result = {}
+        for directory, _, files in os.walk(root):
+            for name in files:
+                path = os.path.join(directory, name)
+                relative = os.path.relpath(path, root)
+                if os.path.islink(path):
+                    result[relative] = ('link', os.readlink(path))
+                else:
+                    with open(path) as f:
+                        result[relative] = (stat.S_IMODE(os.stat(path).st_mode), f.read())
+        return result
+
+    def test_round_trip(self):
+        manifest, stats = self.store.snapshot(self.source)
+        self.assertEqual(stats.files, 5)
+        self.assertEqual(stats.stored, 4)  # note.md and copy.md share one object
+        dest = os.path.join(self.scratch, 'out')
+        self.store.restore(manifest.id, dest)
+        self.assertEqual(self.tree(dest), self.tree(self.source))
+        self.assertEqual(self.store.list(), [manifest.id])
+
+    def test_unchanged_tree_is_not_read_again(self):
+        self.store.snapshot(self.source)
+        _, stats = SnapshotStore(self.store.root).snapshot(self.source)
+        self.assertEqual((stats.hashed, stats.stored), (0, 0))
+        self.write('note.md', 'changed', 0o644)
+        _, stats = SnapshotStore(self.store.root).snapshot(self.source)
+        self.assertEqual((stats.hashed, stats.stored), (1, 1))
+
+    def test_only_read_only_files_are_linked(self):
+        manifest, _ = self.store.snapshot(self.source)
+        dest = os.path.join(self.scratch, 'out')
+        self.store.restore(manifest.id, dest)
+        entries = manifest.by_path()
+        frozen = os.path.join(dest, 'ro', 'frozen.txt')
+        note = os.path.join(dest, 'note.md')
+        self.assertTrue(os.path.samefile(frozen, self.store.object_path(entries['ro/frozen.txt'].digest)))
+        self.assertFalse(os.path.samefile(note, self.store.object_path(entries['note.md'].digest)))
+        with open(note, 'w') as f:
+            f.write('edited after restore')
+        with open(self.store.object_path(entries['note.md'].digest)) as f:
+            self.assertEqual(f.read(), 'hello')
+
+    def test_restore_without_links_copies_everything(self):
+        manifest, _ = self.store.snapshot(self.source)
+        dest = os.path.join(self.scratch, 'out')
+        self.store.restore(manifest.id, dest, link=False)
+        digest = manifest.by_path()['ro/frozen.txt'].digest
+        self.assertFalse(os.path.samefile(os.path.join(dest, 'ro', 'frozen.txt'), self.store.object_path(digest)))
+        self.assertEqual(self.tree(dest), self.tree(self.source))
+
+    def test_gc_keeps_objects_still_referenced(self):
+        first, _ = self.store.snapshot(self.source)
+        self.write('note.md', 'second version', 0o644)
+        second, _ = self.store.snapshot(self.source)
+        self.store.delete(first.id)
+        self.assertEqual(self.store.gc(), 0)  # 'hello' is still copy.md's content
+        os.remove(os.path.join(self.source, 'copy.md'))
+        third, _ = self.store.snapshot(self.source)
+        self.store.delete(second.id)
+        self.assertEqual(self.store.gc(), 1)
+        dest = os.path.join(self.scratch, 'out')
+        self.store.restore(third.id, dest)
+        self.assertEqual(self.tree(dest), self.tree(self.source))
+
+
+if __name__ == '__main__':
+    unittest.main()